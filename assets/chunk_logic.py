@@ -0,0 +1,76 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Stage Streaming Section.
+#
+# Static tile layers are split into fixed-size chunks. Only chunks near the camera get a sprite list (and GPU buffers),
+# and only chunks inside the camera's view are drawn. Collision still uses the full, spatially hashed layer,
+# so it works the same across chunk boundaries.
+
+import arcade
+from math import floor
+
+
+class ChunkedLayer:
+    '''
+    A static tile layer split into square chunks of chunk_size pixels.
+    Chunks within preload_margin of the view are built, chunks further than twice that are released.
+    '''
+
+    def __init__(self, sprite_list: arcade.SpriteList, chunk_size: int, preload_margin: int):
+        self.chunk_size = chunk_size
+        self.preload_margin = preload_margin
+
+        # The sprites in each chunk, keyed by (chunk column, chunk row). A sprite belongs to the chunk its center is in.
+        self.chunk_sprites = {}
+        for sprite in sprite_list:
+            key = (int(sprite.center_x // chunk_size), int(sprite.center_y // chunk_size))
+            self.chunk_sprites.setdefault(key, []).append(sprite)
+
+        # Sprite lists for the chunks currently built, and the ones to draw this frame.
+        self.built = {}
+        self.visible = []
+
+    def chunk_range(self, left: float, bottom: float, right: float, top: float) -> tuple:
+        '''
+        Returns the columns and rows of the chunks overlapping a rectangle.
+        '''
+        size = self.chunk_size
+        return (range(floor(left / size), floor(right / size) + 1), range(floor(bottom / size), floor(top / size) + 1))
+
+    def update(self, left: float, bottom: float, right: float, top: float) -> None:
+        '''
+        Stream chunks in and out around the camera's view, given in world coordinates.
+        '''
+        # Build the chunks near the view that aren't built yet.
+        margin = self.preload_margin
+        columns, rows = self.chunk_range(left - margin, bottom - margin, right + margin, top + margin)
+        for column in columns:
+            for row in rows:
+                key = (column, row)
+                if key in self.chunk_sprites and key not in self.built:
+                    chunk = arcade.SpriteList()
+                    chunk.extend(self.chunk_sprites[key])
+                    self.built[key] = chunk
+
+        # Release chunks that are well out of view. The gap between the two margins stops chunks thrashing at the edge.
+        columns, rows = self.chunk_range(left - 2 * margin, bottom - 2 * margin, right + 2 * margin, top + 2 * margin)
+        for key in [key for key in self.built if key[0] not in columns or key[1] not in rows]:
+            self.built.pop(key).clear()
+
+        # Draw the chunks overlapping the view. Sprites can hang over the edge of their chunk, so look half a chunk further.
+        overhang = self.chunk_size // 2
+        columns, rows = self.chunk_range(left - overhang, bottom - overhang, right + overhang, top + overhang)
+        self.visible = [chunk for key, chunk in self.built.items() if key[0] in columns and key[1] in rows]
+
+    def draw(self, **kwargs) -> None:
+        for chunk in self.visible:
+            chunk.draw(**kwargs)
+
+    def clear(self) -> None:
+        '''
+        Release every built chunk.
+        '''
+        for chunk in self.built.values():
+            chunk.clear()
+        self.built = {}
+        self.visible = []
@@ -1,6 +1,6 @@
+import getpass
 import os
 import sys
-from arcade import color
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and PyInstaller """
@@ -10,6 +10,19 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def user_data_path(filename):
+    """ Get absolute path to a file the game writes, kept in the user's home folder so it survives updates """
+    data_dir = os.path.join(os.path.expanduser("~"), ".time_attack_andy")
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, filename)
+
+def default_player_name():
+    """ The login name, or a stand-in where it can't be looked up, e.g. in a container with no entry for the user """
+    try:
+        return getpass.getuser() or "Andy"
+    except (ImportError, KeyError, OSError):
+        return "Andy"
+
 # Physics Constants
 GRAVITY = 0.5
 PLAYER_JUMP_VELOCITY = 5.5
@@ -24,15 +37,57 @@ SPRINT_VELOCITY = 2.5
 # Max jumps
 MAX_JUMPS = 2
 
-# Stage config.
-STAGE_CONFIG = {
-    1:  {"color": color.DARK_BROWN},
-    4:  {"color": color.DARK_OLIVE_GREEN, "speed": 5.5},
-    8:  {"color": color.GRAY},
-    10: {"speed": 1.5},
-    11: {"color": color.PASTEL_BLUE},
-    14: {"color": color.DESERT_SAND, "speed": 4},
-    16: {"color": color.BABY_PINK},
-    18: {"color": color.YELLOW_ORANGE},
-    20: {"color": color.BLUEBERRY}
-}
\ No newline at end of file
+# Input timing, in seconds.
+JUMP_BUFFER_TIME = 0.1  # How long a jump press is remembered before the player is able to jump.
+COYOTE_TIME = 0.08      # How long after leaving the ground the player can still jump as if grounded.
+KEY_BINDINGS_FILE = "key_bindings.json"
+
+# Stage packs.
+# Every stage's file, timers and behaviors are listed in the manifest of the folder it is in. See stage_pack.py and build_stage_pack.py.
+STAGE_PACK_MANIFEST = "stage_pack.json"
+DIFFICULTY_NAMES = {-1: "normal", 20: "hard"}   # The name each difficulty's stage times are listed under in a manifest.
+WARM_UP_STAGES = 40                             # How many stages, from the start of a pack, are uploaded ahead of time on the title screen.
+
+# Stage layers.
+MOVING_LAYERS = ("coins", "enemies", "portal")              # Drawn whole. Every other layer is static and split into chunks.
+SPATIAL_HASH_LAYERS = ("terrain", "dangerous_terrain")      # Large static layers the player collides with.
+CHUNK_SIZE = 256                                            # Chunk width and height, in pixels.
+CHUNK_PRELOAD_MARGIN = 256                                  # How far outside the view chunks are built ahead of time.
+
+# Frame pacing.
+ACTIVE_FRAME_RATE = 1 / 60          # Seconds per update and draw while playing.
+IDLE_FRAME_RATE = 1 / 8             # Static screens with nothing moving. Fast enough for the 4 frame per second coin animation.
+IDLE_AFTER_FRAMES = 30              # How many idle updates at full speed before slowing down.
+UNFOCUSED_FRAME_RATE = 1 / 4        # While another window has focus.
+HITCH_THRESHOLD = 1.5               # A frame drawn this many frame times or more after the last one is logged as a hitch.
+HITCH_LOGGING = False               # Log hitches from launch. Otherwise they are only logged once DEV mode is entered.
+
+# Hit boxes calculated for textures, saved in the user data folder between launches.
+HIT_BOX_CACHE_FILE = "hitbox_cache.json.gz"
+
+# Thumbnails for the DEV mode stage select grid, saved in the user data folder. The index maps each stage file's hash to its cell in the atlas.
+STAGE_THUMBNAIL_ATLAS_FILE = "stage_thumbnails.png"
+STAGE_THUMBNAIL_INDEX_FILE = "stage_thumbnails.json"
+
+# Rendering options.
+# When True, the world and HUD are drawn into a 640x360 framebuffer and integer upscaled onto the window.
+NATIVE_RESOLUTION_RENDERING = False
+
+# Leaderboard options.
+# Points at the local stand-in server (leaderboard_server.py) until the real service is available.
+LEADERBOARD_URL = "http://127.0.0.1:8787"
+LEADERBOARD_QUEUE_FILE = "leaderboard_queue.jsonl"
+LEADERBOARD_REJECTED_FILE = "leaderboard_rejected.jsonl"   # Runs the server refused, kept for a look instead of being retried.
+LEADERBOARD_PLAYER_NAME = default_player_name()
+
+# Run history database, in the user data folder.
+RUN_HISTORY_FILE = "run_history.sqlite3"
+
+# Ghost race options.
+# The other game is given with --ghost-peer when launching. Set a default here to always race the same machine.
+GHOST_RACE_PORT = 8790
+GHOST_RACE_PEER = None
+GHOST_ALPHA = 110
+
+# Recorded runs, in the user data folder. Every completed run is saved, for rendering with replay_renderer.py.
+REPLAY_DIRECTORY = "replays"
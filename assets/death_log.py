@@ -0,0 +1,150 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Death Heatmap Section.
+#
+# Every death is stored as a 5 byte record (x, y, cause) appended to a binary file per stage.
+# Each stage's size in tiles is kept next to the records, so heatmaps cover the whole stage however wide it is.
+# Recording only needs the standard library. Binning the records into a heatmap uses numpy.
+
+import json
+import os
+import struct
+from PIL import Image
+
+# Ways the player can die. The index is the cause code stored in each record.
+CAUSES = ("timer", "out_of_bounds", "hazard", "enemy")
+TIMER, OUT_OF_BOUNDS, HAZARD, ENEMY = range(len(CAUSES))
+
+# Record layout: little endian int16 x, int16 y (in pixels), uint8 cause.
+RECORD = struct.Struct("<hhB")
+
+# Stages are a grid of 16 pixel tiles.
+TILE_SIZE = 16
+
+# Maps each stage level to its (width, height) in tiles, in the same folder as the records.
+GRID_SIZES_FILE = "stage_sizes.json"
+
+
+def death_log_path(directory: str, stage_level: int) -> str:
+    '''
+    Returns the file deaths on a stage are recorded in.
+    '''
+    return os.path.join(directory, f"stage_{stage_level}.deaths")
+
+
+def load_grid_sizes(directory: str) -> dict:
+    '''
+    Returns the size in tiles, as (width, height), of each stage deaths were recorded on.
+    '''
+    path = os.path.join(directory, GRID_SIZES_FILE)
+    try:
+        with open(path, "r") as file:
+            return {int(stage_level): tuple(size) for stage_level, size in json.load(file).items()}
+    except (OSError, ValueError, TypeError):
+        return {}
+
+
+class DeathLog:
+    '''
+    Collects death records in memory and appends them to the per-stage files in batches.
+    '''
+
+    def __init__(self, directory: str, flush_size: int = 256):
+        self.directory = directory
+        self.flush_size = flush_size
+        os.makedirs(directory, exist_ok=True)
+
+        # Unwritten records, kept per stage.
+        self.buffers = {}
+        self.buffered = 0
+
+        self.grid_sizes = load_grid_sizes(directory)
+
+    def stage_loaded(self, stage_level: int, width: int, height: int) -> None:
+        '''
+        Keep a stage's size in tiles, so its deaths are binned over the whole stage. Only written when the size changes.
+        '''
+        if self.grid_sizes.get(stage_level) == (width, height):
+            return
+        self.grid_sizes[stage_level] = (width, height)
+        with open(os.path.join(self.directory, GRID_SIZES_FILE), "w") as file:
+            json.dump({str(level): list(size) for level, size in sorted(self.grid_sizes.items())}, file)
+
+    def record(self, stage_level: int, x: float, y: float, cause: int) -> None:
+        '''
+        Record where, and why, the player died.
+        '''
+        # Clamp so deaths far below the map still fit in an int16.
+        x = max(-32768, min(32767, int(x)))
+        y = max(-32768, min(32767, int(y)))
+        self.buffers.setdefault(stage_level, bytearray()).extend(RECORD.pack(x, y, cause))
+
+        self.buffered += 1
+        if self.buffered >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        '''
+        Append every buffered record to its stage's file.
+        '''
+        for stage_level, buffer in self.buffers.items():
+            if buffer:
+                with open(death_log_path(self.directory, stage_level), "ab") as file:
+                    file.write(buffer)
+                buffer.clear()
+        self.buffered = 0
+
+
+def load_deaths(directory: str, stage_level: int):
+    '''
+    Loads every death recorded on a stage as a numpy structured array with x, y and cause fields.
+    '''
+    import numpy as np
+
+    dtype = np.dtype([("x", "<i2"), ("y", "<i2"), ("cause", "u1")])
+    path = death_log_path(directory, stage_level)
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=dtype)
+
+    # Ignore a trailing partial record, in case the game was closed mid-write.
+    with open(path, "rb") as file:
+        data = file.read()
+    return np.frombuffer(data, dtype=dtype, count=len(data) // RECORD.size)
+
+
+def bin_deaths(deaths, grid_size: tuple, cause: int | None = None):
+    '''
+    Counts the deaths in each tile of a stage grid of grid_size (width, height) tiles in a single vectorized pass.
+    Returns a (height, width) array with row 0 at the bottom of the stage. Deaths off the edges count towards the nearest edge tile.
+    '''
+    import numpy as np
+
+    if cause is not None:
+        deaths = deaths[deaths["cause"] == cause]
+
+    width, height = grid_size
+    columns = np.clip(deaths["x"] // TILE_SIZE, 0, width - 1).astype(np.intp)
+    rows = np.clip(deaths["y"] // TILE_SIZE, 0, height - 1).astype(np.intp)
+    counts = np.bincount(rows * width + columns, minlength=width * height)
+    return counts.reshape(height, width)
+
+
+def heatmap_image(counts) -> Image.Image:
+    '''
+    Turns a grid of death counts into an RGBA image with one pixel per tile. Tiles with more deaths are redder and more opaque.
+    Tiles nobody died on are fully transparent.
+    '''
+    import numpy as np
+
+    # Log scale, so a few very common death spots don't hide everything else.
+    intensity = np.log1p(counts.astype(np.float32))
+    if intensity.max() > 0:
+        intensity /= intensity.max()
+
+    pixels = np.zeros((*counts.shape, 4), dtype=np.uint8)
+    pixels[..., 0] = 255
+    pixels[..., 1] = (200 * (1 - intensity)).astype(np.uint8)
+    pixels[..., 3] = np.where(counts > 0, 80 + 150 * intensity, 0).astype(np.uint8)
+
+    # Images are stored top row first, but row 0 of the grid is the bottom of the stage.
+    return Image.fromarray(pixels[::-1].copy())
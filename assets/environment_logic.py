@@ -6,7 +6,13 @@ import os
 import sys
 from random import randint
 from math import sin, cos, fabs
-from assets.constants import resource_path, STAGE_CONFIG
+from arcade.geometry import are_polygons_intersecting
+from assets.constants import resource_path
+from assets.death_log import HAZARD, ENEMY
+from assets.flow_field import FlowField
+
+# Layers without a spatial hash and more sprites than this are searched on the GPU for sprites near the player.
+GPU_QUERY_THRESHOLD = 1500
 
 # Loading sounds that will be used for environment interactions.
 coin_collect_sound = arcade.load_sound(resource_path("assets/sounds/coin1.wav"))
@@ -32,38 +38,109 @@ def animate_coin(animation_clock: float, coins: arcade.SpriteList) -> None:
         coin.set_texture(coin_animation_frame)
 
 
-def collect_coin(player: arcade.Sprite, coins: arcade.SpriteList, coins_collected: int) -> int:
+class Contacts:
     '''
-    Logic for when a player interacts with a coin.
-    Will update the coins collected counter by 1 for each coin collected.
-    Removes collected coins from the screen.
+    Everything the player touched this tick, filled in by find_contacts(). The game keeps one and reuses it every tick.
+    death is the cause of death (see death_log) if the player touched a hazard or an enemy, and None otherwise.
+    '''
+    __slots__ = ("coins", "death")
+
+    def __init__(self):
+        self.coins = []
+        self.death = None
+
+    def clear(self) -> None:
+        self.coins.clear()
+        self.death = None
+
+
+def touched(points: tuple, bounds: tuple, sprites):
+    '''
+    Yields each of the sprites whose hit box overlaps the polygon points.
+    bounds is the polygon's (left, right, bottom, top), used to skip sprites that are too far away before comparing hit boxes.
+    '''
+    left, right, bottom, top = bounds
+    for sprite in sprites:
+        # A sprite's hit box fits in a circle of this radius around its center, however it is rotated.
+        # Read the stored values directly, as arcade's own collision check does. The properties are several times slower.
+        width, height = sprite._width, sprite._height
+        radius = 0.71 * (width if width > height else height)
+        x, y = sprite._position
+        if x + radius < left or x - radius > right or y + radius < bottom or y - radius > top:
+            continue
+        if are_polygons_intersecting(points, sprite.hit_box.get_adjusted_points()):
+            yield sprite
+
+
+def nearby(sprite_list: arcade.SpriteList, bounds: tuple):
+    '''
+    The sprites in a layer that could touch the given bounds. Picked the same way arcade's collision checks pick them:
+    the nearby buckets of a spatially hashed layer, a search on the GPU for large layers, otherwise every sprite.
+    '''
+    if sprite_list.spatial_hash is not None:
+        return sprite_list.spatial_hash.get_sprites_near_rect(arcade.LRBT(*bounds))
+    if len(sprite_list) > GPU_QUERY_THRESHOLD:
+        left, right, bottom, top = bounds
+        return sprite_list.get_nearby_sprites_gpu(((left + right) / 2, (bottom + top) / 2), (right - left, top - bottom))
+    return sprite_list
+
+
+def find_contacts(player: arcade.Sprite, coins: arcade.SpriteList, dangerous_terrain: arcade.SpriteList, enemies: arcade.SpriteList,
+                  contacts: Contacts) -> Contacts:
+    '''
+    Finds everything the player is touching in one pass, into contacts. The player's hit box and its bounds are worked out once.
+    Hazards and enemies are checked first. Touching either kills the player, so the coins aren't checked.
+    The portal isn't checked here: it can open later in the tick, once the coins touched are counted.
     '''
+    contacts.clear()
+    points = player.hit_box.get_adjusted_points()
+    bounds = (min(x for x, _ in points), max(x for x, _ in points), min(y for _, y in points), max(y for _, y in points))
 
-    # Determining which coins were hit by the player. Store them in a list.
-    coins_player_touched = arcade.check_for_collision_with_list(player, coins)
+    if next(touched(points, bounds, nearby(dangerous_terrain, bounds)), None) is not None:
+        contacts.death = HAZARD
+        return contacts
+    if next(touched(points, bounds, nearby(enemies, bounds)), None) is not None:
+        contacts.death = ENEMY
+        return contacts
 
-    # If any coins were hit, remove them from screen and increment amount of coins collected.
-    for coin in coins_player_touched:
+    contacts.coins.extend(touched(points, bounds, nearby(coins, bounds)))
+    return contacts
+
+
+def collect_coins(coins_touched: list, coins_collected: int) -> int:
+    '''
+    Logic for when a player interacts with coins.
+    Will update the coins collected counter by 1 for each coin collected.
+    Removes collected coins from the screen.
+    '''
+    for coin in coins_touched:
         coin.kill()
         arcade.play_sound(coin_collect_sound)
         coins_collected += 1
-    
+
     # Return the amount of coins collected thus far.
     return coins_collected
 
 
-def coin_run_away(player: arcade.Sprite, coins: arcade.SpriteList) -> None:
+def coin_run_away(player: arcade.Sprite, coins: arcade.SpriteList, flow_field: FlowField | None = None) -> None:
     '''
     Have the coin move away from the player when they get too close.
+    With a flow field, coins follow it in reverse, so they flee along open tiles instead of through terrain.
     '''
     speed = 5
     coin_boundary_distance = 45
+    if flow_field is not None:
+        flow_field.update(player.center_x, player.center_y)
     for coin in coins:
         squared_distance = (player.center_x - coin.center_x)**2 + (player.center_y - coin.center_y)**2
         if squared_distance < coin_boundary_distance**2:
-            x = -1 * speed * sin(arcade.math.get_angle_radians(coin.center_x, coin.center_y, player.center_x, player.center_y))
-            y = -1 * speed * cos(arcade.math.get_angle_radians(coin.center_x, coin.center_y, player.center_x, player.center_y))
-            coin.velocity = (x, y)
+            direction = None if flow_field is None else flow_field.away(coin.center_x, coin.center_y)
+            if direction is not None:
+                coin.velocity = (speed * direction[0], speed * direction[1])
+            else:
+                x = -1 * speed * sin(arcade.math.get_angle_radians(coin.center_x, coin.center_y, player.center_x, player.center_y))
+                y = -1 * speed * cos(arcade.math.get_angle_radians(coin.center_x, coin.center_y, player.center_x, player.center_y))
+                coin.velocity = (x, y)
         else:
              coin.velocity = (0, 0)
 
@@ -84,31 +161,21 @@ def check_coins_collected(coins_collected: int, coins_to_collect: int) -> bool:
     return True if coins_collected == coins_to_collect else False
 
 
-def move_floating_enemies(player: arcade.Sprite, enemies: arcade.SpriteList, speed: int) -> None:
+def move_floating_enemies(player: arcade.Sprite, enemies: arcade.SpriteList, speed: int, flow_field: FlowField | None = None) -> None:
     '''
     Move enemies that float towards the player.
+    With a flow field, enemies follow it around terrain. Enemies in the player's tile, or with no open path, head straight for the player.
     ''' 
+    if flow_field is not None:
+        flow_field.update(player.center_x, player.center_y)
     for enemy in enemies:
             if fabs(player.change_x) > 1:
-                x = speed * sin(arcade.math.get_angle_radians(enemy.center_x, enemy.center_y, player.center_x, player.center_y))
-                y = speed * cos(arcade.math.get_angle_radians(enemy.center_x, enemy.center_y, player.center_x, player.center_y))
-                enemy.velocity = (x, y)
+                direction = None if flow_field is None else flow_field.towards(enemy.center_x, enemy.center_y)
+                if direction is not None:
+                    enemy.velocity = (speed * direction[0], speed * direction[1])
+                else:
+                    x = speed * sin(arcade.math.get_angle_radians(enemy.center_x, enemy.center_y, player.center_x, player.center_y))
+                    y = speed * cos(arcade.math.get_angle_radians(enemy.center_x, enemy.center_y, player.center_x, player.center_y))
+                    enemy.velocity = (x, y)
             else:
                 enemy.velocity = (0, 0)
-
-# Define a mapping of colors and special behaviors.
-# Is a dictionary where key is stage level and value is another dictionary with properties.
-
-def unique_stage_logic(stage_level: int, player: arcade.Sprite, entities: arcade.SpriteList, animation_clock: float, background_color: arcade.color) -> arcade.color:
-    config = STAGE_CONFIG.get(stage_level, {})
-    
-    # Handle Enemy Movement
-    if "speed" in config:
-        move_floating_enemies(player, entities, config["speed"])
-    
-    # Handle Animations for Level 15
-    if stage_level == 15:
-        animate_coin(animation_clock, entities)
-        
-    # Return new color if defined, otherwise keep existing
-    return config.get("color", background_color)
\ No newline at end of file
@@ -0,0 +1,133 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Flow Field Section.
+#
+# Chasing enemies and fleeing coins steer around terrain using one flow field per player over the stage's tile grid.
+# Whenever the player moves into a new tile, a single breadth-first search from that tile gives every open tile its distance
+# to the player, and the direction of the step one tile closer. Each enemy then reads its direction from the tile it is in,
+# so steering costs the same however many enemies there are. Fleeing coins follow the field in reverse, towards the farthest neighbour.
+
+import arcade
+from collections import deque
+from math import hypot
+
+# Neighbouring tiles, as (column step, row step). Straight steps come first, so open corridors are followed straight.
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+# The unit direction back from each neighbour to the tile it neighbours.
+BACK_DIRECTIONS = tuple((-step_column / hypot(step_column, step_row), -step_row / hypot(step_column, step_row)) for step_column, step_row in NEIGHBOURS)
+
+# Distance of tiles the player can't be reached from.
+UNREACHABLE = -1
+
+
+def blocked_cells(terrain: arcade.SpriteList, columns: int, rows: int, tile_size: float) -> bytearray:
+    '''
+    Returns a flag for each tile of the grid, row by row from the bottom, set where a terrain tile is.
+    Only depends on the stage, so it is worked out once per stage load.
+    '''
+    blocked = bytearray(columns * rows)
+    for sprite in terrain:
+        column, row = int(sprite.center_x // tile_size), int(sprite.center_y // tile_size)
+        if 0 <= column < columns and 0 <= row < rows:
+            blocked[row * columns + column] = 1
+    return blocked
+
+
+class FlowField:
+    '''
+    Distances and directions towards the player, for every tile of a stage. Call update() each tick with the player's position.
+    The grid is only searched again when the player is in a different tile than last time.
+    '''
+
+    def __init__(self, blocked: bytearray, columns: int, rows: int, tile_size: float):
+        self.blocked = blocked
+        self.columns = columns
+        self.rows = rows
+        self.tile_size = tile_size
+
+        # For every tile: the number of steps to the player's tile, and the unit direction of the step towards it.
+        self.distance = [UNREACHABLE] * (columns * rows)
+        self.direction = [(0, 0)] * (columns * rows)
+        self.unreachable = [UNREACHABLE] * (columns * rows)
+        self.target = None
+        self.searches = 0
+
+        # The open neighbours of every tile, with the direction back from each neighbour to the tile. Worked out once.
+        self.neighbours = [self.open_neighbours(cell) for cell in range(columns * rows)]
+
+    def open_neighbours(self, cell: int) -> tuple:
+        '''
+        The open tiles next to a tile, as (neighbour, direction from the neighbour back to it).
+        Diagonal steps need both tiles beside them open, so corners are never cut.
+        '''
+        blocked, columns, rows = self.blocked, self.columns, self.rows
+        if blocked[cell]:
+            return ()
+        column, row = cell % columns, cell // columns
+        is_open = lambda column, row: 0 <= column < columns and 0 <= row < rows and not blocked[row * columns + column]
+        return tuple((cell + step_row * columns + step_column, back) for (step_column, step_row), back in zip(NEIGHBOURS, BACK_DIRECTIONS)
+                     if is_open(column + step_column, row + step_row) and is_open(column + step_column, row) and is_open(column, row + step_row))
+
+    def cell_at(self, x: float, y: float) -> int | None:
+        '''
+        The tile a position is in, or None if it is off the grid.
+        '''
+        column, row = int(x // self.tile_size), int(y // self.tile_size)
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            return row * self.columns + column
+        return None
+
+    def update(self, x: float, y: float) -> bool:
+        '''
+        Points the field at the player's position. Searches the grid again only if the player entered a new tile. Returns True if it did.
+        A player inside terrain or off the grid keeps the field pointing at the last open tile they were in.
+        '''
+        target = self.cell_at(x, y)
+        if target is None or target == self.target or self.blocked[target]:
+            return False
+        self.target = target
+        self.searches += 1
+
+        distance, direction, neighbours = self.distance, self.direction, self.neighbours
+        distance[:] = self.unreachable
+        distance[target] = 0
+        direction[target] = (0, 0)
+
+        # Breadth first, so the first time a tile is reached is along a shortest path. Its direction points back the way it was reached.
+        queue = deque((target,))
+        while queue:
+            cell = queue.popleft()
+            steps = distance[cell] + 1
+            for neighbour, back in neighbours[cell]:
+                if distance[neighbour] == UNREACHABLE:
+                    distance[neighbour] = steps
+                    direction[neighbour] = back
+                    queue.append(neighbour)
+        return True
+
+    def towards(self, x: float, y: float) -> tuple | None:
+        '''
+        The unit direction to follow from a position towards the player. Moving that way from anywhere in a tile leads into open tiles.
+        None if the position is off the grid, in terrain, cut off from the player, or already in the player's tile.
+        '''
+        column, row = int(x // self.tile_size), int(y // self.tile_size)
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            cell = row * self.columns + column
+            if self.distance[cell] > 0:
+                return self.direction[cell]
+        return None
+
+    def away(self, x: float, y: float) -> tuple | None:
+        '''
+        The unit direction to follow the field in reverse from a position, towards the neighbouring tile farthest from the player.
+        (0, 0) when no neighbour is farther, e.g. in a dead end. None if the position is off the grid, in terrain or cut off from the player.
+        '''
+        cell = self.cell_at(x, y)
+        if cell is None or self.distance[cell] == UNREACHABLE:
+            return None
+        farthest, away = self.distance[cell], (0, 0)
+        for neighbour, back in self.neighbours[cell]:
+            if self.distance[neighbour] > farthest:
+                farthest, away = self.distance[neighbour], (-back[0], -back[1])
+        return away
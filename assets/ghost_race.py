@@ -0,0 +1,363 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Ghost Race Section. Two games on a network race the same stage, each showing the other player as a ghost.
+#
+# Every tick the player's state is quantized and sent over UDP as a delta from the last state the other game acknowledged.
+# Packets are sent and received on background threads, so on_update only ever appends to, or drains, an in-memory queue.
+# The receiving side buffers states for a short, adaptive delay and interpolates between them to hide jitter and loss.
+
+import heapq
+import queue
+import random
+import socket
+import struct
+import threading
+import time
+from bisect import insort
+from collections import deque
+
+# Simulation ticks per second. Sequence numbers count ticks, so they double as the sender's clock.
+TICK_RATE = 60
+TICK = 1 / TICK_RATE
+
+# Quantization steps. Positions are sent in 1/8 pixels, velocities in 1/16 pixels per tick.
+POSITION_SCALE = 8
+VELOCITY_SCALE = 16
+
+# Fields of a quantized state, in the order they are encoded.
+FIELDS = ("x", "y", "change_x", "change_y", "texture", "stage_level")
+ZERO_STATE = (0,) * len(FIELDS)
+
+# Packet header: flags, sequence number, latest sequence received from the other game, and how many ticks back the baseline is.
+# A baseline offset of 0 means the state is encoded against ZERO_STATE, so it can be decoded on its own.
+HEADER = struct.Struct("<BHHB")
+VERSION = 1 << 4
+HAS_ACK = 1
+
+# How many sent and received states are kept as possible baselines.
+HISTORY_SIZE = 64
+
+
+def quantize(x: float, y: float, change_x: float, change_y: float, texture: int, stage_level: int) -> tuple:
+    return (round(x * POSITION_SCALE), round(y * POSITION_SCALE), round(change_x * VELOCITY_SCALE), round(change_y * VELOCITY_SCALE),
+            texture, stage_level)
+
+
+def dequantize(state: tuple) -> tuple:
+    x, y, change_x, change_y, texture, stage_level = state
+    return (x / POSITION_SCALE, y / POSITION_SCALE, change_x / VELOCITY_SCALE, change_y / VELOCITY_SCALE, texture, stage_level)
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    '''
+    Appends a signed integer using zigzag encoding and 7 bits per byte, so small differences take a single byte.
+    '''
+    value = value << 1 if value >= 0 else ((-value) << 1) - 1
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data: bytes, position: int) -> tuple:
+    '''
+    Reads a signed integer written by encode_varint. Returns the value and the position after it.
+    '''
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1) ^ -(value & 1), position
+
+
+def encode_state(state: tuple, baseline: tuple) -> bytearray:
+    '''
+    Encodes a quantized state as a bitmask of the fields that changed from the baseline, followed by each change.
+    A player standing still costs one byte.
+    '''
+    out = bytearray(1)
+    mask = 0
+    for index, (value, base) in enumerate(zip(state, baseline)):
+        if value != base:
+            mask |= 1 << index
+            encode_varint(value - base, out)
+    out[0] = mask
+    return out
+
+
+def decode_state(data: bytes, position: int, baseline: tuple) -> tuple:
+    mask = data[position]
+    position += 1
+    state = list(baseline)
+    for index in range(len(FIELDS)):
+        if mask & (1 << index):
+            difference, position = decode_varint(data, position)
+            state[index] += difference
+    return tuple(state)
+
+
+def sequence_difference(a: int, b: int) -> int:
+    '''
+    How many ticks newer 16 bit sequence number a is than b, allowing for wraparound. Negative if a is older.
+    '''
+    return (a - b + 0x8000) % 0x10000 - 0x8000
+
+
+class GhostLink:
+    '''
+    Sends this game's player state to another game and receives theirs, over UDP.
+    send() and receive() only touch in-memory queues. Encoding, decoding and every socket call happen on two background threads.
+    loss, latency and jitter simulate a bad network on outgoing packets, for testing over loopback.
+    '''
+
+    def __init__(self, port: int, peer: tuple, loss: float = 0.0, latency: float = 0.0, jitter: float = 0.0):
+        self.peer = peer
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("0.0.0.0", port))
+        self.socket.settimeout(0.2)
+
+        # States waiting to be sent, and decoded states waiting for the game, as (tick, arrival time, state).
+        self.outgoing = queue.Queue()
+        self.incoming = deque()
+
+        # Sending side. Sent states are kept so the other game's acknowledgements can be used as baselines.
+        self.sequence = 0
+        self.sent_states = {}
+        self.peer_ack = None
+
+        # Receiving side. Ticks are unwrapped from the 16 bit sequence numbers, so they keep counting up.
+        self.received_states = {}
+        self.latest_sequence = None
+        self.latest_tick = None
+
+        # Counters for the loopback test. Only written from the network threads.
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.packets_dropped = 0
+        self.packets_received = 0
+        self.packets_undecodable = 0
+
+        self.running = True
+        self.threads = [threading.Thread(target=self.send_loop, name="ghost-send", daemon=True),
+                        threading.Thread(target=self.receive_loop, name="ghost-receive", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def send(self, x: float, y: float, change_x: float, change_y: float, texture: int, stage_level: int) -> None:
+        '''
+        Queue this tick's player state to be sent. Returns immediately.
+        '''
+        self.outgoing.put_nowait(quantize(x, y, change_x, change_y, texture, stage_level))
+
+    def receive(self) -> list:
+        '''
+        Returns every state received since the last call, as (tick, arrival time, state). Returns immediately.
+        '''
+        received = []
+        while self.incoming:
+            received.append(self.incoming.popleft())
+        return received
+
+    def close(self) -> None:
+        self.running = False
+        self.outgoing.put_nowait(None)
+        for thread in self.threads:
+            thread.join(timeout=1)
+        self.socket.close()
+
+    def send_loop(self) -> None:
+        # Packets held back by the simulated latency, as (time to send, order, packet).
+        delayed = []
+        while self.running:
+            timeout = max(0.0, delayed[0][0] - time.perf_counter()) if delayed else None
+            try:
+                state = self.outgoing.get(timeout=timeout)
+            except queue.Empty:
+                state = None
+
+            if state is not None:
+                packet = self.encode_packet(state)
+                if random.random() < self.loss:
+                    self.packets_dropped += 1
+                elif self.latency or self.jitter:
+                    heapq.heappush(delayed, (time.perf_counter() + self.latency + random.uniform(0, self.jitter), self.sequence, packet))
+                else:
+                    self.transmit(packet)
+
+            while delayed and delayed[0][0] <= time.perf_counter():
+                self.transmit(heapq.heappop(delayed)[2])
+
+    def transmit(self, packet: bytes) -> None:
+        try:
+            self.socket.sendto(packet, self.peer)
+            self.packets_sent += 1
+            self.bytes_sent += len(packet)
+        except OSError:
+            # Nobody listening yet, or the network is down. The next tick's packet will try again.
+            pass
+
+    def encode_packet(self, state: tuple) -> bytes:
+        '''
+        Encodes a state against the newest state the other game has acknowledged, or on its own if there isn't one.
+        '''
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        self.sent_states[self.sequence] = state
+        self.sent_states.pop((self.sequence - HISTORY_SIZE) & 0xFFFF, None)
+
+        baseline = ZERO_STATE
+        offset = 0
+        if self.peer_ack in self.sent_states and 0 < sequence_difference(self.sequence, self.peer_ack) < HISTORY_SIZE:
+            baseline = self.sent_states[self.peer_ack]
+            offset = sequence_difference(self.sequence, self.peer_ack)
+
+        ack = self.latest_sequence
+        header = HEADER.pack(VERSION | (HAS_ACK if ack is not None else 0), self.sequence, ack or 0, offset)
+        return header + encode_state(state, baseline)
+
+    def receive_loop(self) -> None:
+        while self.running:
+            try:
+                packet, _ = self.socket.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                # On Windows an earlier packet the other game wasn't listening for is reported here. Ignore it.
+                if not self.running:
+                    break
+                continue
+            self.decode_packet(packet, time.perf_counter())
+
+    def decode_packet(self, packet: bytes, arrival_time: float) -> None:
+        if len(packet) <= HEADER.size or packet[0] & 0xF0 != VERSION:
+            self.packets_undecodable += 1
+            return
+        flags, sequence, ack, offset = HEADER.unpack_from(packet)
+        if flags & HAS_ACK:
+            self.peer_ack = ack
+
+        # A state with no baseline far behind the last one means the other game restarted. Start counting again.
+        if offset == 0 and self.latest_sequence is not None and sequence_difference(sequence, self.latest_sequence) < -HISTORY_SIZE:
+            self.received_states = {}
+            self.latest_sequence = None
+
+        if offset == 0:
+            baseline = ZERO_STATE
+        else:
+            baseline = self.received_states.get((sequence - offset) & 0xFFFF)
+            if baseline is None:
+                # The baseline was lost or is too old. A later packet will use a newer acknowledgement.
+                self.packets_undecodable += 1
+                return
+
+        try:
+            state = decode_state(packet, HEADER.size, baseline)
+        except IndexError:
+            self.packets_undecodable += 1
+            return
+
+        self.packets_received += 1
+        self.received_states[sequence] = state
+        self.received_states.pop((sequence - HISTORY_SIZE) & 0xFFFF, None)
+
+        if self.latest_sequence is None:
+            self.latest_tick = sequence
+            self.latest_sequence = sequence
+        else:
+            difference = sequence_difference(sequence, self.latest_sequence)
+            if difference > 0:
+                self.latest_tick += difference
+                self.latest_sequence = sequence
+        tick = self.latest_tick + sequence_difference(sequence, self.latest_sequence)
+        self.incoming.append((tick, arrival_time, dequantize(state)))
+
+
+class GhostPlayback:
+    '''
+    Jitter buffer for received ghost states. States are played back a short delay behind the newest one,
+    interpolating between the two either side of the playback time. The delay grows with the measured jitter.
+    When states stop arriving the ghost keeps moving at its last velocity for a few ticks, then holds still.
+    '''
+
+    def __init__(self, base_delay: float = 2 * TICK, max_delay: float = 0.25, extrapolation_limit: int = 6, timeout: float = 1.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.extrapolation_limit = extrapolation_limit
+        self.timeout = timeout
+        self.clear()
+
+    def clear(self) -> None:
+        # Buffered states as (tick, state), oldest first.
+        self.states = []
+
+        # Estimated difference between the sender's clock and ours, and the jitter in packet transit times (RFC 3550).
+        self.clock_offset = None
+        self.last_transit = None
+        self.jitter = 0.0
+        self.last_arrival = None
+
+    @property
+    def delay(self) -> float:
+        return min(self.max_delay, self.base_delay + 3 * self.jitter)
+
+    def add(self, tick: int, arrival_time: float, state: tuple) -> None:
+        # A jump of over a second means the other game restarted, or stalled for a long time. Start over.
+        sample = tick * TICK - arrival_time
+        if self.clock_offset is not None and abs(sample - self.clock_offset) > 1.0:
+            self.clear()
+
+        # A tick older than the last one played back is too late to matter.
+        if len(self.states) > 1 and tick < self.states[0][0]:
+            return
+        insort(self.states, (tick, state))
+
+        if self.clock_offset is None or sample > self.clock_offset:
+            # A faster packet than any before. Follow it straight away.
+            self.clock_offset = sample
+        else:
+            # Drift down slowly, in case the two clocks run at slightly different speeds.
+            self.clock_offset += (sample - self.clock_offset) * 0.01
+
+        transit = -sample
+        if self.last_transit is not None:
+            self.jitter += (abs(transit - self.last_transit) - self.jitter) / 16
+        self.last_transit = transit
+        self.last_arrival = arrival_time
+
+    def sample(self, now: float) -> tuple | None:
+        '''
+        Returns the ghost's (x, y, change_x, change_y, texture, stage_level) to show now, or None if nothing has been received recently.
+        '''
+        if not self.states or now - self.last_arrival > self.timeout:
+            return None
+
+        target = (now + self.clock_offset - self.delay) / TICK
+
+        # Drop states that are no longer needed, keeping the one just before the playback time.
+        while len(self.states) > 1 and self.states[1][0] <= target:
+            self.states.pop(0)
+
+        tick, state = self.states[0]
+        if target <= tick:
+            return state
+
+        if len(self.states) > 1:
+            next_tick, next_state = self.states[1]
+            # Don't slide the ghost between two stages.
+            if state[5] != next_state[5]:
+                return state
+            t = (target - tick) / (next_tick - tick)
+            return (state[0] + (next_state[0] - state[0]) * t, state[1] + (next_state[1] - state[1]) * t,
+                    next_state[2], next_state[3], state[4], state[5])
+
+        # Nothing newer yet. Keep moving for a few ticks, then hold.
+        ticks_ahead = min(target - tick, self.extrapolation_limit)
+        return (state[0] + state[2] * ticks_ahead, state[1] + state[3] * ticks_ahead, state[2], state[3], state[4], state[5])
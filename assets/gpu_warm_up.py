@@ -0,0 +1,175 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# GPU Warm-up Section.
+#
+# The first time a texture is drawn, arcade copies it into the texture atlas, growing the atlas if it is full.
+# The first time a character is drawn in a font and size, pyglet renders it into that font's glyph texture.
+# Done in the middle of a run, either can make a frame late. The warm-up does all of it ahead of time, a step per frame
+# on the title screen, by drawing every texture and text style the game uses once into a small offscreen framebuffer.
+# The hitch detector logs frames that still come late, with what was uploaded during them.
+
+import arcade
+import pyglet
+import string
+import time
+from arcade.gl import geometry
+
+from assets.tileset_cache import CachedTileMap
+
+# Every character a text could show. Drawn once in each text style.
+WARM_UP_CHARACTERS = string.ascii_letters + string.digits + string.punctuation + " "
+
+
+def upload_counts(ctx: arcade.ArcadeContext) -> dict:
+    '''
+    Running totals of what has been uploaded to the GPU: textures and images in the atlas, glyphs rendered by pyglet,
+    and OpenGL objects created. Cheap enough to take every frame.
+    Fonts no longer used can be let go by pyglet, taking their glyphs with them, so the totals can also go down.
+    '''
+    atlas = ctx.default_atlas
+    fonts = getattr(pyglet.gl.current_context.object_space, "pyglet_font_font_cache", {})
+    return {
+        "atlas textures": len(atlas._textures),
+        "atlas images": len(atlas._images),
+        "glyphs": sum(len(font.glyphs) for font in list(fonts.values())),
+        "GL textures": ctx.stats.texture[0],
+        "buffers": ctx.stats.buffer[0],
+        "framebuffers": ctx.stats.framebuffer[0],
+        "programs": ctx.stats.program[0],
+        "geometries": ctx.stats.geometry[0],
+    }
+
+
+def text_style(text: arcade.Text) -> tuple:
+    font_name = text.font_name if isinstance(text.font_name, str) else tuple(text.font_name)
+    return (font_name, text.font_size, text.bold, text.italic)
+
+
+class GpuWarmUp:
+    '''
+    Uploads the given textures, every texture used by the given stage files, and every character in the style of each of the given texts.
+    Call step() once a frame until done is True, or finish() to do the rest at once.
+    '''
+
+    def __init__(self, ctx: arcade.ArcadeContext, textures: list, texts: list, stage_files: list):
+        self.ctx = ctx
+        self.textures = list(textures)
+        self.styles = list(dict.fromkeys(text_style(text) for text in texts))
+        self.stage_files = list(stage_files)
+        self.framebuffer = ctx.framebuffer(color_attachments = [ctx.texture((64, 64), components = 4)])
+
+        # The texts drawn while warming up are kept, so the fonts they loaded, and the glyphs rendered into them, are never let go.
+        self.texts = []
+
+        self.done = False
+        self.start_counts = None
+        self.frames = 0
+        self.seconds = 0.0
+        self.steps = self.run()
+
+    def step(self) -> bool:
+        '''
+        Does the next piece of the warm-up. Returns True once everything is uploaded.
+        '''
+        if self.done:
+            return True
+        start = time.perf_counter()
+        if self.start_counts is None:
+            self.start_counts = upload_counts(self.ctx)
+        try:
+            next(self.steps)
+        except StopIteration:
+            self.done = True
+        self.frames += 1
+        self.seconds += time.perf_counter() - start
+
+        if self.done:
+            after = upload_counts(self.ctx)
+            uploaded = ", ".join(f"{after[key] - self.start_counts[key]} {key}" for key in after if after[key] > self.start_counts[key])
+            print(f"GPU warm-up: {uploaded or 'nothing new'} in {self.seconds * 1000:.0f} ms over {self.frames} frames")
+        return self.done
+
+    def finish(self) -> None:
+        while not self.step():
+            pass
+
+    def run(self):
+        '''
+        The warm-up, as a generator pausing between steps.
+        '''
+        atlas = self.ctx.default_atlas
+
+        # Textures the game holds on to, like the coin and player animations.
+        for texture in self.textures:
+            atlas.add(texture)
+        yield
+
+        # Every stage's tiles, one stage a step. Tiles share their textures through the tileset cache, so the stages load them again unchanged.
+        for path in self.stage_files:
+            tile_map = CachedTileMap(path, scaling = 1, lazy = True)
+            for sprite_list in tile_map.sprite_lists.values():
+                for sprite in sprite_list:
+                    atlas.add(sprite.texture)
+            yield
+
+        # Every character in each text style, one style a step. Also sets up pyglet's text shader.
+        with self.framebuffer.activate():
+            for font_name, font_size, bold, italic in self.styles:
+                text = arcade.Text(WARM_UP_CHARACTERS, 0, 0, font_name = font_name, font_size = font_size, bold = bold, italic = italic)
+                text.draw()
+                self.texts.append(text)
+                yield
+
+        # Draw a sprite and the native resolution quad once, so the driver has set up both pipelines before the first real frame.
+        with self.framebuffer.activate():
+            sprites = arcade.SpriteList()
+            if self.textures:
+                sprites.append(arcade.Sprite(self.textures[0]))
+            sprites.draw(pixelated = True)
+            self.ctx.default_atlas.texture.use(0)
+            geometry.quad_2d_fs().render(self.ctx.utility_textured_quad_program)
+        self.ctx.finish()
+
+
+class HitchDetector:
+    '''
+    Logs every frame that is drawn later than the threshold times the frame time, along with what was uploaded to the GPU since the frame before.
+    Frames right after the frame rate changes, e.g. when waking up from the idle frame rate, aren't checked.
+    '''
+
+    def __init__(self, ctx: arcade.ArcadeContext, threshold: float):
+        self.ctx = ctx
+        self.threshold = threshold
+        self.hitches = 0
+        self.reset()
+
+    def reset(self) -> None:
+        '''
+        Forget the last frame, e.g. after another view was shown, so the time away doesn't count as a hitch.
+        '''
+        self.last_frame = None
+        self.frame_rate = None
+        self.counts = upload_counts(self.ctx)
+        self.atlas_size = self.ctx.default_atlas.size
+
+    def frame_drawn(self, frame_rate: float, where: str) -> None:
+        '''
+        Call at the end of every frame drawn, with the frame time the game is running at. where describes the frame in the log, e.g. the stage.
+        '''
+        now = time.perf_counter()
+        counts = upload_counts(self.ctx)
+        atlas_size = self.ctx.default_atlas.size
+
+        if self.last_frame is not None and frame_rate == self.frame_rate and now - self.last_frame > frame_rate * self.threshold:
+            self.hitches += 1
+            # Only what was added. A total going down means something was let go, which can't make a frame late.
+            uploaded = [f"{counts[key] - self.counts[key]} {key}" for key in counts if counts[key] > self.counts[key]]
+            if atlas_size != self.atlas_size:
+                uploaded.append(f"atlas grown to {atlas_size[0]}x{atlas_size[1]}")
+            print(f"Hitch on {where}: frame took {(now - self.last_frame) * 1000:.1f} ms, budget {frame_rate * 1000:.1f} ms. "
+                  f"Uploaded: {', '.join(uploaded) or 'nothing'}")
+
+        self.last_frame = now
+        self.frame_rate = frame_rate
+        self.counts = counts
+        self.atlas_size = atlas_size
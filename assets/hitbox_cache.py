@@ -0,0 +1,101 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Hit Box Cache Section.
+#
+# Arcade works out a hit box polygon for every texture it creates by scanning the image's alpha channel.
+# These hit boxes are saved to disk, keyed by a hash of the image's pixels and the algorithm used,
+# so later launches look the polygon up instead of scanning. An edited image hashes differently, so it is simply scanned again.
+
+import arcade
+import hashlib
+from pathlib import Path
+from arcade.cache import HitBoxCache
+from arcade.hitbox import HitBoxAlgorithm
+
+
+class CachedHitBoxAlgorithm(HitBoxAlgorithm):
+    '''
+    Wraps a hit box algorithm, reusing points already calculated for an image with the same pixels.
+    Images with more than max_pixels pixels skip the cache: hashing every pixel of a large image takes longer
+    than the simple algorithm, which stops scanning at the first opaque pixel. None caches every image.
+    '''
+
+    def __init__(self, algorithm: HitBoxAlgorithm, cache: HitBoxCache, max_pixels: int | None = 256 * 256):
+        super().__init__()
+        self.algorithm = algorithm
+        self.cache = cache
+        self.max_pixels = max_pixels
+
+        # How many hit boxes were looked up or calculated. New entries mean the cache file needs saving.
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache_name(self) -> str:
+        return self.algorithm.cache_name
+
+    def cache_key(self, image) -> str:
+        # The arcade version is included in case an update changes how the algorithms work.
+        pixels = hashlib.sha256(image.tobytes()).hexdigest()
+        return f"{pixels}|{image.size}|{image.mode}|{self.algorithm.cache_name}|{arcade.version.VERSION}"
+
+    def calculate(self, image, **kwargs):
+        if self.max_pixels is not None and image.width * image.height > self.max_pixels:
+            return self.algorithm.calculate(image, **kwargs)
+
+        key = self.cache_key(image)
+        points = self.cache.get(key)
+        if points is not None:
+            self.hits += 1
+            return points
+
+        points = self.algorithm.calculate(image, **kwargs)
+        try:
+            self.cache.put(key, points)
+            self.misses += 1
+        except ValueError:
+            # The cache only holds polygons. A degenerate hit box is recalculated every time.
+            pass
+        return points
+
+
+def load_hit_box_cache(path: str) -> HitBoxCache:
+    '''
+    Loads saved hit boxes, or returns an empty cache if there are none or the file can't be read.
+    '''
+    cache = HitBoxCache()
+    if Path(path).exists():
+        try:
+            cache.load(Path(path))
+        except (OSError, ValueError) as e:
+            print(f"Could not read the hit box cache ({e}). Starting a new one.")
+            cache.flush()
+
+    # Drop hit boxes from other arcade versions. JSON has no tuples, so store the rest as tuples again, as arcade does.
+    entries = {key: cache.get(key) for key in cache}
+    cache.flush()
+    for key, points in entries.items():
+        if key.endswith(f"|{arcade.version.VERSION}"):
+            cache.put(key, tuple(tuple(point) for point in points))
+    return cache
+
+
+def install_hit_box_cache(path: str) -> CachedHitBoxAlgorithm:
+    '''
+    Makes every texture created from now on with the default hit box algorithm use the cache saved at path.
+    Must be called before any textures are loaded.
+    '''
+    algorithm = CachedHitBoxAlgorithm(arcade.hitbox.algo_default, load_hit_box_cache(path))
+    arcade.hitbox.algo_default = algorithm
+    return algorithm
+
+
+def save_hit_box_cache(algorithm: CachedHitBoxAlgorithm, path: str) -> None:
+    '''
+    Saves the cache if any new hit boxes were calculated.
+    '''
+    if algorithm.misses:
+        try:
+            algorithm.cache.save(Path(path))
+        except OSError as e:
+            print(f"Could not save the hit box cache ({e}).")
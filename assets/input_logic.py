@@ -0,0 +1,183 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Input Focused Section.
+
+import arcade
+import json
+import os
+from collections import deque
+
+# Gameplay actions, stored as bits so everything held can be checked with a single mask.
+LEFT = 1
+RIGHT = 2
+SPRINT = 4
+CRAWL = 8
+JUMP = 16
+ACTIONS = {"left": LEFT, "right": RIGHT, "sprint": SPRINT, "crawl": CRAWL, "jump": JUMP}
+
+# Keys bound to each action unless the player sets their own.
+DEFAULT_BINDINGS = {
+    "left": ["A", "LEFT"],
+    "right": ["D", "RIGHT"],
+    "sprint": ["LSHIFT", "RSHIFT"],
+    "crawl": ["LCTRL", "RCTRL"],
+    "jump": ["SPACE"],
+}
+
+# Keys for each player in a split-screen race. Each side of the keyboard gets its own set, so both players can share it.
+RACE_BINDINGS = (
+    {"left": ["A"], "right": ["D"], "sprint": ["LSHIFT"], "crawl": ["LCTRL"], "jump": ["W", "SPACE"]},
+    {"left": ["LEFT"], "right": ["RIGHT"], "sprint": ["RSHIFT"], "crawl": ["RCTRL"], "jump": ["UP", "ENTER"]},
+)
+
+
+def load_bindings(path: str) -> dict:
+    '''
+    Builds the key to action lookup. Reads the player's bindings from a JSON file if there is one, e.g. {"jump": ["SPACE", "W"]}.
+    Key names are the names used in arcade.key. Actions missing from the file keep their default keys.
+    '''
+    bindings = dict(DEFAULT_BINDINGS)
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as file:
+                player_bindings = json.load(file)
+            check_bindings(player_bindings)
+            bindings.update(player_bindings)
+        except (OSError, ValueError) as e:
+            print(f"Could not read key bindings ({e}). Using the defaults.")
+    return bindings_to_keys(bindings)
+
+
+def check_bindings(bindings) -> None:
+    '''
+    Raises ValueError unless bindings maps action names to non-empty lists of key names from arcade.key.
+    '''
+    if not isinstance(bindings, dict):
+        raise ValueError("expected an object of actions, e.g. {\"jump\": [\"SPACE\"]}")
+    for action, key_names in bindings.items():
+        if action not in ACTIONS:
+            raise ValueError(f"unknown action {action!r}")
+        if not isinstance(key_names, list) or not key_names:
+            raise ValueError(f"{action} should be a list of key names, e.g. [\"SPACE\"]")
+        for key_name in key_names:
+            if not isinstance(key_name, str) or not isinstance(getattr(arcade.key, key_name.upper(), None), int):
+                raise ValueError(f"unknown key {key_name!r} for {action}")
+
+
+def bindings_to_keys(bindings: dict) -> dict:
+    '''
+    Turns bindings of action names to key names, e.g. {"jump": ["SPACE"]}, into the key to action lookup InputState uses.
+    '''
+    key_to_action = {}
+    for action, key_names in bindings.items():
+        for key_name in key_names:
+            key = getattr(arcade.key, key_name.upper(), None)
+            if action in ACTIONS and key is not None:
+                key_to_action[key] = key_to_action.get(key, 0) | ACTIONS[action]
+            else:
+                print(f"Ignoring unknown binding {action}: {key_name}")
+    return key_to_action
+
+
+class InputState:
+    '''
+    Turns key presses and releases into gameplay actions, applied at the start of each simulation tick.
+    Events are timestamped when they arrive and applied in order, so a key tapped between two frames still counts for one tick.
+    Jumps are buffered for a short time, and allowed for a short time after walking off a ledge.
+    '''
+
+    def __init__(self, key_to_action: dict, jump_buffer: float, coyote_time: float):
+        self.key_to_action = key_to_action
+        self.jump_buffer = jump_buffer
+        self.coyote_time = coyote_time
+
+        # Events waiting to be applied, as (timestamp, action, pressed).
+        self.events = deque()
+
+        # How many keys are holding each action down, so releasing one of two bound keys keeps the action held.
+        self.hold_counts = {action: 0 for action in ACTIONS.values()}
+        self.held = 0
+
+        # Actions to apply this tick. Includes keys pressed and released again since the last tick.
+        self.active = 0
+
+        # Time of the last jump press that hasn't been used yet, and the last time the player was on the ground.
+        self.jump_pressed_at = None
+        self.grounded_at = None
+
+        # Recent press-to-motion latencies, in seconds.
+        self.latencies = deque(maxlen=60)
+
+    def press(self, key: int, timestamp: float) -> None:
+        action = self.key_to_action.get(key)
+        if action:
+            self.events.append((timestamp, action, True))
+
+    def release(self, key: int, timestamp: float) -> None:
+        action = self.key_to_action.get(key)
+        if action:
+            self.events.append((timestamp, action, False))
+
+    def update(self, now: float) -> int:
+        '''
+        Apply every event that happened up to now. Returns the actions active for this tick.
+        '''
+        pressed = 0
+        while self.events and self.events[0][0] <= now:
+            timestamp, action, is_press = self.events.popleft()
+            for bit in ACTIONS.values():
+                if action & bit:
+                    self.hold_counts[bit] = self.hold_counts[bit] + 1 if is_press else max(0, self.hold_counts[bit] - 1)
+                    if self.hold_counts[bit]:
+                        self.held |= bit
+                    else:
+                        self.held &= ~bit
+            if is_press:
+                pressed |= action
+                if action & JUMP:
+                    self.jump_pressed_at = timestamp
+
+        self.active = self.held | pressed
+        return self.active
+
+    def note_grounded(self, now: float) -> None:
+        self.grounded_at = now
+
+    def in_coyote_window(self, now: float) -> bool:
+        '''
+        True if the player was on the ground within the coyote time.
+        '''
+        return self.grounded_at is not None and now - self.grounded_at <= self.coyote_time
+
+    def jump_buffered(self, now: float) -> bool:
+        '''
+        True if jump was pressed recently enough that it should still happen.
+        '''
+        return self.jump_pressed_at is not None and now - self.jump_pressed_at <= self.jump_buffer
+
+    def consume_jump(self, now: float) -> None:
+        '''
+        Use up the buffered jump, recording how long it took from the key press until the player moved.
+        '''
+        self.latencies.append(now - self.jump_pressed_at)
+        self.jump_pressed_at = None
+
+    def clear(self) -> None:
+        '''
+        Forget any buffered jump, e.g. when the player respawns.
+        '''
+        self.jump_pressed_at = None
+        self.grounded_at = None
+
+    def release_all(self) -> None:
+        '''
+        Let go of every action and drop events not yet applied, e.g. when the window loses focus.
+        '''
+        self.events.clear()
+        self.hold_counts = {action: 0 for action in ACTIONS.values()}
+        self.held = 0
+        self.active = 0
+
+    @property
+    def average_latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
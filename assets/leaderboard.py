@@ -0,0 +1,253 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Leaderboard Section. Submits completed runs without ever blocking the game loop.
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+
+class LeaderboardError(Exception):
+    '''
+    Raised when the leaderboard server answers with something other than a success.
+    status is the HTTP status it answered with, or None if its answer couldn't be read.
+    '''
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def permanent(self) -> bool:
+        '''
+        Whether the server refused the runs themselves, so sending them again would get the same answer.
+        Timeouts (408) and rate limiting (429) are worth retrying.
+        '''
+        return self.status is not None and 400 <= self.status < 500 and self.status not in (408, 429)
+
+
+def create_run_entry(player_name: str, total_time: float, deaths: int, difficulty: int) -> dict:
+    '''
+    Builds the record submitted for a completed run.
+    The id lets the server ignore a run it already accepted if a retry sends it twice.
+    '''
+    return {
+        "id": uuid.uuid4().hex,
+        "player": player_name,
+        "total_time": round(total_time, 3),
+        "deaths": deaths,
+        "difficulty": "hard" if difficulty == 20 else "normal",
+        "timestamp": time.time(),
+    }
+
+
+class LeaderboardClient:
+    '''
+    Submits runs to the leaderboard service from a background thread running its own asyncio event loop.
+    Runs waiting to be sent are kept in a JSON lines file, so they survive the game closing or the network being down.
+    A single keep-alive connection is reused for every request, runs are sent in batches, and failed batches are retried with exponential backoff.
+    Batches the server refuses outright are moved to rejected_file, or dropped without one, so they don't hold up the runs behind them.
+    '''
+
+    def __init__(self, url: str, queue_file: str, rejected_file: str | None = None, batch_size: int = 50, timeout: float = 5.0,
+                 max_backoff: float = 60.0):
+        address = urlsplit(url)
+        self.host = address.hostname
+        self.port = address.port or 80
+        self.path = address.path.rstrip("/") + "/runs"
+        self.queue_file = queue_file
+        self.rejected_file = rejected_file
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+
+        # Counters the game (or a load test) can read. Only ever written from the client thread.
+        self.submitted = 0
+        self.failed_attempts = 0
+        self.rejected = 0
+
+        # The pooled connection. Opened lazily and reopened if the server drops it.
+        self.reader = None
+        self.writer = None
+
+        # Runs still waiting to be accepted by the server, starting with any left over from last time.
+        self.pending = self.load_queue()
+
+        # Start the event loop on its own thread so network I/O never runs on the render thread.
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="leaderboard", daemon=True)
+        self.thread.start()
+        self.wakeup = asyncio.run_coroutine_threadsafe(self.create_wakeup_event(), self.loop).result()
+        self.sender = asyncio.run_coroutine_threadsafe(self.send_pending_runs(), self.loop)
+
+    def submit(self, run: dict) -> None:
+        '''
+        Queue a completed run to be sent. Safe to call from the game loop, returns immediately.
+        '''
+        self.loop.call_soon_threadsafe(self.enqueue, run)
+
+    @property
+    def pending_count(self) -> int:
+        '''
+        The number of runs not yet accepted by the server.
+        '''
+        return len(self.pending)
+
+    def close(self) -> None:
+        '''
+        Stop the client thread. Anything unsent stays in the queue file for next time.
+        '''
+        self.sender.cancel()
+        asyncio.run_coroutine_threadsafe(self.close_connection(), self.loop).result(self.timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(self.timeout)
+
+    ### Everything below runs on the client thread. ###
+
+    async def create_wakeup_event(self) -> asyncio.Event:
+        # The event has to be created on the loop that waits on it.
+        return asyncio.Event()
+
+    def enqueue(self, run: dict) -> None:
+        # Appending a single line keeps each submission cheap. The file is compacted once a batch is accepted.
+        self.pending.append(run)
+        with open(self.queue_file, "a") as file:
+            file.write(json.dumps(run) + "\n")
+        self.wakeup.set()
+
+    def load_queue(self) -> list:
+        '''
+        Read the runs left in the queue file. Lines that were only partly written are skipped.
+        '''
+        runs = []
+        if os.path.exists(self.queue_file):
+            with open(self.queue_file, "r") as file:
+                for line in file:
+                    try:
+                        runs.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        return runs
+
+    def save_queue(self) -> None:
+        '''
+        Write the pending runs to disk. Writes to a temporary file first, so a crash can't leave a half written queue.
+        '''
+        temporary_file = self.queue_file + ".tmp"
+        with open(temporary_file, "w") as file:
+            for run in self.pending:
+                file.write(json.dumps(run) + "\n")
+        os.replace(temporary_file, self.queue_file)
+
+    def park_batch(self, batch: list) -> None:
+        '''
+        Set aside runs the server refused, so they can be looked at later instead of being sent forever.
+        '''
+        if self.rejected_file is not None:
+            with open(self.rejected_file, "a") as file:
+                for run in batch:
+                    file.write(json.dumps(run) + "\n")
+
+    async def send_pending_runs(self) -> None:
+        '''
+        Send queued runs in batches for as long as the client is running.
+        '''
+        backoff = 0.5
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                # Give runs submitted at nearly the same time a moment to join the same batch.
+                await asyncio.sleep(0.05)
+
+            batch = self.pending[:self.batch_size]
+            try:
+                await asyncio.wait_for(self.post_batch(batch), self.timeout)
+            except LeaderboardError as e:
+                if e.permanent:
+                    # Retrying can't help, so set the batch aside and carry on with the rest of the queue.
+                    print(f"Leaderboard refused {len(batch)} runs ({e}). Not retrying them.")
+                    self.park_batch(batch)
+                    del self.pending[:len(batch)]
+                    self.rejected += len(batch)
+                    self.save_queue()
+                    continue
+                error = e
+            except (OSError, EOFError, asyncio.TimeoutError, ValueError) as e:
+                # EOFError covers asyncio.IncompleteReadError, when the server hangs up partway through an answer.
+                error = e
+            except Exception as e:
+                # Anything else is a bug, but it must not stop runs being sent for the rest of the session.
+                error = f"unexpected {type(e).__name__}: {e}"
+            else:
+                # The batch was accepted, so remove it from the queue.
+                backoff = 0.5
+                del self.pending[:len(batch)]
+                self.submitted += len(batch)
+                self.save_queue()
+                continue
+
+            # Drop the connection and try again later, waiting longer after each failure.
+            self.failed_attempts += 1
+            print(f"Leaderboard submission failed ({error}). Retrying in {backoff:.1f}s.")
+            await self.close_connection()
+            await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def post_batch(self, batch: list) -> None:
+        '''
+        POST a batch of runs over the pooled connection and wait for the server to accept it.
+        '''
+        if self.writer is None or self.writer.is_closing():
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        body = json.dumps({"runs": batch}).encode()
+        request = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode() + body
+        self.writer.write(request)
+        await self.writer.drain()
+
+        # Read the status line and headers, then the body so the connection can be reused.
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("server closed the connection")
+        parts = status_line.split()
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise LeaderboardError(f"server answered {status_line[:80]!r}")
+        status = int(parts[1])
+        content_length = 0
+        keep_alive = True
+        while True:
+            header = await self.reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode().partition(":")
+            if name.strip().lower() == "content-length":
+                content_length = int(value)
+            elif name.strip().lower() == "connection" and value.strip().lower() == "close":
+                keep_alive = False
+        await self.reader.readexactly(content_length)
+
+        if not keep_alive:
+            await self.close_connection()
+        if status != 200:
+            raise LeaderboardError(f"server answered {status}", status)
+
+    async def close_connection(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader, self.writer = None, None
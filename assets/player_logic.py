@@ -6,9 +6,11 @@ import arcade
 import sys
 import os
 from math import fabs
+from PIL import Image
 
 # Import player movement information from main.
 from assets.constants import PLAYER_MOVE_ACCEL, PLAYER_FRICTION, CRAWL_VELOCITY, NORMAL_VELOCITY, SPRINT_VELOCITY
+from assets.input_logic import LEFT, RIGHT, SPRINT, CRAWL
 
 
 def resource_path(relative_path):
@@ -24,51 +26,103 @@ def resource_path(relative_path):
 death_sound = arcade.load_sound(resource_path("assets/sounds/error3.wav"))
 
 
+# Player poses. Each pose is a size, a motion and a direction, and has its own texture.
+# A pose's texture index is size * 6 + motion * 2 + direction, so the first six are the normal sized textures.
+FACING_RIGHT, FACING_LEFT = range(2)
+GROUND, JUMPING, FALLING = range(3)
+STANDING, SPRINTING, CRAWLING, SQUASHED = range(4)
+
+# Height of each size, relative to the player's image. Squashed is the idle animation.
+POSE_HEIGHTS = (1.0, 0.8, 1.2, 0.9)
+
+
+def pose_index(size: int, motion: int, direction: int) -> int:
+    return size * 6 + motion * 2 + direction
+
+
 def add_player_textures(player: arcade.Sprite) -> None:
-    texture = player.texture                                                                                   # Normal texture stored at index 0.
-    texture = texture.flip_horizontally()       
-    player.textures.append(texture)                                                                            # Stored at index 1.
+    '''
+    Gives the player a texture for every pose, in pose index order.
+    Each size is its own image resized to a whole number of pixels, so its hit box is worked out once here,
+    and changing pose never rescales the sprite.
+    '''
+    images = (player.texture.image,                                                                         # Ground.
+              arcade.load_texture(resource_path("assets/player_textures/player_jump.png")).image,           # Jumping.
+              arcade.load_texture(resource_path("assets/player_textures/player_fall.png")).image)           # Falling.
+
+    player.textures = []
+    for height in POSE_HEIGHTS:
+        for image in images:
+            if height != 1.0:
+                image = image.resize((image.width, round(image.height * height)), Image.NEAREST)
+            texture = arcade.Texture(image)
+            player.textures.append(texture)                                                                 # Facing right.
+            player.textures.append(texture.flip_horizontally())                                             # Facing left.
+    player.texture = player.textures[0]
+
+
+def player_pose(player: arcade.Sprite, on_ground: bool, actions: int, animation_time: float, pose: int) -> int:
+    '''
+    Works out the player's pose from their movement and the actions held.
+    When the movement doesn't show a direction or motion, e.g. standing still, the current pose's is kept.
+    '''
+    size, rest = divmod(pose, 6)
+    motion, direction = divmod(rest, 2)
+
+    if on_ground and player.change_x > 0: # moving right on the ground
+        motion, direction = GROUND, FACING_RIGHT
+    elif on_ground and player.change_x < 0: # moving left on the ground
+        motion, direction = GROUND, FACING_LEFT
+    elif player.change_y > 0 and player.change_x > 0: # jumping up to the right
+        motion, direction = JUMPING, FACING_RIGHT
+    elif player.change_y > 0 and player.change_x < 0: # jumping up to the left
+        motion, direction = JUMPING, FACING_LEFT
+    elif player.change_y < 0 and player.change_x > 0: # falling to the right
+        motion, direction = FALLING, FACING_RIGHT
+    elif player.change_y < 0 and player.change_x < 0: # falling to the left
+        motion, direction = FALLING, FACING_LEFT
+
+    # Sprinting makes the player shorter and crawling taller. Standing still, they squash every other half second.
+    if actions & SPRINT:
+        size = SPRINTING
+    elif actions & CRAWL:
+        size = CRAWLING
+    elif fabs(player.change_x) < 0.1 and animation_time >= 0.5:
+        size = SQUASHED
+    else:
+        size = STANDING
 
-    player.textures.append(arcade.load_texture(resource_path("assets/player_textures/player_jump.png")))                       # Stored at index 2.
-    player.textures.append(arcade.load_texture(resource_path("assets/player_textures/player_jump.png")).flip_horizontally())   # Stored at index 3.
-    player.textures.append(arcade.load_texture(resource_path("assets/player_textures/player_fall.png")))                       # Stored at index 4.
-    player.textures.append(arcade.load_texture(resource_path("assets/player_textures/player_fall.png")).flip_horizontally())   # Stored at index 5.
+    return pose_index(size, motion, direction)
 
 
-def player_movement(player: arcade.Sprite, player_height: float, keys: set) -> None:    
+def player_movement(player: arcade.Sprite, actions: int) -> None:    
     '''
     Move the player in response to their inputs from the keyboard.
+    actions is the bitmask of actions held this tick, from the input handler.
     '''
-    # # Setting up player heights for different speeds.
-    PLAYER_HEIGHT_SPRINT = player_height * 0.8
-    PLAYER_HEIGHT_CRAWL = player_height * 1.2
-    
     # Check for sprinting or crouching.
-    if arcade.key.LSHIFT in keys or arcade.key.RSHIFT in keys: # Establish sprinting versus walking velocity.
+    if actions & SPRINT: # Establish sprinting versus walking velocity.
         velocity = SPRINT_VELOCITY
-        player.height = PLAYER_HEIGHT_SPRINT
 
-    elif arcade.key.LCTRL in keys or arcade.key.RCTRL in keys:
+    elif actions & CRAWL:
         velocity = CRAWL_VELOCITY
-        player.height = PLAYER_HEIGHT_CRAWL
     
     else:
         velocity = NORMAL_VELOCITY
-        player.height = player_height
 
     # Check for left/right movement.
-    if arcade.key.A in keys or arcade.key.LEFT in keys:
+    if actions & LEFT:
         player.change_x -= PLAYER_MOVE_ACCEL
         if player.change_x < -velocity: # prevents player from accelerating beyond max velocity
             player.change_x = -velocity
     
-    if arcade.key.D in keys or arcade.key.RIGHT in keys:
+    if actions & RIGHT:
         player.change_x += PLAYER_MOVE_ACCEL
         if player.change_x > velocity: # prevents player from accelerating beyond max velocity
             player.change_x = velocity
 
     # Determine player movement when a key is released.
-    if not (arcade.key.A in keys or arcade.key.LEFT in keys) and not (arcade.key.D in keys or arcade.key.RIGHT in keys):      # Determine direction moving.
+    if not actions & (LEFT | RIGHT):      # Determine direction moving.
         player.change_x *= PLAYER_FRICTION
     
     # To prevent player from infinitely moving, set a cap for when they hard stop.
@@ -79,37 +133,6 @@ def player_movement(player: arcade.Sprite, player_height: float, keys: set) -> N
     
 
 
-def animate_player(player: arcade.Sprite, physics_engine: arcade.PhysicsEnginePlatformer) -> None:
-    '''
-    Animate the player in response to their movement.
-    '''
-    if physics_engine.can_jump() and player.change_x > 0: # changes to right movement texture while on ground
-        player.set_texture(0)
-    elif physics_engine.can_jump() and player.change_x < 0: # changes to left movement texture while on ground
-        player.set_texture(1)
-    elif player.change_y > 0 and player.change_x > 0: # changes to jumping up right movement texture
-            player.set_texture(2)
-    elif player.change_y > 0 and player.change_x < 0: # changes to jumping up left movement texture
-        player.set_texture(3)
-    elif player.change_y < 0 and player.change_x > 0: # changes to falling right movement texture
-        player.set_texture(4)
-    elif player.change_y < 0 and player.change_x < 0: # changes to falling left movement texture
-        player.set_texture(5)
-
-
-def player_idle(player: arcade.Sprite, animation_time: float) -> None:
-    '''
-    An idle animaton for the player when not moving.
-    '''
-    state_1 = player.height
-    state_2 = player.height * 0.9
-    if fabs(player.change_x) < 0.1:
-        if animation_time < 0.5:
-            player.height = state_1
-        else:
-            player.height = state_2
-
-
 def player_dies_sequence(death_count: int) -> int:
     '''
     Play a death sound when player dies and increment death counter.
@@ -0,0 +1,68 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Rendering Focused Section.
+
+import arcade
+from arcade.gl import geometry
+
+
+def integer_scaled_viewport(window_width: int, window_height: int, base_width: int, base_height: int) -> tuple:
+    '''
+    Determine the largest whole number scale the base resolution fits into the window with.
+    Returns the (left, bottom, width, height) rectangle the scaled image is centered in. The rest of the window is letterboxed.
+    '''
+    # Never drop below a scale of 1, even if the window is smaller than the base resolution.
+    scale = max(1, min(window_width // base_width, window_height // base_height))
+    width = base_width * scale
+    height = base_height * scale
+
+    # Center the scaled image so the letterbox bars are even on both sides.
+    left = (window_width - width) // 2
+    bottom = (window_height - height) // 2
+    return (left, bottom, width, height)
+
+
+class NativeResolutionFramebuffer:
+    '''
+    An offscreen framebuffer at the game's virtual resolution.
+    The world and HUD are drawn into it, then it is copied to the window once per frame with nearest neighbor integer scaling.
+    '''
+
+    def __init__(self, window: arcade.Window, width: int, height: int):
+        self.window = window
+        self.width = width
+        self.height = height
+
+        # Creating the offscreen texture. Nearest filtering keeps the pixel art crisp when scaled up.
+        ctx = window.ctx
+        self.texture = ctx.texture((width, height), components = 4, filter = (ctx.NEAREST, ctx.NEAREST))
+        self.framebuffer = ctx.framebuffer(color_attachments = [self.texture])
+
+        # Fullscreen quad and the built in shader that draws a texture onto it.
+        self.quad = geometry.quad_2d_fs()
+        self.program = ctx.utility_textured_quad_program
+
+    def clear(self, color: arcade.types.RGBOrA255) -> None:
+        '''
+        Clear the offscreen framebuffer with the stage background color.
+        '''
+        self.framebuffer.clear(color = color)
+
+    def draw_to_window(self) -> None:
+        '''
+        Copy the offscreen framebuffer to the window, scaled by a whole number and centered with black letterbox bars.
+        '''
+        ctx = self.window.ctx
+        screen = ctx.screen
+
+        # Drawing onto the window, clearing the letterbox area to black.
+        screen.use()
+        window_width, window_height = self.window.get_framebuffer_size()
+        ctx.viewport = (0, 0, window_width, window_height)
+        ctx.scissor = None
+        screen.clear(color = arcade.color.BLACK)
+
+        # Copy the offscreen image into the integer scaled rectangle.
+        ctx.viewport = integer_scaled_viewport(window_width, window_height, self.width, self.height)
+        self.texture.use(0)
+        self.quad.render(self.program)
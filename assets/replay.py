@@ -0,0 +1,187 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Replay Section. Records completed runs so they can be rendered to video later.
+#
+# A replay holds every key pressed and released during the run, and the clock, frame time and player state at the start of each tick.
+# Playing it back feeds the same keys to the game at the same times, and puts the player back where they were at the start of each tick,
+# so timing differences can never add up. A savestate is kept at the start of each stage, so stages can be played back on their own.
+#
+# File layout: one line of JSON with everything but the ticks, then one fixed size record per tick, so any tick can be read without the rest.
+
+import base64
+import json
+import os
+import struct
+from array import array
+from bisect import bisect_left
+
+import arcade
+
+import assets.input_logic as il
+import assets.savestate as ss
+from assets.stage_pack import StagePack
+
+# Bumped whenever the game plays differently, e.g. enemies steering another way, or the file layout changes, so older replays aren't rendered wrong.
+REPLAY_VERSION = 4
+REPLAY_EXTENSION = ".replay"
+
+# Tick layout: clock time since the run started, delta time, player x, y, change_x, change_y, player pose, and whether the window had focus.
+TICK = struct.Struct("<ddddddHB")
+CLOCK, DELTA_TIME, X, Y, CHANGE_X, CHANGE_Y, POSE, FOCUSED = range(8)
+
+# Event kinds.
+RELEASE, PRESS, RELEASE_ALL = range(3)
+
+# Keys that only change how the game is shown or heard, not how it plays. Left out when playing back, so every render looks the same.
+DISPLAY_KEYS = (arcade.key.F8, arcade.key.F9, arcade.key.F10, arcade.key.F11, arcade.key.TAB)
+
+# Ticks read from the file at a time while playing back.
+READ_BLOCK = 256
+
+
+def encode_savestate(savestate: ss.Savestate) -> dict:
+    arrays = {name: getattr(savestate, name) for name in ss.Savestate.__slots__ if name != "stage_level"}
+    return {name: base64.b64encode(bytes(values)).decode("ascii") for name, values in arrays.items()}
+
+
+def decode_savestate(stage_level: int, fields: dict) -> ss.Savestate:
+    coins_alive = base64.b64decode(fields["coins_alive"])
+    enemies = array('d', base64.b64decode(fields["enemies"]))
+    portal = array('d', base64.b64decode(fields["portal"]))
+    savestate = ss.Savestate(stage_level, len(coins_alive), len(enemies) // 4, len(portal) // 2)
+    savestate.coins_alive[:] = coins_alive
+    for name in ("player", "coins", "counters"):
+        getattr(savestate, name)[:] = array('d', base64.b64decode(fields[name]))
+    savestate.enemies[:] = enemies
+    savestate.portal[:] = portal
+    return savestate
+
+
+class ReplayRecorder:
+    '''
+    Records a run as it is played. Ticks are kept in one growing buffer, about 50 bytes each, and only written out once the run is complete.
+    '''
+
+    def __init__(self, run_id: str, difficulty: int, key_to_action: dict, best_splits: dict, start_time: float, stage_pack: StagePack):
+        self.start_time = start_time
+        self.header = {
+            "version": REPLAY_VERSION,
+            "run_id": run_id,
+            "difficulty": difficulty,
+            # The stage pack the run was played on. The game's own stages are stored without a folder, so they are found wherever the game is.
+            # The key changes whenever the pack's stages do, so a run is never played back on stages that changed since.
+            "stage_directory": None if stage_pack.shipped else os.path.abspath(stage_pack.directory),
+            "stage_pack_key": stage_pack.key,
+            # The keys are replayed as they were bound on this machine, and the HUD compares against the bests as they were then.
+            "key_to_action": {str(key): action for key, action in key_to_action.items()},
+            "best_splits": {str(stage_level): elapsed for stage_level, elapsed in best_splits.items()},
+            "events": [],
+            "stages": [],
+        }
+        self.ticks = bytearray()
+        self.tick_count = 0
+        self.stage_level = None
+
+        # Game time covered by the ticks so far, the sum of their delta times. The same as the run's total time.
+        self.duration = 0.0
+
+    def key(self, now: float, key: int, kind: int) -> None:
+        '''
+        Records a key press or release, or everything being let go (key is then 0). Played back just before the next tick.
+        '''
+        self.header["events"].append((self.tick_count, now - self.start_time, kind, key))
+
+    def start_stage(self, stage_level: int, savestate: ss.Savestate, input_state: il.InputState, run_state: dict) -> None:
+        '''
+        Marks the next tick as the start of a stage. run_state holds the run's counters, e.g. deaths and total time, at that point.
+        '''
+        self.stage_level = stage_level
+        relative = lambda timestamp: None if timestamp is None else timestamp - self.start_time
+        self.header["stages"].append({
+            "tick": self.tick_count,
+            "stage_level": stage_level,
+            "savestate": encode_savestate(savestate),
+            "hold_counts": {str(action): count for action, count in input_state.hold_counts.items()},
+            "jump_pressed_at": relative(input_state.jump_pressed_at),
+            "grounded_at": relative(input_state.grounded_at),
+            **run_state,
+        })
+
+    def tick(self, now: float, delta_time: float, player: arcade.Sprite, pose: int, focused: bool) -> None:
+        self.ticks += TICK.pack(now - self.start_time, delta_time, player.center_x, player.center_y, player.change_x, player.change_y, pose, focused)
+        self.tick_count += 1
+        self.duration += delta_time
+
+    def save(self, directory: str) -> str | None:
+        '''
+        Writes the replay into directory. Returns its path, or None if it couldn't be written.
+        '''
+        path = os.path.join(directory, self.header["run_id"] + REPLAY_EXTENSION)
+        self.header["tick_count"] = self.tick_count
+        self.header["duration"] = self.duration
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(json.dumps(self.header, separators=(",", ":")).encode("utf-8") + b"\n")
+                file.write(self.ticks)
+        except OSError as e:
+            print(f"Could not save the replay ({e}).")
+            return None
+        return path
+
+
+class Replay:
+    '''
+    A recorded run, read from disk. Ticks stay in the file and are streamed a block at a time.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            header = json.loads(file.readline())
+            self.data_offset = file.tell()
+        if header.get("version") != REPLAY_VERSION:
+            raise ValueError(f"{path} is a version {header.get('version')} replay, expected version {REPLAY_VERSION}")
+
+        self.run_id = header["run_id"]
+        self.difficulty = header["difficulty"]
+        self.stage_directory = header["stage_directory"]
+        self.stage_pack_key = header["stage_pack_key"]
+        self.key_to_action = {int(key): action for key, action in header["key_to_action"].items()}
+        self.best_splits = {int(stage_level): elapsed for stage_level, elapsed in header["best_splits"].items()}
+        self.events = header["events"]
+        self.event_ticks = [event[0] for event in self.events]
+        self.stages = header["stages"]
+        self.tick_count = header["tick_count"]
+        self.duration = header["duration"]
+
+    def stage_ticks(self, index: int) -> range:
+        '''
+        The ticks played on the index-th stage of the run, counting deaths and restarts.
+        '''
+        end = self.stages[index + 1]["tick"] if index + 1 < len(self.stages) else self.tick_count
+        return range(self.stages[index]["tick"], end)
+
+    def events_during(self, ticks: range) -> list:
+        '''
+        The key events played back just before each of the ticks, as (tick, clock time, kind, key).
+        '''
+        return self.events[bisect_left(self.event_ticks, ticks.start):bisect_left(self.event_ticks, ticks.stop)]
+
+    def ticks(self, start: int, stop: int):
+        '''
+        Yields each tick from start up to stop, as a tuple laid out like TICK.
+        '''
+        with open(self.path, "rb") as file:
+            file.seek(self.data_offset + start * TICK.size)
+            while start < stop:
+                count = min(READ_BLOCK, stop - start)
+                yield from TICK.iter_unpack(file.read(count * TICK.size))
+                start += count
+
+    def tick(self, index: int) -> tuple:
+        return next(self.ticks(index, index + 1))
+
+    def savestate(self, index: int) -> ss.Savestate:
+        stage = self.stages[index]
+        return decode_savestate(stage["stage_level"], stage["savestate"])
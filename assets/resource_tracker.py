@@ -0,0 +1,107 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Resource Tracking Section. Only used in DEV mode, to catch leaks across stage loads and respawns.
+
+import arcade
+import gc
+import tracemalloc
+
+
+def count_live_sprites() -> int:
+    '''
+    Counts every sprite object still alive, including ones no longer in any sprite list.
+    Walks the whole heap, so this is only used while tracking is on.
+    '''
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, arcade.BasicSprite))
+
+
+def sample_resources(window: arcade.Window) -> dict:
+    '''
+    Returns the current count of live sprites, cached textures, atlas textures and images, and the Python heap size.
+    '''
+    atlas = window.ctx.default_atlas
+    heap_size, _ = tracemalloc.get_traced_memory()
+    return {
+        "sprites": count_live_sprites(),
+        "cached_textures": len(arcade.texture.default_texture_cache.texture_cache),
+        "atlas_textures": len(atlas.textures),
+        "atlas_images": len(atlas.images),
+        "heap_kb": heap_size // 1024,
+    }
+
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    '''
+    Snapshot the Python heap, leaving out the memory tracemalloc uses for itself.
+    '''
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def format_sample(sample: dict) -> str:
+    return (f"sprites: {sample['sprites']}, cached textures: {sample['cached_textures']}, "
+            f"atlas: {sample['atlas_textures']} textures / {sample['atlas_images']} images, heap: {sample['heap_kb']} KB")
+
+
+class ResourceTracker:
+    '''
+    Reports the resources in use each time a stage loads, and watches for growth while the same stage is respawned over and over.
+    The baseline is taken after the first check_interval respawns, so textures uploaded the first time they are drawn don't count as growth.
+    Every check_interval respawns after that are compared against it.
+    '''
+
+    def __init__(self, window: arcade.Window, check_interval: int = 25, heap_growth_kb: int = 256):
+        self.window = window
+        self.check_interval = check_interval
+        self.heap_growth_kb = heap_growth_kb
+
+        # Baseline sample and heap snapshot for the stage currently being played.
+        self.stage_level = None
+        self.respawns = 0
+        self.baseline = None
+        self.baseline_snapshot = None
+
+        tracemalloc.start()
+        print(f"Resource tracking on. {format_sample(sample_resources(window))}")
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        print("Resource tracking off.")
+
+    def stage_loaded(self, stage_level: int) -> None:
+        '''
+        Report what a freshly loaded stage is using, and start a new baseline for its respawns.
+        '''
+        self.stage_level = stage_level
+        self.respawns = 0
+        self.baseline = None
+        self.baseline_snapshot = None
+        print(f"Stage {stage_level} loaded. {format_sample(sample_resources(self.window))}")
+
+    def respawned(self) -> None:
+        '''
+        Count a respawn on the current stage, checking for growth against the baseline every check_interval respawns.
+        '''
+        self.respawns += 1
+        if self.respawns % self.check_interval:
+            return
+
+        if self.baseline is None:
+            self.baseline = sample_resources(self.window)
+            self.baseline_snapshot = take_snapshot()
+            return
+
+        sample = sample_resources(self.window)
+        grown = [key for key in ("sprites", "cached_textures", "atlas_textures", "atlas_images") if sample[key] > self.baseline[key]]
+        heap_growth = sample["heap_kb"] - self.baseline["heap_kb"]
+        if heap_growth > self.heap_growth_kb:
+            grown.append("heap")
+
+        if not grown:
+            print(f"Stage {self.stage_level}, {self.respawns} respawns: no growth. {format_sample(sample)}")
+            return
+
+        # Something grew. Show where the extra Python memory was allocated.
+        print(f"WARNING: Stage {self.stage_level} grew after {self.respawns} respawns ({', '.join(grown)}, heap +{heap_growth} KB). {format_sample(sample)}")
+        differences = take_snapshot().compare_to(self.baseline_snapshot, "lineno")
+        for difference in differences[:5]:
+            print(f"    {difference}")
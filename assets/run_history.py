@@ -0,0 +1,189 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Run History Section. Records every completed stage and run in an SQLite database, for splits and personal bests.
+# Records are kept per stage pack. The game's own stages are recorded under the empty pack key.
+#
+# Writes are queued and committed in batches by a background thread, so recording a split never waits on the disk.
+# The indexes match the queries below, so each one only reads the rows it returns, however many runs are stored.
+
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS splits (
+    run_id TEXT NOT NULL,
+    stage_level INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    elapsed REAL NOT NULL,
+    deaths INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    pack TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    difficulty TEXT NOT NULL,
+    total_time REAL NOT NULL,
+    deaths INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    pack TEXT NOT NULL
+);
+
+-- Best split per stage: a single index seek to the smallest elapsed time.
+CREATE INDEX IF NOT EXISTS splits_best ON splits (pack, difficulty, stage_level, elapsed);
+
+-- Last N splits on a stage: read backwards from the newest, with the elapsed time in the index so the table isn't touched.
+CREATE INDEX IF NOT EXISTS splits_recent ON splits (pack, difficulty, stage_level, recorded_at, elapsed);
+
+-- Last N completed runs, the same way.
+CREATE INDEX IF NOT EXISTS runs_recent ON runs (pack, difficulty, recorded_at, total_time);
+"""
+
+
+def difficulty_name(difficulty: int) -> str:
+    return "hard" if difficulty == 20 else "normal"
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+def percentile(values: list, percent: float) -> float:
+    '''
+    Nearest-rank percentile of a list of values. Returns 0 for an empty list.
+    '''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, round(percent / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class RunHistory:
+    '''
+    The run history of one stage pack. pack is the pack's records key, and stages the levels played in a run, see StagePack.
+    Queries run on the caller's thread. Writes are committed in batches on a background thread,
+    every flush_interval seconds or once batch_size records are waiting, whichever comes first.
+    '''
+
+    def __init__(self, path: str, pack: str, stages: list, batch_size: int = 100, flush_interval: float = 1.0):
+        self.path = path
+        self.pack = pack
+        self.stages = list(stages)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # Write-ahead logging lets queries read while the writer thread commits.
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+        self.writes = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name="run-history", daemon=True)
+        self.writer.start()
+
+    def record_split(self, run_id: str, stage_level: int, difficulty: int, elapsed: float, deaths: int) -> None:
+        '''
+        Queue a completed stage to be written. Returns immediately.
+        '''
+        self.writes.put_nowait(("INSERT INTO splits VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (run_id, stage_level, difficulty_name(difficulty), elapsed, deaths, time.time(), self.pack)))
+
+    def record_run(self, run_id: str, difficulty: int, total_time: float, deaths: int) -> None:
+        '''
+        Queue a completed run to be written. Returns immediately.
+        '''
+        self.writes.put_nowait(("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                                (run_id, difficulty_name(difficulty), total_time, deaths, time.time(), self.pack)))
+
+    def close(self) -> None:
+        '''
+        Write everything still queued, then stop the writer thread.
+        '''
+        if self.writer.is_alive():
+            self.writes.put_nowait(None)
+            self.writer.join()
+        self.connection.close()
+
+    def write_loop(self) -> None:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        running = True
+        while running:
+            # Wait for the first write, then collect more until the batch is full or the flush interval is up.
+            batch = [self.writes.get()]
+            deadline = time.perf_counter() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.writes.get(timeout=max(0.0, deadline - time.perf_counter())))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                batch.pop()
+                running = False
+
+            # One transaction per batch.
+            try:
+                with connection:
+                    for statement, parameters in batch:
+                        connection.execute(statement, parameters)
+            except sqlite3.Error as e:
+                print(f"Could not save run history ({e}).")
+        connection.close()
+
+    def best_split(self, stage_level: int, difficulty: int) -> float | None:
+        row = self.connection.execute("SELECT MIN(elapsed) FROM splits WHERE pack = ? AND difficulty = ? AND stage_level = ?",
+                                      (self.pack, difficulty_name(difficulty), stage_level)).fetchone()
+        return row[0]
+
+    def best_splits(self, difficulty: int) -> dict:
+        '''
+        Returns the best split on each stage that has one, keyed by stage level. One index seek per stage.
+        '''
+        best = {}
+        for stage_level in self.stages:
+            elapsed = self.best_split(stage_level, difficulty)
+            if elapsed is not None:
+                best[stage_level] = elapsed
+        return best
+
+    def sum_of_best(self, difficulty: int) -> float | None:
+        '''
+        The sum of the best split on every stage, or None until every stage has been completed at least once.
+        '''
+        best = self.best_splits(difficulty)
+        return sum(best.values()) if len(best) == len(self.stages) else None
+
+    def recent_splits(self, stage_level: int, difficulty: int, last: int = 100) -> list:
+        rows = self.connection.execute("SELECT elapsed FROM splits WHERE pack = ? AND difficulty = ? AND stage_level = ? ORDER BY recorded_at DESC LIMIT ?",
+                                       (self.pack, difficulty_name(difficulty), stage_level, last))
+        return [elapsed for elapsed, in rows]
+
+    def recent_runs(self, difficulty: int, last: int = 100) -> list:
+        rows = self.connection.execute("SELECT total_time FROM runs WHERE pack = ? AND difficulty = ? ORDER BY recorded_at DESC LIMIT ?",
+                                       (self.pack, difficulty_name(difficulty), last))
+        return [total_time for total_time, in rows]
+
+    def split_percentiles(self, stage_level: int, difficulty: int, percents: tuple = (50, 90), last: int = 100) -> tuple:
+        '''
+        Percentiles of the last splits on a stage, e.g. the median and 90th percentile.
+        '''
+        splits = self.recent_splits(stage_level, difficulty, last)
+        return tuple(percentile(splits, percent) for percent in percents)
+
+    def run_percentiles(self, difficulty: int, percents: tuple = (50, 90), last: int = 100) -> tuple:
+        runs = self.recent_runs(difficulty, last)
+        return tuple(percentile(runs, percent) for percent in percents)
+
+    def percent_faster(self, total_time: float, difficulty: int, last: int = 100) -> float | None:
+        '''
+        The percentage of the last completed runs slower than total_time, or None if there are none yet.
+        '''
+        runs = self.recent_runs(difficulty, last)
+        if not runs:
+            return None
+        return 100 * sum(1 for run in runs if run > total_time) / len(runs)
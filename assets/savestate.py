@@ -0,0 +1,97 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Practice Mode Savestate Section.
+
+import arcade
+from array import array
+
+# Layout of the counters array.
+STAGE_TIME, ANIMATION_CLOCK, JUMP_COUNTER, COINS_COLLECTED, PORTAL_HIDDEN = range(5)
+
+
+class Savestate:
+    '''
+    A compact snapshot of everything that changes while playing a stage.
+    Sprites are stored by their index in the stage's layers, so a snapshot still applies after the stage is reloaded.
+    All storage is allocated up front. Saving and loading only overwrite values in place.
+    '''
+    __slots__ = ("stage_level", "player", "coins", "coins_alive", "enemies", "portal", "counters")
+
+    def __init__(self, stage_level: int, coin_count: int, enemy_count: int, portal_count: int):
+        self.stage_level = stage_level
+        self.player = array('d', bytes(8 * 4))                 # center_x, center_y, change_x, change_y
+        self.coins = array('d', bytes(8 * 4 * coin_count))     # center_x, center_y, change_x, change_y per coin
+        self.coins_alive = bytearray(coin_count)               # 1 if the coin hasn't been collected yet
+        self.enemies = array('d', bytes(8 * 4 * enemy_count))  # center_x, center_y, change_x, change_y per enemy
+        self.portal = array('d', bytes(8 * 2 * portal_count))  # center_x, center_y per portal section
+        self.counters = array('d', bytes(8 * 5))               # See the layout constants above.
+
+    def matches(self, stage_level: int, all_coins: list, enemies: arcade.SpriteList, portal: arcade.SpriteList) -> bool:
+        '''
+        Check the snapshot was taken on this stage, and the stage still has the same layout.
+        '''
+        return (self.stage_level == stage_level and len(self.coins_alive) == len(all_coins)
+                and len(self.enemies) == 4 * len(enemies) and len(self.portal) == 2 * len(portal))
+
+
+def save_sprite(values: array, index: int, sprite: arcade.Sprite) -> None:
+    values[index] = sprite.center_x
+    values[index + 1] = sprite.center_y
+    values[index + 2] = sprite.change_x
+    values[index + 3] = sprite.change_y
+
+
+def load_sprite(values: array, index: int, sprite: arcade.Sprite) -> None:
+    sprite.center_x = values[index]
+    sprite.center_y = values[index + 1]
+    sprite.change_x = values[index + 2]
+    sprite.change_y = values[index + 3]
+
+
+def save_state(snapshot: Savestate, player: arcade.Sprite, all_coins: list, coins: arcade.SpriteList, enemies: arcade.SpriteList, portal: arcade.SpriteList, counters: tuple) -> None:
+    '''
+    Write the current state of the stage into the snapshot.
+    all_coins holds every coin the stage started with, coins holds the ones still in play.
+    counters is (stage_time, animation_clock, jump_counter, coins_collected, portal_hidden).
+    '''
+    save_sprite(snapshot.player, 0, player)
+
+    for index, coin in enumerate(all_coins):
+        save_sprite(snapshot.coins, 4 * index, coin)
+        snapshot.coins_alive[index] = coins in coin.sprite_lists
+
+    for index, enemy in enumerate(enemies):
+        save_sprite(snapshot.enemies, 4 * index, enemy)
+
+    for index, section in enumerate(portal):
+        snapshot.portal[2 * index] = section.center_x
+        snapshot.portal[2 * index + 1] = section.center_y
+
+    for index, value in enumerate(counters):
+        snapshot.counters[index] = value
+
+
+def load_state(snapshot: Savestate, player: arcade.Sprite, all_coins: list, coins: arcade.SpriteList, enemies: arcade.SpriteList, portal: arcade.SpriteList) -> array:
+    '''
+    Restore the stage to the state saved in the snapshot, moving the existing sprites back in place.
+    Collected coins are put back into play and coins collected after the snapshot are removed.
+    Returns the saved counters, in the same order they were given to save_state.
+    '''
+    load_sprite(snapshot.player, 0, player)
+
+    for index, coin in enumerate(all_coins):
+        load_sprite(snapshot.coins, 4 * index, coin)
+        in_play = coins in coin.sprite_lists
+        if snapshot.coins_alive[index] and not in_play:
+            coins.append(coin)
+        elif not snapshot.coins_alive[index] and in_play:
+            coins.remove(coin)
+
+    for index, enemy in enumerate(enemies):
+        load_sprite(snapshot.enemies, 4 * index, enemy)
+
+    for index, section in enumerate(portal):
+        section.center_x = snapshot.portal[2 * index]
+        section.center_y = snapshot.portal[2 * index + 1]
+
+    return snapshot.counters
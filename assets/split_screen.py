@@ -0,0 +1,429 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Split Screen Race Section.
+#
+# Two players race the same stage on one machine, each with their own half of the window.
+# The stage's map, textures, static layers and collision data are loaded once into a SharedStage that both racers only read.
+# Each Racer copies just what changes while playing: its player, coins, enemies, portal, counters and physics engine.
+
+import arcade
+import time
+
+import assets.constants as const
+import assets.environment_logic as envl
+import assets.input_logic as il
+import assets.player_logic as pl
+import assets.savestate as ss
+import assets.stage_systems as systems
+from assets.chunk_logic import ChunkedLayer
+from assets.flow_field import FlowField, blocked_cells
+from assets.stage_pack import StageEntry
+from assets.tileset_cache import CachedTileMap
+
+# Size of each racer's half of the screen, in virtual pixels.
+VIEW_WIDTH = 320
+VIEW_HEIGHT = 360
+
+
+def copy_sprites(sprite_list: arcade.SpriteList) -> arcade.SpriteList:
+    '''
+    Copies a layer's sprites for one racer. The copies share the original textures and hit boxes, only their positions are their own.
+    '''
+    copies = arcade.SpriteList()
+    for sprite in sprite_list:
+        copy = arcade.Sprite(sprite.texture, scale = sprite.scale, center_x = sprite.center_x, center_y = sprite.center_y, angle = sprite.angle)
+        copy.textures = sprite.textures
+        copies.append(copy)
+    return copies
+
+
+class SharedStage:
+    '''
+    Everything about a stage that stays the same while it is raced: the parsed map, its textures,
+    the static layers and their chunks, the spatially hashed collision layers and the compiled stage systems.
+    Loaded once per stage and never changed, so any number of racers can use it.
+    The coins, enemies and portal layers are only templates. Each racer plays with copies of them.
+    '''
+
+    def __init__(self, entry: StageEntry, coin_textures: list, evil_coin_textures: list):
+        self.stage_level = entry.level
+        self.map = CachedTileMap(entry.path, scaling = 1, lazy = True, layer_options = {layer: {"use_spatial_hash": True} for layer in const.SPATIAL_HASH_LAYERS})
+        self.stage_width = self.map.width * self.map.tile_width * self.map.scaling
+        self.stage_height = self.map.height * self.map.tile_height * self.map.scaling
+
+        # Collision layers. The physics engines only read the walls, so one spatial hash serves every racer.
+        self.terrain = self.map.sprite_lists["terrain"]
+        self.dangerous_terrain = self.map.sprite_lists["dangerous_terrain"]
+        self.start_position = self.map.sprite_lists["starting_position"][0].position
+
+        # Templates for the layers each racer gets a copy of.
+        self.coins = self.map.sprite_lists["coins"]
+        self.enemies = self.map.sprite_lists["enemies"]
+        self.portal = self.map.sprite_lists["portal"]
+
+        # The stage's behaviors. Systems keep no state of their own, so both racers run the same ones.
+        config = systems.stage_config(entry.config, self.map.properties)
+        envl.setup_animated_coins(self.coins, coin_textures)
+        if config.get("evil_coins"):
+            envl.setup_animated_coins(self.enemies, evil_coin_textures)
+        self.background_color = config.get("color")
+        self.stage_systems = systems.compile_stage_systems(config)
+
+        # Where the terrain is, for the racers' flow fields. Each racer steers towards themselves, so each has their own field.
+        self.tile_size = self.map.tile_width * self.map.scaling
+        self.blocked_cells = None
+        if systems.uses_flow_field(config):
+            self.blocked_cells = blocked_cells(self.terrain, self.map.width, self.map.height, self.tile_size)
+
+        # Layer names in draw order, and the static layers split into chunks. Chunks are built once for both views.
+        self.layer_names = list(self.map.sprite_lists)
+        self.chunked_layers = {name: ChunkedLayer(sprite_list, const.CHUNK_SIZE, const.CHUNK_PRELOAD_MARGIN)
+                               for name, sprite_list in self.map.sprite_lists.items() if name not in const.MOVING_LAYERS}
+
+    def update(self, views: list) -> None:
+        '''
+        Streams chunks around every racer's view. views holds each view's (left, bottom, right, top).
+        '''
+        left = min(view[0] for view in views)
+        bottom = min(view[1] for view in views)
+        right = max(view[2] for view in views)
+        top = max(view[3] for view in views)
+        for chunked_layer in self.chunked_layers.values():
+            chunked_layer.update(left, bottom, right, top)
+
+    def draw(self, racer) -> None:
+        '''
+        Draws the stage as one racer sees it: the shared static layers, with that racer's own copies of the moving layers.
+        '''
+        for name in self.layer_names:
+            if name in self.chunked_layers:
+                self.chunked_layers[name].draw(pixelated = True)
+            else:
+                racer.moving_layers[name].draw(pixelated = True)
+
+    def unload(self) -> None:
+        for chunked_layer in self.chunked_layers.values():
+            chunked_layer.clear()
+        for sprite_list in self.map.sprite_lists.values():
+            sprite_list.clear()
+        self.chunked_layers = {}
+
+
+class Racer:
+    '''
+    One player's side of a race: their sprite, controls, camera, counters and physics engine,
+    plus copies of the stage's coins, enemies and portal.
+    Has the same attributes the stage systems use on the game, so the systems run on a racer unchanged.
+    '''
+
+    def __init__(self, name: str, key_to_action: dict, pose_textures: list, color: tuple):
+        self.name = name
+        self.player = arcade.Sprite(pose_textures[0])
+        self.player.textures = pose_textures
+        self.players = arcade.SpriteList()
+        self.players.append(self.player)
+        self.player_pose = 0
+
+        self.input = il.InputState(key_to_action, const.JUMP_BUFFER_TIME, const.COYOTE_TIME)
+        self.contacts = envl.Contacts()
+        self.camera = arcade.camera.Camera2D()
+        self.gui_camera = arcade.camera.Camera2D()
+
+        # Counters kept for the whole race.
+        self.deaths = 0
+        self.wins = 0
+
+        # The stage being raced, and this racer's state on it. Set by enter_stage().
+        self.stage = None
+        self.stage_time_limit = 0
+        self.coins = arcade.SpriteList()
+        self.enemies = arcade.SpriteList()
+        self.portal = arcade.SpriteList()
+        self.flow_field = None
+
+        self.gui_status = arcade.Text(text = "", x = 8, y = 330, color = color, font_size = 8, font_name = "Public Pixel", bold = True)
+        self.gui_score = arcade.Text(text = "", x = 8, y = 310, color = color, font_size = 8, font_name = "Public Pixel", bold = True)
+
+    @property
+    def view(self) -> tuple:
+        ''' The part of the stage this racer's camera shows, as (left, bottom, right, top). '''
+        left = self.camera.position[0]
+        return (left, 0, left + VIEW_WIDTH, VIEW_HEIGHT)
+
+    def enter_stage(self, stage: SharedStage, stage_time: float) -> None:
+        '''
+        Starts racing a newly loaded stage, copying the parts of it that change while playing.
+        '''
+        self.stage = stage
+        self.stage_time_limit = stage_time
+        self.coins = copy_sprites(stage.coins)
+        self.enemies = copy_sprites(stage.enemies)
+        self.portal = copy_sprites(stage.portal)
+        self.moving_layers = {"coins": self.coins, "enemies": self.enemies, "portal": self.portal}
+        self.all_coins = list(self.coins)
+        self.coins_to_collect = len(self.coins)
+        self.flow_field = None
+        if stage.blocked_cells is not None:
+            self.flow_field = FlowField(stage.blocked_cells, stage.map.width, stage.map.height, stage.tile_size)
+
+        # Store the portal off screen until every coin is collected, as in a normal run.
+        for section in self.portal:
+            section.center_x -= stage.stage_width
+            section.center_y -= VIEW_HEIGHT
+
+        self.player.position = stage.start_position
+        self.player.velocity = (0, 0)
+        self.physics_engine = arcade.PhysicsEnginePlatformer(self.player, walls = stage.terrain, gravity_constant = const.GRAVITY)
+
+        # Record how the stage starts, so respawning puts this racer's copies back without copying them again.
+        self.start_state = ss.Savestate(stage.stage_level, len(self.all_coins), len(self.enemies), len(self.portal))
+        ss.save_state(self.start_state, self.player, self.all_coins, self.coins, self.enemies, self.portal, (0, 0, 1, 0, True))
+        self.respawn()
+
+    def respawn(self) -> None:
+        ss.load_state(self.start_state, self.player, self.all_coins, self.coins, self.enemies, self.portal)
+        self.set_player_pose(0)
+        self.stage_time = self.stage_time_limit
+        self.animation_clock = 0
+        self.input.clear()
+        self.portal_hidden = True
+        self.coins_collected = 0
+        self.JUMP_COUNTER = 1
+        self.follow_player()
+
+    def died(self) -> None:
+        self.deaths = pl.player_dies_sequence(self.deaths)
+        self.respawn()
+
+    def set_player_pose(self, pose: int) -> None:
+        if pose != self.player_pose:
+            self.player_pose = pose
+            self.player.set_texture(pose)
+
+    def follow_player(self) -> None:
+        left = min(max(self.player.center_x - VIEW_WIDTH / 2, 0), max(self.stage.stage_width - VIEW_WIDTH, 0))
+        self.camera.position = (left, 0)
+
+    def update(self, delta_time: float, now: float) -> bool:
+        '''
+        Plays one tick of the stage, following the same rules as a normal run. Returns True if the racer entered the portal.
+        '''
+        stage = self.stage
+        actions = self.input.update(now)
+
+        self.stage_time -= delta_time
+        if self.stage_time < 0:
+            self.died()
+
+        pl.player_movement(self.player, actions)
+        if pl.player_out_of_bounds(self.player, stage.stage_width, VIEW_HEIGHT):
+            self.died()
+
+        contacts = envl.find_contacts(self.player, self.coins, stage.dangerous_terrain, self.enemies, self.contacts)
+        if contacts.death is not None:
+            self.died()
+        self.coins_collected = envl.collect_coins(contacts.coins, self.coins_collected)
+        self.animation_clock += delta_time
+        envl.animate_coin(self.animation_clock, self.coins)
+        if self.animation_clock > 1:
+            self.animation_clock = 0
+
+        self.set_player_pose(pl.player_pose(self.player, self.physics_engine.can_jump(), actions, self.animation_clock, self.player_pose))
+
+        # Jumping, with the same jump buffer and coyote time as a normal run.
+        if self.physics_engine.can_jump(18):
+            self.JUMP_COUNTER = 1
+        if self.physics_engine.can_jump():
+            self.input.note_grounded(now)
+        if self.input.jump_buffered(now):
+            if self.input.in_coyote_window(now):
+                self.JUMP_COUNTER = 1
+            if self.JUMP_COUNTER < const.MAX_JUMPS:
+                self.player.change_y = const.PLAYER_JUMP_VELOCITY
+                self.JUMP_COUNTER += 1
+                self.input.consume_jump(now)
+
+        # Bring the portal back once every coin is collected.
+        if envl.check_coins_collected(self.coins_collected, self.coins_to_collect) and self.portal_hidden:
+            for section in self.portal:
+                section.center_x += stage.stage_width
+                section.center_y += VIEW_HEIGHT
+            self.portal_hidden = False
+
+        if not self.portal_hidden and envl.check_for_environment_contact(self.player, self.portal):
+            return True
+
+        for system in stage.stage_systems:
+            system(self)
+
+        self.players.update()
+        self.physics_engine.update()
+        self.enemies.update()
+        self.coins.update()
+        self.portal.update()
+        self.follow_player()
+        return False
+
+
+class RaceView(arcade.View):
+    """
+    A split-screen race between two players on one keyboard. Each stage goes to whoever reaches its portal first,
+    then both move on to the next one. ESC returns to the title screen.
+    """
+
+    def __init__(self, game_view: arcade.View, coin_textures: list, evil_coin_textures: list, stage_level: int | None = None):
+        """ Called when the race is started from the title screen. game_view is shown again when the race ends. """
+        super().__init__()
+        self.game_view = game_view
+        self.coin_textures = coin_textures
+        self.evil_coin_textures = evil_coin_textures
+        self.stage_pack = game_view.stage_pack
+        self.difficulty = game_view.difficulty
+        self.portal_sound = game_view.portal_sound
+        self.background_color = arcade.color.DARK_BROWN
+
+        # Both players share one set of pose textures, made once.
+        template = arcade.Sprite(const.resource_path("assets/player_textures/player.png"))
+        pl.add_player_textures(template)
+
+        self.racers = [Racer("Player 1", il.bindings_to_keys(il.RACE_BINDINGS[0]), template.textures, arcade.color.CELADON_GREEN),
+                       Racer("Player 2", il.bindings_to_keys(il.RACE_BINDINGS[1]), template.textures, arcade.color.LIGHT_SALMON_PINK)]
+
+        self.gui_camera = arcade.camera.Camera2D()
+        self.gui_result = arcade.Text(text = "", x = 320, y = 200, color = arcade.color.WHITE, font_size = 12, font_name = "Public Pixel", bold = True, anchor_x = "center")
+        self.gui_return = arcade.Text(text = "Press ESC to return to the title screen", x = 320, y = 160, color = arcade.color.WHITE, font_size = 8, font_name = "Public Pixel", anchor_x = "center")
+
+        # Every stage of a run is raced, up to the pack's end screen.
+        self.last_stage = self.stage_pack.play_levels[-1]
+
+        self.race_over = False
+        self.stage = None
+        self.stage_level = stage_level if stage_level is not None else self.stage_pack.play_levels[0]
+        self.load_stage()
+        self.setup_cameras()
+
+    def load_stage(self):
+        """Loads the stage once, and gives each racer their own copy of the parts that change."""
+
+        start = time.perf_counter()
+        if self.stage is not None:
+            self.stage.unload()
+
+        self.stage = SharedStage(self.stage_pack.entry(self.stage_level), self.coin_textures, self.evil_coin_textures)
+        if self.stage.background_color is not None:
+            self.background_color = self.stage.background_color
+
+        for racer in self.racers:
+            racer.enter_stage(self.stage, self.stage_pack.stage_time(self.stage_level, self.difficulty))
+        self.stage.update([racer.view for racer in self.racers])
+        print(f"Race: loaded stage {self.stage_level} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def stage_won(self, winner: Racer):
+        """Scores the stage for the racer who reached the portal first, and moves both on to the next one."""
+
+        arcade.play_sound(self.portal_sound)
+        winner.wins += 1
+        if self.stage_level >= self.last_stage:
+            self.race_over = True
+            first, second = self.racers
+            if first.wins == second.wins:
+                self.gui_result.text = f"Tied {first.wins} - {second.wins}"
+            else:
+                leader = max(self.racers, key = lambda racer: racer.wins)
+                self.gui_result.text = f"{leader.name} wins {max(first.wins, second.wins)} - {min(first.wins, second.wins)}"
+            return
+
+        self.stage_level = self.stage_pack.next_level(self.stage_level)
+        self.load_stage()
+
+    def setup_cameras(self):
+        """Gives each racer half of the window, side by side, each showing 320x360 of the stage."""
+
+        half = self.window.width / 2
+        for index, racer in enumerate(self.racers):
+            viewport = arcade.LRBT(index * half, (index + 1) * half, 0, self.window.height)
+            for camera in (racer.camera, racer.gui_camera):
+                camera.projection = arcade.LRBT(0, VIEW_WIDTH, 0, VIEW_HEIGHT)
+                camera.viewport = viewport
+            racer.gui_camera.position = (0, 0)
+
+        self.gui_camera.projection = arcade.LRBT(0, 2 * VIEW_WIDTH, 0, VIEW_HEIGHT)
+        self.gui_camera.viewport = arcade.LRBT(0, self.window.width, 0, self.window.height)
+        self.gui_camera.position = (0, 0)
+
+    def on_draw(self):
+        """
+        Render both halves of the screen.
+        """
+        self.clear()
+
+        for racer in self.racers:
+            racer.camera.use()
+            self.stage.draw(racer)
+
+            # The other racer is drawn faded, like a ghost.
+            for other in self.racers:
+                if other is not racer:
+                    other.players.alpha = const.GHOST_ALPHA
+                    other.players.draw(pixelated = True)
+                    other.players.alpha = 255
+            racer.players.draw(pixelated = True)
+
+            racer.gui_camera.use()
+            racer.gui_status.draw()
+            racer.gui_score.draw()
+
+        # A line between the two halves, and the result once the race is over.
+        self.gui_camera.use()
+        arcade.draw_line(VIEW_WIDTH, 0, VIEW_WIDTH, VIEW_HEIGHT, arcade.color.BLACK, 2)
+        if self.race_over:
+            self.gui_result.draw()
+            self.gui_return.draw()
+
+    def on_update(self, delta_time: float):
+        """
+        Plays a tick for each racer, then streams in the chunks around both views.
+        """
+        if self.race_over:
+            return
+
+        now = time.perf_counter()
+        for racer in self.racers:
+            if racer.update(delta_time, now):
+                self.stage_won(racer)
+                break
+
+        for racer in self.racers:
+            racer.gui_status.text = f"{racer.name}  Level {self.stage_level}  Time: {round(racer.stage_time)}"
+            racer.gui_score.text = f"Wins: {racer.wins}  Deaths: {racer.deaths}  Coins Left: {racer.coins_to_collect - racer.coins_collected}"
+
+        self.stage.update([racer.view for racer in self.racers])
+
+    def on_key_press(self, key: int, key_modifiers: int):
+        """
+        Called whenever a key is pressed. Each racer only reacts to their own keys.
+        """
+        if key == arcade.key.ESCAPE:
+            self.stage.unload()
+            self.game_view.input.release_all()
+            self.game_view.setup_cameras()
+            self.window.show_view(self.game_view)
+            return
+
+        now = time.perf_counter()
+        for racer in self.racers:
+            racer.input.press(key, now)
+
+    def on_key_release(self, key: int, key_modifiers: int):
+        """
+        Called whenever the user lets off a previously pressed key.
+        """
+        now = time.perf_counter()
+        for racer in self.racers:
+            racer.input.release(key, now)
+
+    def on_resize(self, width: int, height: int):
+        """
+        Called whenever the window is resized.
+        """
+        self.setup_cameras()
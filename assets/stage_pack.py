@@ -0,0 +1,183 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Stage Pack Section.
+#
+# A stage pack is a folder of TMX stages with one manifest index, stage_pack.json, listing every stage: its level, its file,
+# its time limit on each difficulty, its behaviors (see stage_systems.py) and a hash of its file's contents.
+# Only the manifest is read up front, so a pack of hundreds of stages can be listed and picked from without parsing any TMX file.
+# Each stage's file is parsed when it is played. Manifests are written and updated with build_stage_pack.py.
+#
+# Levels are played in order, starting from the title screen at level 0. The stage whose config has "end_screen" ends a run,
+# and the one with "controls_screen" shows the controls. In a pack without an end screen, e.g. a folder with no manifest,
+# the last stage is the end screen.
+
+import hashlib
+import json
+import os
+import re
+
+from assets.constants import DIFFICULTY_NAMES, STAGE_PACK_MANIFEST, resource_path
+
+MANIFEST_FORMAT = 1
+
+# Folders without a manifest are indexed by the original naming convention, taa_stage_{level}.tmx.
+STAGE_FILE_PATTERN = re.compile(r"taa_stage_(\d+)\.tmx$")
+
+# Where the game's own stages are.
+SHIPPED_DIRECTORY = "assets/stage_files"
+
+# Time limit, in seconds, of a stage with no time given. A difficulty with no time of its own uses the normal time.
+DEFAULT_STAGE_TIME = 60
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+class StageEntry:
+    '''
+    One stage of a pack, as listed in its manifest. Holds no map data. path is where its TMX file is.
+    '''
+    __slots__ = ("level", "file", "path", "times", "config", "sha256")
+
+    def __init__(self, directory: str, level: int, file: str, times: dict, config: dict, sha256: str):
+        self.level = level
+        self.file = file
+        self.path = os.path.join(directory, file)
+        self.times = times
+        self.config = config
+        self.sha256 = sha256
+
+    def stage_time(self, difficulty: int) -> float:
+        '''
+        The stage's time limit on a difficulty, e.g. -1 for normal.
+        '''
+        return self.times.get(DIFFICULTY_NAMES[difficulty], self.times.get("normal", DEFAULT_STAGE_TIME))
+
+    def to_json(self) -> dict:
+        return {"level": self.level, "file": self.file, "times": self.times, "config": self.config, "sha256": self.sha256}
+
+
+def index_stage_files(directory: str) -> list:
+    '''
+    Returns an entry for each taa_stage_{level}.tmx file in directory, found by name, with no times or behaviors.
+    Each file is hashed, but none is parsed.
+    '''
+    entries = []
+    for filename in sorted(os.listdir(directory)):
+        match = STAGE_FILE_PATTERN.fullmatch(filename)
+        if match:
+            entries.append(StageEntry(directory, int(match.group(1)), filename, {}, {}, file_hash(os.path.join(directory, filename))))
+    return sorted(entries, key = lambda entry: entry.level)
+
+
+def read_manifest(path: str) -> tuple:
+    '''
+    Returns the pack name and stage entries in a manifest.
+    '''
+    with open(path, "r", encoding = "utf-8") as file:
+        manifest = json.load(file)
+    if manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError(f"{path} is a format {manifest.get('format')} stage pack manifest, expected format {MANIFEST_FORMAT}")
+    directory = os.path.dirname(path)
+    entries = [StageEntry(directory, stage["level"], stage["file"], stage.get("times", {}), stage.get("config", {}), stage.get("sha256"))
+               for stage in manifest["stages"]]
+    return manifest.get("name", os.path.basename(os.path.abspath(directory))), entries
+
+
+def write_manifest(path: str, name: str, entries: list) -> None:
+    '''
+    Writes a manifest with one line per stage, so packs of hundreds of stages stay easy to read and diff.
+    '''
+    stages = ",\n".join("  " + json.dumps(entry.to_json()) for entry in sorted(entries, key = lambda entry: entry.level))
+    with open(path, "w", encoding = "utf-8") as file:
+        file.write(f'{{"format": {MANIFEST_FORMAT}, "name": {json.dumps(name)}, "stages": [\n{stages}\n]}}\n')
+
+
+class StagePack:
+    '''
+    The stages in a folder, read from its manifest. Without a manifest, the folder's stage files are indexed by name instead.
+    '''
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, STAGE_PACK_MANIFEST)
+        if os.path.exists(self.manifest_path):
+            self.name, entries = read_manifest(self.manifest_path)
+        else:
+            self.name, entries = os.path.basename(os.path.abspath(directory)), index_stage_files(directory)
+
+        self.stages = {entry.level: entry for entry in sorted(entries, key = lambda entry: entry.level)}
+        self.levels = list(self.stages)
+        if 0 not in self.stages:
+            raise ValueError(f"The stage pack in {directory} has no title screen, level 0")
+
+        # Run history, personal bests and death logs are kept apart for each pack, under its name and a hash of its stages,
+        # so editing a custom pack's stages or times starts its records over. The game's own stages keep theirs under no key.
+        # Only runs on the game's own stages are sent to the leaderboard.
+        digest = hashlib.sha256(json.dumps([entry.to_json() for entry in self.stages.values()], sort_keys = True).encode()).hexdigest()
+        self.key = re.sub(r"[^A-Za-z0-9_-]+", "_", self.name) + "-" + digest[:12]
+        self.shipped = os.path.abspath(directory) == os.path.abspath(resource_path(SHIPPED_DIRECTORY))
+        self.records_key = "" if self.shipped else self.key
+
+        # The special screens. Without one marked as the end screen, the last stage that isn't the controls screen is the end screen.
+        self.controls_level = next((level for level, entry in self.stages.items() if entry.config.get("controls_screen")), None)
+        self.end_level = next((level for level, entry in self.stages.items() if entry.config.get("end_screen")), None)
+        if self.end_level is None:
+            self.end_level = [level for level in self.levels if level != self.controls_level][-1]
+            self.stages[self.end_level].config = {**self.stages[self.end_level].config, "end_screen": True}
+        self.static_levels = tuple(level for level in (0, self.end_level, self.controls_level) if level is not None)
+
+        # The stages played in a run, from the first after the title screen up to the end screen.
+        self.play_levels = [level for level in self.levels if level not in self.static_levels and level < self.end_level]
+        if not self.play_levels:
+            raise ValueError(f"The stage pack in {directory} has no stages between its title screen and end screen")
+
+        # Stages whose file was checked against its hash since the pack was opened.
+        self.verified = set()
+
+    def entry(self, level: int) -> StageEntry:
+        return self.stages[level]
+
+    def path(self, level: int) -> str:
+        return self.stages[level].path
+
+    def config(self, level: int) -> dict:
+        return self.stages[level].config
+
+    def stage_time(self, level: int, difficulty: int) -> float:
+        return self.stages[level].stage_time(difficulty)
+
+    def stage_files(self) -> dict:
+        ''' Maps each stage's file name to its level. '''
+        return {entry.file: level for level, entry in self.stages.items()}
+
+    def next_level(self, level: int) -> int:
+        '''
+        The level reached through level's portal. Levels missing from the pack are skipped, and the last stage leads to the end screen.
+        '''
+        return next((candidate for candidate in self.play_levels if candidate > level), self.end_level)
+
+    def step_level(self, level: int, step: int) -> int:
+        '''
+        The level step places after level, wrapping around. The title screen is skipped.
+        '''
+        levels = [candidate for candidate in self.levels if candidate != 0] or self.levels
+        index = levels.index(level) if level in levels else -1 if step > 0 else 0
+        return levels[(index + step) % len(levels)]
+
+    def verify(self, level: int) -> bool:
+        '''
+        Checks a stage's file against the hash in the manifest, the first time the stage is loaded. Warns if the file changed since.
+        '''
+        if level in self.verified:
+            return True
+        self.verified.add(level)
+        entry = self.stages[level]
+        current = file_hash(entry.path)
+        if current == entry.sha256:
+            return True
+        print(f"{entry.file} changed since the stage pack was indexed. Run build_stage_pack.py {self.directory} to update its manifest.")
+        entry.sha256 = current
+        return False
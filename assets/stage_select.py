@@ -0,0 +1,274 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Stage Select Section.
+#
+# A DEV mode grid of every stage in the stage pack, a page at a time, drawn from thumbnails. Thumbnails are kept in a single atlas image
+# in the user data folder, along with the hash the pack's manifest lists for the TMX file each one was drawn from.
+# Opening the grid only loads the atlas, so no stage file is read or hashed. Thumbnails missing from the atlas, for stages that are new
+# or were edited since, are drawn when their page is first shown, all at once into an offscreen framebuffer.
+
+import arcade
+import hashlib
+import json
+import os
+import pyglet
+import time
+from PIL import Image
+
+import assets.constants as const
+import assets.stage_systems as systems
+from assets.tileset_cache import CachedTileMap
+
+# Size of each thumbnail in the atlas, in pixels. Drawn at half size on the 640x360 screen, so they stay sharp when upscaled.
+THUMBNAIL_WIDTH = 200
+THUMBNAIL_HEIGHT = 120
+ATLAS_COLUMNS = 8
+
+# Grid layout on screen, in virtual pixels.
+GRID_COLUMNS = 6
+GRID_ROWS = 4
+PAGE_SIZE = GRID_COLUMNS * GRID_ROWS
+CELL_WIDTH = 104
+CELL_HEIGHT = 76
+GRID_LEFT = 8
+GRID_TOP = 320
+
+# Bump to throw away every cached thumbnail, e.g. after changing how they are drawn.
+THUMBNAIL_VERSION = 1
+
+
+def thumbnail_key(entry) -> str:
+    '''
+    Identifies a stage's thumbnail by the hash of its file in the manifest, and the config it is drawn with.
+    '''
+    config = json.dumps(entry.config, sort_keys = True)
+    return hashlib.sha256(f"{entry.sha256}|{config}|{THUMBNAIL_WIDTH}x{THUMBNAIL_HEIGHT}|{THUMBNAIL_VERSION}".encode()).hexdigest()
+
+
+def render_thumbnails(ctx: arcade.ArcadeContext, entries: list) -> dict:
+    '''
+    Draws a thumbnail of each stage pack entry into one offscreen framebuffer, then reads it back once.
+    Returns a thumbnail image for each stage level.
+    '''
+    rows = (len(entries) + ATLAS_COLUMNS - 1) // ATLAS_COLUMNS
+    framebuffer = ctx.framebuffer(color_attachments = [ctx.texture((ATLAS_COLUMNS * THUMBNAIL_WIDTH, rows * THUMBNAIL_HEIGHT), components = 4)])
+    camera = arcade.camera.Camera2D(render_target = framebuffer)
+
+    with framebuffer.activate():
+        framebuffer.clear(color = arcade.color.BLACK)
+        for index, entry in enumerate(entries):
+            tile_map = CachedTileMap(entry.path, scaling = 1, lazy = True)
+            stage_width = tile_map.width * tile_map.tile_width
+            stage_height = tile_map.height * tile_map.tile_height
+            config = systems.stage_config(entry.config, tile_map.properties)
+
+            # Fit the whole stage into its cell, keeping its shape.
+            scale = min(THUMBNAIL_WIDTH / stage_width, THUMBNAIL_HEIGHT / stage_height)
+            width, height = round(stage_width * scale), round(stage_height * scale)
+            column, row = index % ATLAS_COLUMNS, index // ATLAS_COLUMNS
+            viewport = (column * THUMBNAIL_WIDTH, row * THUMBNAIL_HEIGHT, width, height)
+
+            framebuffer.clear(color = config.get("color", arcade.color.DARK_BROWN), viewport = viewport)
+            camera.viewport = arcade.LBWH(*viewport)
+            camera.projection = arcade.LRBT(0, stage_width, 0, stage_height)
+            camera.position = (0, 0)
+            camera.use()
+            for sprite_list in tile_map.sprite_lists.values():
+                sprite_list.draw(pixelated = True)
+                sprite_list.clear()
+
+    # Framebuffer rows start at the bottom.
+    atlas = Image.frombytes("RGBA", framebuffer.size, framebuffer.read(components = 4)).transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+    thumbnails = {}
+    for index, entry in enumerate(entries):
+        column, row = index % ATLAS_COLUMNS, index // ATLAS_COLUMNS
+        top = (rows - 1 - row) * THUMBNAIL_HEIGHT
+        thumbnails[entry.level] = atlas.crop((column * THUMBNAIL_WIDTH, top, (column + 1) * THUMBNAIL_WIDTH, top + THUMBNAIL_HEIGHT))
+    return thumbnails
+
+
+class ThumbnailCache:
+    '''
+    The thumbnail atlas saved in the user data folder, read once when the grid is opened.
+    Thumbnails missing from it are drawn the first time they are asked for, and the atlas is saved again.
+    '''
+
+    def __init__(self, atlas_path: str, index_path: str):
+        self.atlas_path = atlas_path
+        self.index_path = index_path
+
+        # The index maps each thumbnail key to its cell in the atlas. Thumbnails drawn since the atlas was read are kept in images.
+        self.cells = {}
+        self.atlas = None
+        self.images = {}
+        if os.path.exists(index_path) and os.path.exists(atlas_path):
+            try:
+                with open(index_path, "r") as file:
+                    self.cells = json.load(file)
+                self.atlas = Image.open(atlas_path).convert("RGBA")
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Could not read the stage thumbnails ({e}). Drawing them again.")
+                self.cells = {}
+                self.atlas = None
+
+    def image(self, key: str) -> Image.Image | None:
+        if key not in self.images and self.atlas is not None and key in self.cells:
+            column, row = self.cells[key]
+            self.images[key] = self.atlas.crop((column * THUMBNAIL_WIDTH, row * THUMBNAIL_HEIGHT, (column + 1) * THUMBNAIL_WIDTH, (row + 1) * THUMBNAIL_HEIGHT))
+        return self.images.get(key)
+
+    def textures(self, ctx: arcade.ArcadeContext, entries: list, keep: set) -> dict:
+        '''
+        Returns a thumbnail texture for each of the stage pack entries, keyed by stage level. Missing thumbnails are drawn in one batch,
+        then the atlas is saved holding only the thumbnails whose keys are in keep, so the cache doesn't grow with every edit.
+        '''
+        start = time.perf_counter()
+        keys = {entry.level: thumbnail_key(entry) for entry in entries}
+        missing = [entry for entry in entries if self.image(keys[entry.level]) is None]
+        if missing:
+            for level, image in render_thumbnails(ctx, missing).items():
+                self.images[keys[level]] = image
+            self.save(keep)
+
+        # Thumbnails are never collided with, so skip working out hit boxes.
+        textures = {entry.level: arcade.Texture(self.images[keys[entry.level]], hit_box_algorithm = arcade.hitbox.algo_bounding_box) for entry in entries}
+        print(f"Stage thumbnails: {len(entries) - len(missing)} cached, {len(missing)} drawn in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return textures
+
+    def save(self, keep: set) -> None:
+        images = {key: self.image(key) for key in sorted(keep)}
+        images = {key: image for key, image in images.items() if image is not None}
+        rows = max(1, (len(images) + ATLAS_COLUMNS - 1) // ATLAS_COLUMNS)
+        atlas = Image.new("RGBA", (ATLAS_COLUMNS * THUMBNAIL_WIDTH, rows * THUMBNAIL_HEIGHT))
+        cells = {}
+        for index, (key, image) in enumerate(images.items()):
+            column, row = index % ATLAS_COLUMNS, index // ATLAS_COLUMNS
+            atlas.paste(image, (column * THUMBNAIL_WIDTH, row * THUMBNAIL_HEIGHT))
+            cells[key] = (column, row)
+        try:
+            atlas.save(self.atlas_path)
+            with open(self.index_path, "w") as file:
+                json.dump(cells, file)
+        except OSError as e:
+            print(f"Could not save the stage thumbnails ({e}).")
+            return
+        self.atlas, self.cells = atlas, cells
+
+
+class StageSelectView(arcade.View):
+    """
+    DEV mode grid of every stage in the stage pack. Pick one with the arrow keys and ENTER, or by clicking it. ESC goes back without changing stage.
+    Large packs are split into pages, flipped with PAGE UP and PAGE DOWN or by moving past the edge. Only the chosen stage's map is loaded.
+    """
+
+    def __init__(self, game_view: arcade.View):
+        """ Called when the grid is opened from the game. game_view is shown again once a stage is picked. """
+        super().__init__()
+        self.game_view = game_view
+        self.background_color = arcade.color.BLACK
+        self.camera = arcade.camera.Camera2D()
+
+        self.stage_pack = game_view.stage_pack
+        self.levels = self.stage_pack.levels
+        self.thumbnail_cache = ThumbnailCache(const.user_data_path(const.STAGE_THUMBNAIL_ATLAS_FILE), const.user_data_path(const.STAGE_THUMBNAIL_INDEX_FILE))
+        self.thumbnail_keys = {thumbnail_key(self.stage_pack.entry(level)) for level in self.levels}
+
+        self.title = arcade.Text("Pick a stage. ENTER or click to play, ESC to go back.", 320, 344, arcade.color.WHITE, font_size = 7,
+                                 font_name = "Public Pixel", anchor_x = "center")
+        self.page_count = max(1, (len(self.levels) + PAGE_SIZE - 1) // PAGE_SIZE)
+        self.gui_page = arcade.Text("", 320, 6, arcade.color.WHITE, font_size = 6, font_name = "Public Pixel", anchor_x = "center")
+
+        self.page = None
+        self.selected = self.levels.index(game_view.stage_level) if game_view.stage_level in self.levels else 0
+        self.show_page(self.selected // PAGE_SIZE)
+        self.setup_camera()
+
+    def show_page(self, page: int):
+        """Lays out the thumbnails of one page of the grid. Thumbnails not cached yet are drawn now, a page at a time."""
+
+        self.page = page
+        levels = self.levels[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        textures = self.thumbnail_cache.textures(self.window.ctx, [self.stage_pack.entry(level) for level in levels], self.thumbnail_keys)
+
+        # All thumbnails on the page are drawn with one sprite list, and all labels with one text batch.
+        self.thumbnails = arcade.SpriteList()
+        self.labels = pyglet.graphics.Batch()
+        self.label_texts = []
+        for index, level in enumerate(levels):
+            x, y = self.cell_center(index)
+            self.thumbnails.append(arcade.Sprite(textures[level], scale = 0.5, center_x = x, center_y = y))
+            self.label_texts.append(arcade.Text(f"Stage {level}", x, y - THUMBNAIL_HEIGHT / 4 - 10, arcade.color.BEIGE, font_size = 6,
+                                                font_name = "Public Pixel", anchor_x = "center", batch = self.labels))
+        self.gui_page.text = f"Page {page + 1} of {self.page_count}. PAGE UP and PAGE DOWN to flip." if self.page_count > 1 else ""
+
+    def select(self, index: int):
+        """Moves the selection, flipping to its page if it is on another one."""
+
+        self.selected = min(max(index, 0), len(self.levels) - 1)
+        if self.selected // PAGE_SIZE != self.page:
+            self.show_page(self.selected // PAGE_SIZE)
+
+    def cell_center(self, index: int) -> tuple:
+        column, row = index % GRID_COLUMNS, index // GRID_COLUMNS
+        return (GRID_LEFT + column * CELL_WIDTH + CELL_WIDTH / 2, GRID_TOP - row * CELL_HEIGHT - THUMBNAIL_HEIGHT / 4)
+
+    def setup_camera(self):
+        self.camera.projection = arcade.LRBT(0, 640, 0, 360)
+        self.camera.viewport = arcade.LRBT(0, self.window.width, 0, self.window.height)
+        self.camera.position = (0, 0)
+
+    def choose(self, index: int):
+        """Loads the chosen stage, and only that one, then returns to the game."""
+
+        game = self.game_view
+        game.stage_level = self.levels[index]
+        game.reset()
+        game.input.release_all()
+        game.setup_cameras()
+        self.window.show_view(game)
+
+    def on_draw(self):
+        """
+        Render the grid.
+        """
+        self.clear()
+        self.camera.use()
+        self.thumbnails.draw(pixelated = True)
+        self.labels.draw()
+        self.title.draw()
+        self.gui_page.draw()
+
+        # Outline the selected stage.
+        selected = self.thumbnails[self.selected - self.page * PAGE_SIZE]
+        arcade.draw_lrbt_rectangle_outline(selected.left - 2, selected.right + 2, selected.bottom - 2, selected.top + 2, arcade.color.YELLOW, 2)
+
+    def on_key_press(self, key: int, key_modifiers: int):
+        """
+        Move the selection with the arrow keys, flip pages with PAGE UP and PAGE DOWN, pick with ENTER, go back with ESC.
+        """
+        moves = {arcade.key.LEFT: -1, arcade.key.RIGHT: 1, arcade.key.UP: -GRID_COLUMNS, arcade.key.DOWN: GRID_COLUMNS,
+                 arcade.key.PAGEUP: -PAGE_SIZE, arcade.key.PAGEDOWN: PAGE_SIZE}
+        if key in moves:
+            self.select(self.selected + moves[key])
+        elif key in (arcade.key.ENTER, arcade.key.SPACE):
+            self.choose(self.selected)
+        elif key == arcade.key.ESCAPE:
+            self.game_view.input.release_all()
+            self.game_view.setup_cameras()
+            self.window.show_view(self.game_view)
+
+    def on_mouse_press(self, x: float, y: float, button: int, key_modifiers: int):
+        """
+        Pick the stage that was clicked.
+        """
+        world_x, world_y, _ = self.camera.unproject((x, y))
+        for index, thumbnail in enumerate(self.thumbnails):
+            if thumbnail.left <= world_x <= thumbnail.right and thumbnail.bottom <= world_y <= thumbnail.top:
+                self.choose(self.page * PAGE_SIZE + index)
+                return
+
+    def on_resize(self, width: int, height: int):
+        """
+        Called whenever the window is resized.
+        """
+        self.setup_camera()
@@ -0,0 +1,99 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Stage Behavior Section.
+#
+# A stage's special behaviors are declared in its stage pack's manifest, or as custom properties on the stage's TMX map in Tiled.
+# When a stage loads, its behaviors are compiled once into an ordered list of systems.
+# Each frame, the game only runs the systems the current stage actually uses. A behavior set to false or 0 is turned off.
+
+import arcade
+
+import assets.environment_logic as envl
+
+
+def chase_player(speed: float):
+    ''' Enemies float towards the player. '''
+    if not speed:
+        return None
+    def system(game) -> None:
+        envl.move_floating_enemies(game.player, game.enemies, speed, game.flow_field)
+    return system
+
+
+def animate_enemies(enabled: bool):
+    ''' Enemies are evil coins, and spin like the regular coins. '''
+    if not enabled:
+        return None
+    def system(game) -> None:
+        envl.animate_coin(game.animation_clock, game.enemies)
+    return system
+
+
+def coins_flee(enabled: bool):
+    ''' Coins run away from the player when they get too close. '''
+    if not enabled:
+        return None
+    def system(game) -> None:
+        envl.coin_run_away(game.player, game.coins, game.flow_field)
+    return system
+
+
+def portal_drift(speed: float):
+    ''' The portal keeps moving forward once it has appeared. '''
+    if not speed:
+        return None
+    def system(game) -> None:
+        if not game.portal_hidden:
+            for portal in game.portal:
+                portal.forward(speed)
+    return system
+
+
+def end_screen(enabled: bool):
+    ''' The stage shows the final time and deaths of the run. '''
+    if not enabled:
+        return None
+    def system(game) -> None:
+        game.show_end_screen()
+    return system
+
+
+# Maps each stage config key to the function building its system, or returning None if the value turns it off.
+# Systems run in this order every frame.
+SYSTEM_FACTORIES = {
+    "speed": chase_player,
+    "evil_coins": animate_enemies,
+    "coins_flee": coins_flee,
+    "portal_speed": portal_drift,
+    "end_screen": end_screen,
+}
+
+
+# Behaviors that steer around terrain with a flow field towards the player. Stages using none of them don't build one.
+FLOW_FIELD_KEYS = ("speed", "coins_flee")
+
+
+def stage_config(pack_config: dict, map_properties: dict | None) -> dict:
+    '''
+    Returns the behaviors declared for a stage. Custom properties set on the TMX map override the stage pack's config.
+    '''
+    config = dict(pack_config)
+    if map_properties:
+        config.update(map_properties)
+
+    # Manifests list colors as [red, green, blue, alpha].
+    if isinstance(config.get("color"), list):
+        config["color"] = arcade.types.Color(*config["color"])
+    return config
+
+
+def compile_stage_systems(config: dict) -> list:
+    '''
+    Builds the ordered list of systems a stage needs from its config. Behaviors that are turned off are left out.
+    '''
+    systems = (factory(config[key]) for key, factory in SYSTEM_FACTORIES.items() if key in config)
+    return [system for system in systems if system is not None]
+
+
+def uses_flow_field(config: dict) -> bool:
+    return any(config.get(key) for key in FLOW_FIELD_KEYS)
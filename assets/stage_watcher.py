@@ -0,0 +1,85 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Stage Hot Reload Section. Only used in DEV mode.
+
+import os
+import time
+import xml.etree.ElementTree as ElementTree
+
+WATCHED_EXTENSIONS = (".tmx", ".tsx")
+
+
+def read_tileset_sources(tmx_path: str) -> set:
+    '''
+    Returns the names of the external TSX tilesets a TMX stage file depends on.
+    '''
+    try:
+        root = ElementTree.parse(tmx_path).getroot()
+    except (OSError, ElementTree.ParseError):
+        # Tiled may still be writing the file. It will be picked up again on the next change.
+        return set()
+    return {os.path.basename(tileset.get("source")) for tileset in root.iter("tileset") if tileset.get("source")}
+
+
+class StageWatcher:
+    '''
+    Polls the stage folder for TMX and TSX files that have been saved since the last check.
+    Keeps track of which tilesets each stage uses, so a changed tileset only reloads the stages depending on it.
+    stage_files maps the file name of each stage in the folder to its level, see StagePack.stage_files().
+    '''
+
+    def __init__(self, directory: str, stage_files: dict, poll_interval: float = 0.5):
+        self.directory = directory
+        self.stage_files = stage_files
+        self.poll_interval = poll_interval
+        self.last_poll = time.perf_counter()
+
+        # Record the starting modification times. The tilesets each stage depends on are only read once a tileset changes,
+        # so large stage packs aren't parsed up front.
+        self.modified_times = self.scan()
+        self.stage_tilesets = {}
+
+    def tilesets_of(self, level: int, filename: str) -> set:
+        if level not in self.stage_tilesets:
+            self.stage_tilesets[level] = read_tileset_sources(os.path.join(self.directory, filename))
+        return self.stage_tilesets[level]
+
+    def scan(self) -> dict:
+        '''
+        Returns the modification time of every watched file in the stage folder.
+        '''
+        modified_times = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(WATCHED_EXTENSIONS):
+                    modified_times[entry.name] = entry.stat().st_mtime_ns
+        return modified_times
+
+    def poll(self) -> set:
+        '''
+        Returns the stage levels that need to be reloaded because their TMX file, or a tileset they use, changed.
+        Only touches the disk once every poll_interval seconds.
+        '''
+        now = time.perf_counter()
+        if now - self.last_poll < self.poll_interval:
+            return set()
+        self.last_poll = now
+
+        # Compare against the previous scan to find saved files.
+        current_times = self.scan()
+        changed_files = [filename for filename, mtime in current_times.items() if self.modified_times.get(filename) != mtime]
+        self.modified_times = current_times
+
+        # Work out which stages are affected by the changed files.
+        stages_to_reload = set()
+        for filename in changed_files:
+            level = self.stage_files.get(filename)
+            if level is not None:
+                # The stage itself changed. Its tileset list might have changed too.
+                self.stage_tilesets.pop(level, None)
+                stages_to_reload.add(level)
+            elif filename.endswith(".tsx"):
+                # A tileset changed. Every stage using it needs to be reloaded.
+                stages_to_reload.update(level for stage_file, level in self.stage_files.items() if filename in self.tilesets_of(level, stage_file))
+
+        return stages_to_reload
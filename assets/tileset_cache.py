@@ -0,0 +1,198 @@
+# Author: ByteProductions
+# Holds additional methods needed for "Time Attack Andy"
+# Tileset Cache Section.
+#
+# Every stage uses the same few TSX tilesets. arcade.TileMap parses each of them again on every load, and makes every tile
+# its own copy of its tileset entry and its own flipped textures. The cache here is shared by the whole game: each TSX file
+# is parsed once, each tileset image is decoded once, and every stage using a tile gets the very same Texture for it.
+#
+# Building sprites from the cache relies on arcade.TileMap's private helpers and methods, which can change in any release.
+# It is only used with the arcade versions it was written against. With any other, CachedTileMap is plain arcade.TileMap.
+
+import arcade
+import attrs
+import os
+import xml.etree.ElementTree as etree
+from pathlib import Path
+
+import pytiled_parser
+from pytiled_parser.common_types import Size
+from pytiled_parser.parsers.tmx.layer import parse as parse_layer
+from pytiled_parser.parsers.tmx.properties import parse as parse_properties
+from pytiled_parser.parsers.tmx.tileset import parse as parse_tmx_tileset
+from pytiled_parser.util import parse_color
+
+ENCODING = "utf-8"
+LAYER_TAGS = ("layer", "objectgroup", "imagelayer", "group")
+
+# arcade versions CachedTileMap was checked against.
+SUPPORTED_ARCADE_VERSIONS = ("3.3.",)
+try:
+    from arcade.tilemap.tilemap import _get_image_info_from_tileset, _get_image_source, _may_be_flip
+    CACHE_SUPPORTED = arcade.version.VERSION.startswith(SUPPORTED_ARCADE_VERSIONS)
+except ImportError:
+    CACHE_SUPPORTED = False
+
+
+class TilesetCache:
+    '''
+    Parsed tilesets and tile textures, kept for as long as the game runs.
+    Tilesets are checked against their file's modification time on every load, so a tileset saved in Tiled is parsed again.
+    '''
+
+    def __init__(self, texture_cache: arcade.TextureCacheManager | None = None):
+        # Decoded tileset images and their crops live in arcade's texture cache, which keeps each image once.
+        self.texture_cache = texture_cache or arcade.texture.default_texture_cache
+
+        # TSX path -> (modification time, parsed tileset). A stage can place a tileset at any first gid,
+        # so each first gid gets a shallow copy sharing the tiles and image of the one parse.
+        self.tilesets = {}
+        self.placed_tilesets = {}
+
+        # (image, crop, flips, hit box algorithm) -> the Texture every tile with those uses.
+        self.textures = {}
+        self.parses = 0
+
+    def tileset(self, path: Path, firstgid: int) -> pytiled_parser.Tileset:
+        '''
+        Returns the tileset in the TSX file at path, placed at firstgid. Only parses the file the first time, or after it changed.
+        '''
+        path = Path(os.path.normpath(path))
+        modified = os.stat(path).st_mtime_ns
+        cached = self.tilesets.get(path)
+        if cached is None or cached[0] != modified:
+            if cached is not None:
+                # The tileset was edited, so tiles may have moved within its image.
+                self.textures.clear()
+                self.placed_tilesets = {key: tileset for key, tileset in self.placed_tilesets.items() if key[0] != path}
+            with open(path, encoding = ENCODING) as file:
+                tileset = parse_tmx_tileset(etree.parse(file).getroot(), 1, ENCODING, external_path = path.parent)
+            self.tilesets[path] = cached = (modified, tileset)
+            self.parses += 1
+
+        key = (path, firstgid)
+        if key not in self.placed_tilesets:
+            self.placed_tilesets[key] = cached[1] if firstgid == 1 else attrs.evolve(cached[1], firstgid = firstgid)
+        return self.placed_tilesets[key]
+
+    def parse_map(self, map_file: str | Path) -> pytiled_parser.TiledMap:
+        '''
+        Parses a TMX stage like pytiled_parser.parse_map, but takes its external tilesets from the cache.
+        Maps with object layers or JSON tilesets are left to pytiled_parser, as objects can pull in tilesets of their own.
+        '''
+        map_file = Path(arcade.resources.resolve(map_file))
+        with open(map_file, encoding = ENCODING) as file:
+            raw_map = etree.parse(file).getroot()
+
+        raw_tilesets = raw_map.findall("./tileset")
+        if (map_file.suffix != ".tmx" or next(raw_map.iter("objectgroup"), None) is not None
+                or any(not raw_tileset.get("source", ".tsx").endswith(".tsx") for raw_tileset in raw_tilesets)):
+            return pytiled_parser.parse_map(map_file)
+
+        tilesets = {}
+        for raw_tileset in raw_tilesets:
+            firstgid = int(raw_tileset.attrib["firstgid"])
+            if raw_tileset.get("source") is not None:
+                tilesets[firstgid] = self.tileset(map_file.parent / raw_tileset.attrib["source"], firstgid)
+            else:
+                # Tilesets embedded in the stage belong to it alone.
+                tilesets[firstgid] = parse_tmx_tileset(raw_tileset, firstgid, ENCODING)
+
+        tiled_map = pytiled_parser.TiledMap(
+            map_file = map_file,
+            infinite = bool(int(raw_map.attrib["infinite"])),
+            layers = [parse_layer(element, ENCODING, map_file.parent) for element in raw_map if element.tag in LAYER_TAGS],
+            map_size = Size(int(raw_map.attrib["width"]), int(raw_map.attrib["height"])),
+            next_layer_id = int(raw_map.attrib["nextlayerid"]),
+            next_object_id = int(raw_map.attrib["nextobjectid"]),
+            orientation = raw_map.attrib["orientation"],
+            render_order = raw_map.attrib["renderorder"],
+            tiled_version = raw_map.attrib["tiledversion"],
+            tile_size = Size(int(raw_map.attrib["tilewidth"]), int(raw_map.attrib["tileheight"])),
+            tilesets = tilesets,
+            version = raw_map.attrib["version"],
+        )
+        if raw_map.get("backgroundcolor") is not None:
+            tiled_map.background_color = parse_color(raw_map.attrib["backgroundcolor"])
+        if raw_map.get("hexsidelength") is not None:
+            tiled_map.hex_side_length = int(raw_map.attrib["hexsidelength"])
+        properties = raw_map.find("./properties")
+        if properties is not None:
+            tiled_map.properties = parse_properties(properties)
+        return tiled_map
+
+    def tile_texture(self, tile: pytiled_parser.Tile, map_directory: str, hit_box_algorithm) -> arcade.Texture | None:
+        '''
+        Returns the shared texture for a tile cut from a tileset image, flipped the way the tile is placed.
+        '''
+        crop = _get_image_info_from_tileset(tile)
+        key = (tile.image, map_directory, crop, tile.flipped_diagonally, tile.flipped_horizontally, tile.flipped_vertically, hit_box_algorithm)
+        texture = self.textures.get(key)
+        if texture is None:
+            image_file = _get_image_source(tile, map_directory)
+            if image_file is None:
+                return None
+            x, y, width, height = crop
+            texture = self.texture_cache.load_or_get_texture(image_file, x = x, y = y, width = width, height = height, hit_box_algorithm = hit_box_algorithm)
+            texture = self.textures[key] = _may_be_flip(tile, texture)
+        return texture
+
+    def flush(self) -> None:
+        self.tilesets.clear()
+        self.placed_tilesets.clear()
+        self.textures.clear()
+
+
+# The one cache every stage load goes through.
+SHARED_CACHE = TilesetCache()
+
+
+class CachedTileMap(arcade.TileMap):
+    '''
+    An arcade.TileMap that takes its tilesets and tile textures from a TilesetCache. Takes the same arguments as arcade.TileMap.
+    Tiles with animations, collision shapes or a custom sprite class are rare, and are still built by arcade.TileMap.
+    '''
+
+    def __init__(self, map_file: str | Path, cache: TilesetCache = SHARED_CACHE, **kwargs):
+        self.tileset_cache = cache
+
+        # Each gid the stage uses is looked up once, instead of once per tile placed.
+        self.tiles_by_gid = {}
+        super().__init__(tiled_map = cache.parse_map(map_file), texture_cache_manager = cache.texture_cache, **kwargs)
+
+    def _get_tile_by_gid(self, tile_gid: int) -> pytiled_parser.Tile | None:
+        if tile_gid not in self.tiles_by_gid:
+            self.tiles_by_gid[tile_gid] = super()._get_tile_by_gid(tile_gid)
+        return self.tiles_by_gid[tile_gid]
+
+    def _create_sprite_from_tile(self, tile: pytiled_parser.Tile, scaling: float = 1.0, hit_box_algorithm = None,
+                                 custom_class: type | None = None, custom_class_args: dict | None = None) -> arcade.Sprite:
+        custom_class_args = custom_class_args if custom_class_args is not None else {}
+        if tile.animation or tile.objects is not None or custom_class or tile.tileset is None or tile.tileset.image is None:
+            return super()._create_sprite_from_tile(tile, scaling, hit_box_algorithm, custom_class, custom_class_args)
+
+        texture = self.tileset_cache.tile_texture(tile, os.path.dirname(self.tiled_map.map_file), hit_box_algorithm)
+        if texture is None:
+            return super()._create_sprite_from_tile(tile, scaling, hit_box_algorithm, custom_class, custom_class_args)
+
+        # Sprite properties are filled in the same way arcade.TileMap does.
+        sprite = arcade.Sprite(texture, scale = scaling)
+        if tile.properties:
+            sprite.properties.update(tile.properties)
+        if tile.class_:
+            sprite.properties["class"] = tile.class_
+        sprite.properties["tile_id"] = tile.id
+        return sprite
+
+
+if not CACHE_SUPPORTED:
+    print(f"The tileset cache hasn't been checked with arcade {arcade.version.VERSION}. Stages are loaded with arcade.TileMap instead.")
+
+    class CachedTileMap(arcade.TileMap):
+        '''
+        Plain arcade.TileMap, for arcade versions the tileset cache wasn't checked against. Takes the same arguments as the cached one.
+        '''
+
+        def __init__(self, map_file: str | Path, cache: TilesetCache = SHARED_CACHE, **kwargs):
+            self.tileset_cache = cache
+            super().__init__(map_file, **kwargs)
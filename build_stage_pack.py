@@ -0,0 +1,113 @@
+"""
+Stage pack builder.
+
+Writes or updates the manifest of a stage pack, the stage_pack.json index the game reads instead of parsing every stage.
+Entries already in the manifest keep their level, times and config, and get their hash refreshed. taa_stage_{level}.tmx
+files not in it yet are added, and entries whose file is gone are dropped. Other file names, times and behaviors are set
+by editing the manifest, e.g. "times": {"normal": 30, "hard": 15} and "config": {"speed": 4, "color": [128, 128, 128, 255]}.
+
+    python build_stage_pack.py my_stages                      # write or update my_stages/stage_pack.json
+    python build_stage_pack.py my_stages --name "Andy's Revenge" --times stage_times.txt
+    python build_stage_pack.py assets/stage_files --check     # exit with 1 if the manifest is out of date
+    python build_stage_pack.py my_stages --list
+
+--times reads a stage times file in the layout of assets/stage_times.txt: one "N. seconds" line per stage, the normal
+times of stages 1 to 20, then the hard times.
+"""
+import argparse
+import os
+import sys
+
+import assets.constants as const
+from assets.stage_pack import StagePack, file_hash, index_stage_files, read_manifest, write_manifest
+
+
+def read_stage_times(path, last_stage):
+    """
+    Reads a stage times file laid out like assets/stage_times.txt, as {level: {"normal": seconds, "hard": seconds}}.
+    """
+    with open(path, "r") as file:
+        seconds = [int(line.split()[1]) for line in file if line.strip()]
+    times = {}
+    for level in range(last_stage + 2):
+        times[level] = {}
+        for difficulty, name in const.DIFFICULTY_NAMES.items():
+            # Each stage's time was looked up at stage level + difficulty, wrapping around like a Python list.
+            index = level + difficulty
+            if -len(seconds) <= index < len(seconds):
+                times[level][name] = seconds[index]
+    return times
+
+
+def update_entries(directory, entries):
+    """
+    Refreshes the hash of every entry, adds stage files not listed yet, and drops entries whose file is gone.
+    Returns the updated entries and a line describing each change.
+    """
+    changes = []
+    kept = []
+    for entry in entries:
+        if not os.path.exists(entry.path):
+            changes.append(f"removed level {entry.level}: {entry.file} is gone")
+            continue
+        current = file_hash(entry.path)
+        if current != entry.sha256:
+            changes.append(f"rehashed level {entry.level}: {entry.file}")
+            entry.sha256 = current
+        kept.append(entry)
+
+    levels = {entry.level for entry in kept}
+    files = {entry.file for entry in kept}
+    for entry in index_stage_files(directory):
+        if entry.file not in files and entry.level not in levels:
+            changes.append(f"added level {entry.level}: {entry.file}")
+            kept.append(entry)
+    return kept, changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write, update or check the manifest of a stage pack.")
+    parser.add_argument("directory", help="The stage pack's folder.")
+    parser.add_argument("--name", help="Name of the pack. Defaults to the existing name, or the folder's name.")
+    parser.add_argument("--times", help="Stage times file to fill every stage's times from, laid out like assets/stage_times.txt.")
+    parser.add_argument("--check", action="store_true", help="Only report what would change, and exit with 1 if anything would.")
+    parser.add_argument("--list", action="store_true", help="List the pack's stages from its manifest.")
+    args = parser.parse_args()
+
+    manifest_path = os.path.join(args.directory, const.STAGE_PACK_MANIFEST)
+
+    if args.list:
+        pack = StagePack(args.directory)
+        print(f"{pack.name}: {len(pack.levels)} stages")
+        for level in pack.levels:
+            entry = pack.entry(level)
+            times = ", ".join(f"{name} {entry.stage_time(difficulty)} s" for difficulty, name in const.DIFFICULTY_NAMES.items())
+            print(f"  {level:4d}  {entry.file:32s} {times}  {entry.config or ''}")
+        sys.exit(0)
+
+    if os.path.exists(manifest_path):
+        name, entries = read_manifest(manifest_path)
+    else:
+        name, entries = os.path.basename(os.path.abspath(args.directory)), []
+    entries, changes = update_entries(args.directory, entries)
+
+    if args.times:
+        times = read_stage_times(args.times, max(entry.level for entry in entries))
+        for entry in entries:
+            if times.get(entry.level) and entry.times != times[entry.level]:
+                changes.append(f"set the times of level {entry.level} to {times[entry.level]}")
+                entry.times = times[entry.level]
+    if args.name and args.name != name:
+        changes.append(f"renamed the pack to {args.name}")
+        name = args.name
+    if not os.path.exists(manifest_path):
+        changes.append(f"created {manifest_path}")
+
+    for change in changes:
+        print(change)
+    if args.check:
+        print(f"{manifest_path} is {'out of date' if changes else 'up to date'}")
+        sys.exit(1 if changes else 0)
+
+    write_manifest(manifest_path, name, entries)
+    print(f"Wrote {manifest_path}: {len(entries)} stages")
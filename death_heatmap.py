@@ -0,0 +1,99 @@
+"""
+Aggregates recorded deaths into per-stage heatmaps, one cell per tile of the stage.
+
+    python death_heatmap.py                    # summarize every stage with recorded deaths
+    python death_heatmap.py 4 15 --cause enemy --output-dir heatmaps
+    python death_heatmap.py --stage-pack my_stages     # deaths recorded on a custom stage pack
+    python death_heatmap.py --benchmark 5000000
+"""
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+from PIL import Image
+
+import assets.death_log as dl
+from assets.constants import user_data_path
+from assets.stage_pack import StagePack
+
+
+def recorded_stages(directory):
+    """
+    Returns the stage levels that have a death log in the folder.
+    """
+    stages = []
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            match = re.fullmatch(r"stage_(\d+)\.deaths", filename)
+            if match:
+                stages.append(int(match.group(1)))
+    return sorted(stages)
+
+
+def summarize(stage_level, deaths, counts, top=5):
+    """
+    Prints the number of deaths by cause, and the tiles players die on most.
+    """
+    by_cause = np.bincount(deaths["cause"], minlength=len(dl.CAUSES))
+    causes = ", ".join(f"{name}: {count}" for name, count in zip(dl.CAUSES, by_cause))
+    print(f"Stage {stage_level}: {len(deaths)} deaths ({causes})")
+
+    # Tiles ordered by death count. Printed rows are counted from the top, matching Tiled.
+    hottest = np.argsort(counts, axis=None)[::-1][:top]
+    for index in hottest:
+        row, column = divmod(int(index), counts.shape[1])
+        if counts[row, column] == 0:
+            break
+        print(f"    tile ({column}, {counts.shape[0] - 1 - row}): {counts[row, column]}")
+
+
+def benchmark(sample_count):
+    """
+    Times binning sample_count random deaths, to check the aggregation scales to millions of runs.
+    """
+    # Deaths spread over one screen, 640x384 pixels.
+    rng = np.random.default_rng(0)
+    deaths = np.zeros(sample_count, dtype=[("x", "<i2"), ("y", "<i2"), ("cause", "u1")])
+    deaths["x"] = rng.integers(0, 640, sample_count)
+    deaths["y"] = rng.integers(-100, 384, sample_count)
+    deaths["cause"] = rng.integers(0, len(dl.CAUSES), sample_count)
+
+    start = time.perf_counter()
+    counts = dl.bin_deaths(deaths, (640 // dl.TILE_SIZE, 384 // dl.TILE_SIZE))
+    elapsed = time.perf_counter() - start
+    print(f"Binned {sample_count:,} deaths in {elapsed * 1000:.1f} ms ({counts.sum():,} counted).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build death heatmaps from recorded deaths.")
+    parser.add_argument("stages", nargs="*", type=int, help="Stages to analyze. Defaults to every stage with recorded deaths.")
+    parser.add_argument("--cause", choices=dl.CAUSES, help="Only count deaths with this cause.")
+    parser.add_argument("--directory", default=user_data_path("deaths"), help="Folder holding the recorded deaths.")
+    parser.add_argument("--stage-pack", metavar="FOLDER", help="Read the deaths recorded on the custom stage pack in this folder instead.")
+    parser.add_argument("--output-dir", help="Save each heatmap as a PNG, scaled up to the stage's size.")
+    parser.add_argument("--benchmark", type=int, metavar="SAMPLES", help="Time binning this many random deaths instead.")
+    args = parser.parse_args()
+    if args.stage_pack:
+        args.directory = os.path.join(user_data_path("deaths"), StagePack(args.stage_pack).records_key)
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    else:
+        cause = dl.CAUSES.index(args.cause) if args.cause else None
+        grid_sizes = dl.load_grid_sizes(args.directory)
+        for stage_level in args.stages or recorded_stages(args.directory):
+            deaths = dl.load_deaths(args.directory, stage_level)
+            if stage_level not in grid_sizes:
+                # Without the stage's size, deaths past the first screen would be piled onto its edge.
+                print(f"Stage {stage_level}: {len(deaths)} deaths, but the stage's size wasn't recorded. Play it once to record it.")
+                continue
+            counts = dl.bin_deaths(deaths, grid_sizes[stage_level], cause)
+            summarize(stage_level, deaths, counts)
+
+            if args.output_dir:
+                os.makedirs(args.output_dir, exist_ok=True)
+                height, width = counts.shape
+                image = dl.heatmap_image(counts).resize((width * dl.TILE_SIZE, height * dl.TILE_SIZE), Image.NEAREST)
+                image.save(os.path.join(args.output_dir, f"stage_{stage_level}_heatmap.png"))
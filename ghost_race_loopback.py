@@ -0,0 +1,140 @@
+"""
+Loopback test for ghost race state sync.
+
+Runs two ghost links on this machine at 60 ticks per second. One plays a scripted run, the other receives it through the
+jitter buffer. Simulated loss, latency and jitter are applied to every packet sent. Prints bandwidth, how closely the ghost
+follows the scripted run, and how long the per-tick calls made from on_update took.
+
+    python ghost_race_loopback.py --seconds 10 --loss 0.1 --latency 0.05 --jitter 0.03
+
+With --bot the scripted run is sent to a running game instead, to see the ghost on screen:
+
+    python ghost_race_loopback.py --bot 127.0.0.1:8790 --port 8791
+"""
+import argparse
+import math
+import statistics
+import struct
+import time
+
+import assets.ghost_race as gr
+
+# Size of a packet holding the same state as plain floats, for comparison.
+UNCOMPRESSED_SIZE = gr.HEADER.size + struct.calcsize("<ffffBB")
+
+
+def scripted_state(tick):
+    """
+    A run back and forth across the stage, jumping every second. Returns (x, y, change_x, change_y, texture, stage_level).
+    """
+    # Run at 3 pixels per tick, turning around at the edges of the stage.
+    distance = (tick * 3) % 1200
+    x, change_x = (20 + distance, 3.0) if distance < 600 else (620 - (distance - 600), -3.0)
+
+    # Jump every 60 ticks, landing on the floor at y = 40.
+    jump_tick = tick % 60
+    change_y = 0.0
+    y = 40.0
+    if jump_tick < 40:
+        y = 40 + 8 * jump_tick - 0.2 * jump_tick * jump_tick
+        change_y = 8 - 0.4 * jump_tick
+
+    # Same textures as pl.player_pose chooses for a player of normal size.
+    if change_y == 0:
+        texture = 0 if change_x > 0 else 1
+    elif change_y > 0:
+        texture = 2 if change_x > 0 else 3
+    else:
+        texture = 4 if change_x > 0 else 5
+    return x, y, change_x, change_y, texture, 1
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_loopback(args):
+    sender = gr.GhostLink(args.port, ("127.0.0.1", args.port + 1), args.loss, args.latency, args.jitter)
+    receiver = gr.GhostLink(args.port + 1, ("127.0.0.1", args.port), args.loss, args.latency, args.jitter)
+    playback = gr.GhostPlayback()
+
+    call_times = []
+    errors = []
+    delays = []
+    tick_count = int(args.seconds * gr.TICK_RATE)
+    start = time.perf_counter()
+    for tick in range(1, tick_count + 1):
+        # Keep to 60 ticks per second, like the game loop.
+        time.sleep(max(0.0, start + tick * gr.TICK - time.perf_counter()))
+        now = time.perf_counter()
+
+        # The calls on_update makes each tick: send our state, take what arrived, and sample the ghost.
+        sender.send(*scripted_state(tick))
+        receiver.send(320, 40, 0, 0, 0, 1)
+        for received in receiver.receive():
+            playback.add(*received)
+        ghost = playback.sample(now)
+        call_times.append(time.perf_counter() - now)
+
+        # Compare the ghost with where the scripted run really was at the playback time.
+        if ghost is not None and tick > gr.TICK_RATE:
+            target = (now + playback.clock_offset - playback.delay) / gr.TICK
+            before = scripted_state(math.floor(target))
+            after = scripted_state(math.floor(target) + 1)
+            t = target - math.floor(target)
+            true_x = before[0] + (after[0] - before[0]) * t
+            true_y = before[1] + (after[1] - before[1]) * t
+            errors.append(math.hypot(ghost[0] - true_x, ghost[1] - true_y))
+            delays.append(tick - target)
+
+    time.sleep(args.latency + args.jitter + 0.05)
+    sender.close()
+    receiver.close()
+
+    seconds = tick_count / gr.TICK_RATE
+    print(f"Ticks: {tick_count}, loss {args.loss:.0%}, latency {args.latency * 1000:.0f} ms, jitter {args.jitter * 1000:.0f} ms")
+    print(f"Sent: {sender.packets_sent} packets ({sender.packets_dropped} dropped), "
+          f"{sender.bytes_sent / max(1, sender.packets_sent):.1f} bytes each vs {UNCOMPRESSED_SIZE} uncompressed, "
+          f"{sender.bytes_sent / seconds:.0f} bytes/s")
+    print(f"Received: {receiver.packets_received} packets, {receiver.packets_undecodable} without their baseline")
+    if errors:
+        print(f"Ghost error: mean {statistics.mean(errors):.2f} px, p99 {percentile(errors, 0.99):.2f} px, max {max(errors):.2f} px")
+        print(f"Ghost behind the scripted run: mean {statistics.mean(delays) * gr.TICK * 1000:.0f} ms")
+    print(f"Per-tick calls: mean {statistics.mean(call_times) * 1e6:.0f} us, p99 {percentile(call_times, 0.99) * 1e6:.0f} us, "
+          f"max {max(call_times) * 1e6:.0f} us")
+
+
+def run_bot(args):
+    host, port = args.bot.rsplit(":", 1)
+    link = gr.GhostLink(args.port, (host, int(port)), args.loss, args.latency, args.jitter)
+    print(f"Sending a scripted run to {args.bot}. Press Ctrl+C to stop.")
+    start = time.perf_counter()
+    tick = 0
+    try:
+        while args.seconds <= 0 or tick < args.seconds * gr.TICK_RATE:
+            tick += 1
+            time.sleep(max(0.0, start + tick * gr.TICK - time.perf_counter()))
+            x, y, change_x, change_y, texture, _ = scripted_state(tick)
+            link.send(x, y, change_x, change_y, texture, args.stage)
+            link.receive()
+    except KeyboardInterrupt:
+        pass
+    link.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test ghost race state sync over loopback.")
+    parser.add_argument("--seconds", type=float, default=10, help="How long to run for. 0 runs a bot until stopped.")
+    parser.add_argument("--port", type=int, default=8800, help="Local port. The loopback test also uses the port after it.")
+    parser.add_argument("--loss", type=float, default=0.05, help="Fraction of packets dropped.")
+    parser.add_argument("--latency", type=float, default=0.04, help="Added one-way latency, in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Extra random latency of up to this many seconds.")
+    parser.add_argument("--bot", metavar="HOST:PORT", help="Send the scripted run to a running game instead.")
+    parser.add_argument("--stage", type=int, default=1, help="Stage the bot says it is on.")
+    args = parser.parse_args()
+
+    if args.bot:
+        run_bot(args)
+    else:
+        run_loopback(args)
@@ -0,0 +1,122 @@
+"""
+Benchmark for the persisted hit box cache.
+
+Loads each stage, plus the player textures, as a fresh launch would: once scanning every texture for its hit box,
+and once looking the hit boxes up in a cache saved by an earlier launch. Prints the load time and the time spent
+on hit boxes for both.
+
+    python hitbox_cache_benchmark.py                        # every stage, with the game's hit box algorithm
+    python hitbox_cache_benchmark.py 1 5 --algorithm detailed
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import arcade
+from arcade.cache import HitBoxCache
+
+import assets.hitbox_cache as hbc
+
+STAGE_FILE = "assets/stage_files/taa_stage_{}.tmx"
+PLAYER_TEXTURES = ("player.png", "player_jump.png", "player_fall.png")
+
+
+class TimedHitBoxAlgorithm(arcade.hitbox.HitBoxAlgorithm):
+    """
+    Passes hit box calculations through to another algorithm, adding up how long they take.
+    """
+
+    def __init__(self, algorithm):
+        super().__init__()
+        self.algorithm = algorithm
+        self.seconds = 0.0
+        self.count = 0
+
+    @property
+    def cache_name(self):
+        return self.algorithm.cache_name
+
+    def calculate(self, image, **kwargs):
+        start = time.perf_counter()
+        points = self.algorithm.calculate(image, **kwargs)
+        self.seconds += time.perf_counter() - start
+        self.count += 1
+        return points
+
+
+def load_stage(stage_level, algorithm):
+    """
+    Loads a stage and the player textures with an empty texture cache, as on launch. Returns the time taken.
+    """
+    arcade.texture.default_texture_cache.flush()
+    arcade.hitbox.algo_default = algorithm
+
+    start = time.perf_counter()
+    for filename in PLAYER_TEXTURES:
+        arcade.load_texture(os.path.join("assets/player_textures", filename))
+    arcade.TileMap(STAGE_FILE.format(stage_level), scaling = 1, lazy = True)
+    return time.perf_counter() - start
+
+
+def measure(stage_level, algorithm, repeats):
+    """
+    Returns the median load time, median hit box time and the number of hit boxes, over several loads.
+    """
+    timed = TimedHitBoxAlgorithm(algorithm)
+    loads = []
+    hit_boxes = []
+    for _ in range(repeats):
+        timed.seconds = 0.0
+        timed.count = 0
+        loads.append(load_stage(stage_level, timed))
+        hit_boxes.append(timed.seconds)
+    return statistics.median(loads), statistics.median(hit_boxes), timed.count
+
+
+def available_stages():
+    stages = []
+    level = 0
+    while os.path.exists(STAGE_FILE.format(level)):
+        stages.append(level)
+        level += 1
+    return stages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare stage load times with and without the saved hit box cache.")
+    parser.add_argument("stages", nargs="*", type=int, help="Stages to load. Defaults to every stage.")
+    parser.add_argument("--algorithm", choices=("simple", "detailed"), default="simple", help="Hit box algorithm. The game uses simple.")
+    parser.add_argument("--repeats", type=int, default=5, help="Loads per stage. The median is reported.")
+    args = parser.parse_args()
+
+    stages = args.stages or available_stages()
+    algorithm = arcade.hitbox.algo_simple if args.algorithm == "simple" else arcade.hitbox.algo_detailed
+
+    # The detailed algorithm is slower than hashing at any size, so every image is worth caching.
+    max_pixels = 256 * 256 if args.algorithm == "simple" else None
+
+    # Build the cache file an earlier launch would have saved, then load it back the way the game does.
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "hitbox_cache.json.gz")
+        warm = hbc.CachedHitBoxAlgorithm(algorithm, HitBoxCache(), max_pixels)
+        for stage_level in stages:
+            load_stage(stage_level, warm)
+        hbc.save_hit_box_cache(warm, path)
+        cached = hbc.CachedHitBoxAlgorithm(algorithm, hbc.load_hit_box_cache(path), max_pixels)
+        print(f"Hit box cache: {len(cached.cache)} entries, {os.path.getsize(path)} bytes on disk\n")
+
+    print(f"{'stage':>5} {'hit boxes':>9} | {'load (scan)':>11} {'hit boxes':>9} | {'load (cache)':>12} {'hit boxes':>9} | {'saved':>8}")
+    total_saved = 0.0
+    for stage_level in stages:
+        scan_load, scan_hit_boxes, count = measure(stage_level, algorithm, args.repeats)
+        cache_load, cache_hit_boxes, _ = measure(stage_level, cached, args.repeats)
+        saved = scan_load - cache_load
+        total_saved += saved
+        print(f"{stage_level:>5} {count:>9} | {scan_load * 1000:>8.1f} ms {scan_hit_boxes * 1000:>6.2f} ms | "
+              f"{cache_load * 1000:>9.1f} ms {cache_hit_boxes * 1000:>6.2f} ms | {saved * 1000:>5.2f} ms")
+
+    print(f"\nTotal saved over {len(stages)} stage loads: {total_saved * 1000:.1f} ms")
+    if cached.misses:
+        print(f"Warning: {cached.misses} hit boxes were missing from the cache.")
@@ -0,0 +1,93 @@
+"""
+Load test showing that leaderboard submissions don't affect frame times.
+
+Runs a simulated 60 FPS game loop twice: once with no submissions, and once while a burst of runs is submitted
+to a slow, unreliable stand-in server. Prints the frame time distribution for both.
+
+    python leaderboard_load_test.py --runs 2000 --latency 0.05 --failure-rate 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from assets.leaderboard import LeaderboardClient, create_run_entry
+from leaderboard_server import LeaderboardServer
+
+FRAME_BUDGET = 1 / 60
+
+
+def simulated_frame_work():
+    # Stand-in for a frame of game logic: a fixed amount of pure Python work.
+    total = 0.0
+    for i in range(3000):
+        total += (i * 0.5) ** 2
+    return total
+
+
+def run_frames(frame_count, on_frame=None):
+    """
+    Runs frame_count frames paced at 60 FPS, returning how long the work in each frame took.
+    """
+    frame_times = []
+    for frame in range(frame_count):
+        start = time.perf_counter()
+        if on_frame is not None:
+            on_frame(frame)
+        simulated_frame_work()
+        elapsed = time.perf_counter() - start
+        frame_times.append(elapsed)
+        time.sleep(max(0.0, FRAME_BUDGET - elapsed))
+    return frame_times
+
+
+def summarize(label, frame_times):
+    ordered = sorted(frame_times)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    print(f"{label:<22} mean {statistics.mean(ordered) * 1000:6.3f} ms   p99 {p99 * 1000:6.3f} ms   max {ordered[-1] * 1000:6.3f} ms")
+
+
+def start_server(server, port):
+    # Serve from a separate thread, standing in for a remote machine.
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_until_complete, args=(server.serve("127.0.0.1", port),), daemon=True).start()
+    time.sleep(0.2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure frame times while leaderboard submissions are in flight.")
+    parser.add_argument("--runs", type=int, default=2000, help="Number of runs to submit.")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to simulate for each measurement.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Server latency per request, in seconds.")
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="Fraction of requests the server fails.")
+    parser.add_argument("--port", type=int, default=8788)
+    args = parser.parse_args()
+
+    server = LeaderboardServer(args.latency, args.failure_rate)
+    start_server(server, args.port)
+
+    queue_file = os.path.join(tempfile.mkdtemp(), "leaderboard_queue.jsonl")
+    client = LeaderboardClient(f"http://127.0.0.1:{args.port}", queue_file, max_backoff=1.0)
+
+    baseline = run_frames(args.frames)
+
+    # Spread the submissions over the first frames, as fast as the game loop could ever produce them.
+    runs_per_frame = max(1, args.runs // (args.frames // 2))
+    def submit_runs(frame):
+        for i in range(runs_per_frame):
+            if frame * runs_per_frame + i < args.runs:
+                client.submit(create_run_entry("load_test", 600 + frame, i, -1))
+    loaded = run_frames(args.frames, submit_runs)
+
+    summarize("No submissions:", baseline)
+    summarize("Submissions in flight:", loaded)
+
+    # Wait for the queue to drain to confirm every run made it.
+    deadline = time.perf_counter() + 30
+    while client.pending_count and time.perf_counter() < deadline:
+        time.sleep(0.1)
+    print(f"Server accepted {len(server.runs)}/{args.runs} runs over {server.requests_handled} requests ({client.failed_attempts} failed attempts retried).")
+    client.close()
@@ -0,0 +1,98 @@
+"""
+A local stand-in for the leaderboard service, used for testing submissions from the game.
+
+Accepts POST /runs with a JSON body of {"runs": [...]} and keeps the runs in memory.
+GET /runs returns the fastest runs. Connections are kept alive between requests like the real service.
+
+    python leaderboard_server.py --port 8787 --latency 0.2 --failure-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import random
+
+
+class LeaderboardServer:
+    """
+    An in-memory leaderboard. Can add artificial latency and failures to exercise the client's retry logic.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.runs = {}
+        self.requests_handled = 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                # Read the request line and headers.
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                content_length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode().partition(":")
+                    if name.strip().lower() == "content-length":
+                        content_length = int(value)
+                body = await reader.readexactly(content_length)
+
+                # Simulate a slow or unreliable service.
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                status, response = self.handle_request(method, path, body)
+
+                payload = json.dumps(response).encode()
+                writer.write((
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    "Connection: keep-alive\r\n\r\n"
+                ).encode() + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def handle_request(self, method, path, body):
+        self.requests_handled += 1
+        if random.random() < self.failure_rate:
+            return 503, {"error": "simulated failure"}
+
+        if method == "POST" and path == "/runs":
+            runs = json.loads(body)["runs"]
+            for run in runs:
+                # Runs are keyed by id, so a retried batch is never counted twice.
+                self.runs[run["id"]] = run
+            return 200, {"accepted": len(runs)}
+
+        if method == "GET" and path == "/runs":
+            fastest = sorted(self.runs.values(), key=lambda run: (run["total_time"], run["deaths"]))[:10]
+            return 200, {"runs": fastest}
+
+        return 404, {"error": "not found"}
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Leaderboard stand-in listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in leaderboard server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with a 503.")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(LeaderboardServer(args.latency, args.failure_rate).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
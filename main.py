@@ -1,8 +1,30 @@
 import arcade
+import argparse
+import atexit
 import os
 import sys
+import time
 import assets.environment_logic as envl
 import assets.player_logic as pl
+import assets.render_logic as rl
+from assets.stage_watcher import StageWatcher
+from assets.leaderboard import LeaderboardClient, create_run_entry
+import assets.savestate as ss
+import assets.stage_systems as systems
+import assets.death_log as dl
+import assets.input_logic as il
+from assets.resource_tracker import ResourceTracker
+from assets.chunk_logic import ChunkedLayer
+from assets.ghost_race import GhostLink, GhostPlayback
+from assets.run_history import RunHistory, new_run_id
+from assets.split_screen import RaceView
+from assets.stage_pack import StagePack
+from assets.stage_select import StageSelectView
+from assets.tileset_cache import CachedTileMap
+from assets.flow_field import FlowField, blocked_cells
+from assets.gpu_warm_up import GpuWarmUp, HitchDetector
+import assets.replay as rp
+import assets.hitbox_cache as hbc
 import assets.constants as const
 
 
@@ -27,9 +49,8 @@ SPRINT_VELOCITY = const.SPRINT_VELOCITY
 
 MAX_JUMPS = const.MAX_JUMPS
 
-# Texture Constants
-COIN_TEXTURE = arcade.load_spritesheet(const.resource_path("assets/coin_textures/coin_sheet.png")).get_texture_grid(size = (18, 18), columns = 4, count = 4)
-EVIL_COIN_TEXTURE = arcade.load_spritesheet(const.resource_path("assets/coin_textures/evil_coin_sheet.png")).get_texture_grid(size = (18, 18), columns = 4, count = 4)
+# Rendering Constants
+NATIVE_RESOLUTION_RENDERING = const.NATIVE_RESOLUTION_RENDERING
 ### END CONSTANTS ###
 
 # For debugging purposes, log recorded height of monitor.
@@ -50,10 +71,18 @@ class GameView(arcade.View):
             base_path = os.path.abspath(".")  # Normal dev path
         return os.path.join(base_path, relative_path)
 
-    def __init__(self):
-        """ Called when the View is created. """
+    def __init__(self, ghost_port: int = const.GHOST_RACE_PORT, ghost_peer: str | None = const.GHOST_RACE_PEER, stage_directory: str | None = None,
+                 replaying: bool = False):
+        """
+        Called when the View is created. Given a ghost peer ("host:port"), races that game with the other player shown as a ghost.
+        Given a stage directory, plays the stage pack in it instead of the game's own stages.
+        When replaying, the game only plays back recorded runs, and never writes to the player's leaderboard queue, run history or caches.
+        """
         super().__init__()
 
+        # Set while rendering a replay, so nothing played back is saved again.
+        self.replaying = replaying
+
         # Allows us to be able to display the framerate.
         arcade.enable_timings()
         self.display_fps = False
@@ -81,14 +110,30 @@ class GameView(arcade.View):
         # Initializing game checks.
         self.game_over = False
         self.dev_mode = False
+        self.practice_mode = False
         self.start = False
 
-        # Creating a list with the timers for each stage.
-        self.stage_time_list = []
-        with open(self.resource_path("assets/stage_times.txt"), 'r') as file:
-            for line in file:
-                amount_of_stage_time = line.split()
-                self.stage_time_list.append(int(amount_of_stage_time[1]))
+        # Set once practice mode is turned on during a run, and only cleared when a new run starts.
+        # Turning practice mode off again doesn't make the run count.
+        self.used_savestates = False
+
+        # Practice mode savestate. Created the first time the player saves.
+        self.savestate = None
+
+        # The stage pack being played: each stage's file, timers and behaviors, read from the pack's manifest.
+        # Only the manifest is read here. A stage's file is parsed when the stage is reached.
+        self.stage_directory = stage_directory or self.resource_path("assets/stage_files")
+        self.stage_pack = StagePack(self.stage_directory)
+
+        # Reuse hit boxes calculated on earlier launches. Has to happen before any texture is loaded.
+        hit_box_cache_path = const.user_data_path(const.HIT_BOX_CACHE_FILE)
+        self.hit_box_algorithm = hbc.install_hit_box_cache(hit_box_cache_path)
+        if not self.replaying:
+            atexit.register(hbc.save_hit_box_cache, self.hit_box_algorithm, hit_box_cache_path)
+
+        # Loading the coin and evil coin animation frames, now their hit boxes can come from the cache.
+        self.coin_textures = arcade.load_spritesheet(self.resource_path("assets/coin_textures/coin_sheet.png")).get_texture_grid(size = (18, 18), columns = 4, count = 4)
+        self.evil_coin_textures = arcade.load_spritesheet(self.resource_path("assets/coin_textures/evil_coin_sheet.png")).get_texture_grid(size = (18, 18), columns = 4, count = 4)
 
         # Loading font that will be used for game.
         arcade.load_font(self.resource_path("assets/PublicPixel-rv0pA.ttf"))
@@ -97,11 +142,68 @@ class GameView(arcade.View):
         self.game_camera = arcade.camera.Camera2D()
         self.gui_camera = arcade.camera.Camera2D()
 
-        # Setting up rest of game logic.
-        self.reset()
+        # Initialize the offscreen framebuffer used when rendering at the native 640x360 resolution.
+        self.native_resolution = NATIVE_RESOLUTION_RENDERING
+        self.native_framebuffer = rl.NativeResolutionFramebuffer(self.window, BASE_HORIZONTAL_PIXELS, BASE_VERTICAL_PIXELS)
 
-        # Setting the player height constant (needed player to be initialized first.)
-        self.PLAYER_HEIGHT_DEFAULT = self.player.height
+        # Records where and why the player dies, for building death heatmaps. Written to disk in batches and on exit.
+        # Custom stage packs keep their deaths in a folder of their own.
+        self.death_log = dl.DeathLog(os.path.join(const.user_data_path("deaths"), self.stage_pack.records_key))
+        atexit.register(self.death_log.flush)
+
+        # DEV mode death heatmap overlay for the current stage.
+        self.show_heatmap = False
+        self.heatmap = arcade.SpriteList()
+
+        # What the player touched this tick. Filled in again every update.
+        self.contacts = envl.Contacts()
+
+        # Clock used to timestamp key presses and ticks. Replays swap it for the clock of the recorded run.
+        self.clock = time.perf_counter
+
+        # Initializing the input handler. Key presses are timestamped and applied at the start of the next update.
+        self.input = il.InputState(il.load_bindings(const.user_data_path(const.KEY_BINDINGS_FILE)), const.JUMP_BUFFER_TIME, const.COYOTE_TIME)
+
+        # Position the cameras and adjust their scope to match that of window.
+        self.setup_cameras()
+
+        # Initializing the player. The same sprite is reused for every stage.
+        self.players = arcade.SpriteList()
+        self.player = arcade.Sprite(self.resource_path("assets/player_textures/player.png"), scale = 1) # giving player blob texture.
+        self.players.append(self.player) # adding player to sprite list.
+
+        # Adding a texture for every pose: each direction, motion and size the player can take.
+        pl.add_player_textures(self.player)
+        self.player_pose = 0
+
+        # Initializing the ghost of the other player in a ghost race. Hidden until their state arrives.
+        self.ghosts = arcade.SpriteList()
+        self.ghost = arcade.Sprite(self.resource_path("assets/player_textures/player.png"), scale = 1)
+        pl.add_player_textures(self.ghost)
+        self.ghost.alpha = const.GHOST_ALPHA
+        self.ghost.visible = False
+        self.ghosts.append(self.ghost)
+
+        # Ghost race networking. Sends and receives on background threads, so on_update never waits on the network.
+        self.ghost_link = None
+        self.ghost_playback = GhostPlayback()
+        if ghost_peer:
+            host, port = ghost_peer.rsplit(":", 1)
+            self.ghost_link = GhostLink(ghost_port, (host, int(port)))
+            atexit.register(self.ghost_link.close)
+            print(f"Ghost race: listening on port {ghost_port}, racing {ghost_peer}")
+
+        # Frame pacing. Static screens slow down once nothing is moving, and the game pauses while another window has focus.
+        self.focused = True
+        self.frame_rate = const.ACTIVE_FRAME_RATE
+        self.idle_frames = 0
+
+        # Resource leak tracking. Turned on with F7 in DEV mode.
+        self.resource_tracker = None
+
+        # Setting up rest of game logic. No stage has been built yet.
+        self.loaded_stage = None
+        self.reset()
 
         # Loading portal noise.
         self.portal_sound = arcade.load_sound(const.resource_path("assets/sounds/upgrade5.wav"))
@@ -129,37 +231,87 @@ class GameView(arcade.View):
         GUI_FONT_LEFT_ANCHOR = 30
         GUI_CONTROL_FONT_SIZE = 7
         self.gui_controls_1 = arcade.Text(f"Press ESC to restart a level. Adds 1 to death count.", GUI_FONT_LEFT_ANCHOR, 320, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
-        self.gui_controls_2 = arcade.Text(f"Press F12 to restart whole game from title screen.", GUI_FONT_LEFT_ANCHOR, 290, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
-        self.gui_controls_3 = arcade.Text(f"Press F11 to toggle fullscreen.", GUI_FONT_LEFT_ANCHOR, 260, arcade.color.BEIGE,font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
-        self.gui_controls_4 = arcade.Text(f"Press F10 to raise volume.", GUI_FONT_LEFT_ANCHOR, 230, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
-        self.gui_controls_5 = arcade.Text(f"Press F9 to lower volume.", GUI_FONT_LEFT_ANCHOR, 200, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
-        self.gui_controls_6 = arcade.Text(f"Press M to switch between Normal and Hard mode.", GUI_FONT_LEFT_ANCHOR, 170, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
-        self.gui_controls_7 = arcade.Text(f"Press \\ to enter DEV mode. Use the UP and DOWN arrow keys to cycle through different stages.", GUI_FONT_LEFT_ANCHOR, 140, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True, multiline = "True", width = 500)
-        self.gui_controls_8 = arcade.Text(f"Click to return to title screen.", GUI_FONT_LEFT_ANCHOR, 110, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
-
-        # Initializing the keys counter.
-        self.keys = set()
-
-
-    def reset(self):
-        """Resets the game to the initial state."""
-
-        # Position the game camera and adjust its scope to match that of window.
-        sw, sh = BASE_HORIZONTAL_PIXELS, BASE_VERTICAL_PIXELS
-        self.game_camera.projection = arcade.LRBT(0, sw, 0, sh)
-        self.game_camera.viewport = arcade.LRBT(0, self.window.width, 0, self.window.height)
-        
-        # Position the gui camera and adjust its scope to match that of window.
-        self.game_camera.position = (0, 0)
-        self.gui_camera.projection = arcade.LRBT(0, sw, 0, sh)
-        self.gui_camera.viewport = arcade.LRBT(0, self.window.width, 0, self.window.height)
-        self.gui_camera.position = (0, 0)
+        self.gui_controls_2 = arcade.Text(f"Press F12 to restart whole game from title screen.", GUI_FONT_LEFT_ANCHOR, 295, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
+        self.gui_controls_3 = arcade.Text(f"Press F11 to toggle fullscreen.", GUI_FONT_LEFT_ANCHOR, 270, arcade.color.BEIGE,font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
+        self.gui_controls_4 = arcade.Text(f"Press F10 to raise volume.", GUI_FONT_LEFT_ANCHOR, 245, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
+        self.gui_controls_5 = arcade.Text(f"Press F9 to lower volume.", GUI_FONT_LEFT_ANCHOR, 220, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
+        self.gui_controls_6 = arcade.Text(f"Press M to switch between Normal and Hard mode.", GUI_FONT_LEFT_ANCHOR, 195, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
+        self.gui_controls_7 = arcade.Text(f"Press \\ to enter DEV mode. Use the UP and DOWN arrow keys to cycle through different stages, L to pick one from a grid, H to show where players die, and F7 to track resource usage.", GUI_FONT_LEFT_ANCHOR, 170, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True, multiline = "True", width = 500)
+        self.gui_controls_8 = arcade.Text(f"Click to return to title screen.", GUI_FONT_LEFT_ANCHOR, 60, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
+        self.gui_controls_9 = arcade.Text(f"Press F8 to toggle pixel perfect scaling.", GUI_FONT_LEFT_ANCHOR, 140, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
+        self.gui_controls_10 = arcade.Text(f"Press P for practice mode. F5 saves, F6 loads a state.", GUI_FONT_LEFT_ANCHOR, 115, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
+        self.gui_controls_11 = arcade.Text(f"Press 2 on the title screen for a split-screen race. P1: WASD, P2: arrows.", GUI_FONT_LEFT_ANCHOR, 90, arcade.color.BEIGE, font_size = GUI_CONTROL_FONT_SIZE, font_name = "Public Pixel", bold = True)
+
+        # The end screen text. Filled in once the final stage is reached.
+        self.final_time = arcade.Text("", 400, 125, arcade.color.BEIGE, 10, font_name = "Public Pixel", bold = True, anchor_x = "center")
+        self.final_deaths = arcade.Text("", 400, 75, arcade.color.BEIGE, 10, font_name = "Public Pixel", bold = True,  anchor_x = "center")
+        self.final_rank = arcade.Text("", 400, 100, arcade.color.BEIGE, 10, font_name = "Public Pixel", bold = True, anchor_x = "center")
+        self.instructions = arcade.Text("Thank you for playing my game! Click to play again!", 400, 25, arcade.color.BEIGE, 10, font_name = "Public Pixel", width = 448, bold = True, anchor_x = "center", multiline = True)
+        self.sorry = arcade.Text(f"Sorry, you are in DEV mode and can not get a final time or death count. :(", 400, 125, arcade.color.BEIGE, 10, font_name = "Public Pixel", width = 448, bold = True, anchor_x = "center", multiline = True)
+
+        # The framerate display, toggled with TAB.
+        self.gui_fps = arcade.Text("", 10, 10, arcade.color.WHITE, 14)
+        self.gui_latency = arcade.Text("", 10, 30, arcade.color.WHITE, 10)
+
+        # Stage file watcher for hot reloading. Only created once DEV mode is entered.
+        self.stage_watcher = None
+
+        # Leaderboard client. Submits completed runs in the background, queueing them on disk while offline.
+        # Run history. Every completed stage and run is saved, so splits can be compared against personal bests. Kept apart for each stage pack.
+        # Neither is opened while replaying, as the player's own game may be using the same files.
+        self.leaderboard = None
+        self.run_history = None
+        if not self.replaying:
+            self.leaderboard = LeaderboardClient(const.LEADERBOARD_URL, const.user_data_path(const.LEADERBOARD_QUEUE_FILE),
+                                                 const.user_data_path(const.LEADERBOARD_REJECTED_FILE))
+            self.run_history = RunHistory(const.user_data_path(const.RUN_HISTORY_FILE), self.stage_pack.records_key, self.stage_pack.play_levels)
+            atexit.register(self.run_history.close)
+        self.run_id = None
+        self.split_start_time = 0
+        self.split_start_deaths = 0
+        self.best_splits = {}
+
+        # Replay of the current run. Only recorded for runs that can reach the run history.
+        self.recorder = None
+        self.gui_split = arcade.Text(text = "", x = anchorx, y = anchory - 150, color = arcade.color.CELADON_GREEN, font_size = 8, font_name = "Public Pixel", bold = True)
+
+        # Upload every texture and text style the game draws while the title screen is up, a step per frame, so none of it is uploaded mid-run.
+        textures = self.coin_textures + self.evil_coin_textures + self.player.textures + self.ghost.textures
+        texts = [value for value in vars(self).values() if isinstance(value, arcade.Text)]
+        # Large stage packs only warm up their first stages, the rest upload as they are reached.
+        stage_files = [self.stage_pack.path(level) for level in self.stage_pack.levels[:const.WARM_UP_STAGES]]
+        self.warm_up = GpuWarmUp(self.window.ctx, textures, texts, stage_files)
+
+        # Logs frames that come late, with what was uploaded during them. Only created once DEV mode is entered, or at launch with HITCH_LOGGING, see main().
+        self.hitch_detector = None
+
+
+    def reset(self, reload = False):
+        """Resets the stage to its initial state. The stage is only rebuilt when the stage level changed, or a reload is requested."""
+
+        if reload or self.stage_level != self.loaded_stage:
+            self.load_stage()
+
+        self.respawn()
+
+
+    def load_stage(self):
+        """Builds the parts of the current stage that never change while it is played. Only called when moving to a new stage."""
+
+        # Release the previous stage first, so it isn't kept alive alongside the new one.
+        if self.loaded_stage is not None:
+            self.unload_stage()
 
         # Initializing the map.
-        MAP_FILE = self.resource_path(os.path.join("assets/stage_files", f"taa_stage_{self.stage_level}.tmx")) # concatentate string with the level number. have naming convention where file ends with the level number.
-        self.map = arcade.TileMap(MAP_FILE, scaling = 1)
+        MAP_FILE = self.stage_pack.path(self.stage_level)
+        self.stage_pack.verify(self.stage_level)
+        # Tilesets and tile textures come from the shared tileset cache, so only the stage's own layers are parsed.
+        # Layers are lazy so their GPU buffers are only created if they are drawn directly. Collision layers get a spatial hash, so large stages stay fast.
+        self.map = CachedTileMap(MAP_FILE, scaling = 1, lazy = True, layer_options = {layer: {"use_spatial_hash": True} for layer in const.SPATIAL_HASH_LAYERS})
 
-        self.stage_time = self.stage_time_list[self.stage_level + self.difficulty]
+        # The size of the stage in pixels. Stages can be wider than the screen, in which case the camera follows the player.
+        self.stage_width = self.map.width * self.map.tile_width * self.map.scaling
+        self.stage_height = self.map.height * self.map.tile_height * self.map.scaling
 
         # Initializing the relevant layers for easy access. Note: These are all sprite lists.
         self.enemies = self.map.sprite_lists["enemies"]
@@ -169,13 +321,43 @@ class GameView(arcade.View):
         self.starting_position = self.map.sprite_lists["starting_position"]
         self.portal = self.map.sprite_lists["portal"]
 
+        # Split the layers that never move into chunks, so only the part of the stage near the camera is built and drawn.
+        # The layers that move are small, and are drawn whole. Layers are kept in map order so they draw in the right order.
+        self.draw_layers = []
+        self.chunked_layers = []
+        for name, sprite_list in self.map.sprite_lists.items():
+            if name in const.MOVING_LAYERS:
+                self.draw_layers.append(sprite_list)
+            else:
+                chunked_layer = ChunkedLayer(sprite_list, const.CHUNK_SIZE, const.CHUNK_PRELOAD_MARGIN)
+                self.draw_layers.append(chunked_layer)
+                self.chunked_layers.append(chunked_layer)
+
         # Adding different textures for coin animation.
-        envl.setup_animated_coins(self.coins, COIN_TEXTURE)
-        self.animation_clock = 0
+        envl.setup_animated_coins(self.coins, self.coin_textures)
+
+        # Keep every coin the stage starts with, so savestates and respawns can put collected coins back.
+        self.all_coins = list(self.coins)
+
+        # Look up the stage's special behaviors, from the stage pack and the map's custom properties.
+        config = systems.stage_config(self.stage_pack.config(self.stage_level), self.map.properties)
 
         # Add different textures for evil coin entities.
-        if self.stage_level == 15:
-            envl.setup_animated_coins(self.enemies, EVIL_COIN_TEXTURE)
+        if config.get("evil_coins"):
+            envl.setup_animated_coins(self.enemies, self.evil_coin_textures)
+
+        # Set the stage's background color, if it has one. Otherwise, keep the existing color.
+        if "color" in config:
+            self.background_color = config["color"]
+
+        # Build the list of behaviors to run each frame on this stage.
+        self.stage_systems = systems.compile_stage_systems(config)
+
+        # Chasing enemies and fleeing coins steer around the terrain with a flow field, searched again whenever the player enters a new tile.
+        self.flow_field = None
+        if systems.uses_flow_field(config):
+            tile_size = self.map.tile_width * self.map.scaling
+            self.flow_field = FlowField(blocked_cells(self.terrain, self.map.width, self.map.height, tile_size), self.map.width, self.map.height, tile_size)
 
         # Determine amount of coins to collect in the stage.
         self.coins_to_collect = len(self.coins)
@@ -183,47 +365,416 @@ class GameView(arcade.View):
         # Moving the portal offscreen so player can't interact with it. (will return to screen when player collects all coins in a stage.)
         for section in self.portal:
             # Use virtual dimensions for portal offset. Stores it off screen until user has collected all coins.
-            section.center_x -= BASE_HORIZONTAL_PIXELS
+            section.center_x -= self.stage_width
             section.center_y -= BASE_VERTICAL_PIXELS           
-        
-        self.portal_hidden = True
 
-        # Initializing the player and some key attributes.
-        self.players = arcade.SpriteList()
-        self.player = arcade.Sprite(self.resource_path("assets/player_textures/player.png"), scale = 1) # giving player blob texture.
-        
+        # Placing the player on the starting position.
         start_x = self.starting_position[0].center_x #+ 18   # Setting up starting position.
         start_y = self.starting_position[0].center_y        # Determined by position of starting tile in map.
         self.player.position = (start_x, start_y)
-        
-        self.players.append(self.player) # adding player to sprite list.
+        self.player.velocity = (0, 0)
 
-        # Adding textures for the player facing different ways.
-        pl.add_player_textures(self.player)
+        # Initializing the physics engine.
+        self.physics_engine = arcade.PhysicsEnginePlatformer(self.player, walls=self.terrain, gravity_constant=GRAVITY)
+
+        # Record how the stage starts. Respawning restores this instead of rebuilding the stage.
+        self.stage_start_state = ss.Savestate(self.stage_level, len(self.all_coins), len(self.enemies), len(self.portal))
+        ss.save_state(self.stage_start_state, self.player, self.all_coins, self.coins, self.enemies, self.portal, (0, 0, 1, 0, True))
+
+        self.loaded_stage = self.stage_level
+
+        # Keep the stage's size with its deaths, so heatmaps cover all of it.
+        if not self.replaying:
+            self.death_log.stage_loaded(self.stage_level, self.map.width, self.map.height)
+
+        # Report what the new stage is using.
+        if self.resource_tracker is not None:
+            self.resource_tracker.stage_loaded(self.stage_level)
+
+        # Show the new stage's deaths if the heatmap is on.
+        if self.show_heatmap:
+            self.build_heatmap()
+
+
+    def unload_stage(self):
+        """Releases the current stage's sprites and texture references right away, instead of leaving them for the garbage collector."""
+
+        # Clearing each layer breaks the references between its sprites and the list, so they are freed immediately.
+        for chunked_layer in self.chunked_layers:
+            chunked_layer.clear()
+        for sprite_list in self.map.sprite_lists.values():
+            sprite_list.clear()
+        self.draw_layers = []
+        self.chunked_layers = []
+
+        # Coins collected on this stage are only referenced here.
+        self.all_coins = []
+        self.heatmap.clear()
+
+        # Drop everything else built for the stage.
+        self.stage_systems = []
+        self.flow_field = None
+        self.stage_start_state = None
+        self.physics_engine = None
+        self.map = None
+        self.loaded_stage = None
+
+
+    def respawn(self):
+        """Puts the current stage back the way it was loaded and returns the player to the start, without rebuilding anything."""
+
+        # Put collected coins back, and move the player, coins, enemies and portal back to where they started.
+        ss.load_state(self.stage_start_state, self.player, self.all_coins, self.coins, self.enemies, self.portal)
+
+        # Resetting the player's appearance.
+        self.set_player_pose(0)
+
+        # Resetting the stage timer and animations.
+        self.stage_time = self.stage_pack.stage_time(self.stage_level, self.difficulty)
+        self.animation_clock = 0
+
+        # Forget any jump pressed before dying.
+        self.input.clear()
+
+        # Watch for resources piling up across respawns.
+        if self.resource_tracker is not None:
+            self.resource_tracker.respawned()
+
+        # The portal starts hidden until all coins are collected.
+        self.portal_hidden = True
 
         # Initializing coin counter.
         self.coins_collected = 0
 
-        # Initializing the physics engine.
-        self.physics_engine = arcade.PhysicsEnginePlatformer(self.player, walls=self.terrain, gravity_constant=GRAVITY)
         self.JUMP_COUNTER = 1 # Keep track of jumps the player has taken. Initialized to 1 to account for update() moving faster than the player will from the ground.
 
+        # Move the camera back to the player.
+        self.follow_player()
+
+
+    def hot_reload_stage(self):
+        """Re-parses the current stage after its files were edited, keeping the player where they were if possible."""
+
+        start = time.perf_counter()
+
+        # Remember where the player was before the map is swapped out.
+        old_position = self.player.position
+        old_velocity = self.player.velocity
+
+        # Re-parse the changed stage. Tilesets are re-read as part of loading the map.
+        self.reset(reload = True)
+
+        # Put the player back, unless the edited stage now has terrain there or it is off the map.
+        self.player.position = old_position
+        if arcade.check_for_collision_with_list(self.player, self.terrain) or pl.player_out_of_bounds(self.player, self.stage_width, BASE_VERTICAL_PIXELS):
+            self.player.position = (self.starting_position[0].center_x, self.starting_position[0].center_y)
+        else:
+            self.player.velocity = old_velocity
+
+        print(f"Reloaded stage {self.stage_level} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+    def player_died(self, cause):
+        """Records where the player died and why, then respawns them at the start of the stage."""
+
+        # Deaths while designing stages in DEV mode would skew the heatmaps, and replayed deaths were already recorded.
+        if not self.dev_mode and not self.replaying:
+            self.death_log.record(self.stage_level, self.player.center_x, self.player.center_y, cause)
+
+        self.deaths = pl.player_dies_sequence(self.deaths)
+        self.reset()
+
+
+    def build_heatmap(self):
+        """Draws the deaths recorded on the current stage as a single texture laid over the stage."""
+
+        # Make sure deaths from this session are included.
+        self.death_log.flush()
+
+        counts = dl.bin_deaths(dl.load_deaths(self.death_log.directory, self.stage_level), (self.map.width, self.map.height))
+        texture = arcade.Texture(dl.heatmap_image(counts))
+
+        # One texture with a pixel per tile, scaled up so each pixel covers its tile.
+        self.heatmap.clear()
+        overlay = arcade.Sprite(texture, scale = dl.TILE_SIZE)
+        height, width = counts.shape
+        overlay.position = (width * dl.TILE_SIZE / 2, height * dl.TILE_SIZE / 2)
+        self.heatmap.append(overlay)
+
+
+    def show_end_screen(self):
+        """Fills in the end screen text once the player reaches the final stage, and submits the run."""
+
+        if self.game_over:
+            return
+
+        self.game_over = True
+
+        # The run is over, so stop recording it. It is only saved below if it counts.
+        recorder = self.recorder
+        self.recorder = None
+        if not self.dev_mode:
+            self.final_time.text = f"Your final time was {round(self.total_time, 2)}"
+            self.final_deaths.text = f"Your final deaths was {self.deaths}"
+            self.final_rank.text = ""
+            self.instructions.y = 25
+
+            # Send the completed run to the leaderboard. Returns immediately, the upload happens in the background.
+            # Runs that used practice mode savestates at any point are not submitted, or saved to the run history.
+            # Runs on custom stage packs are only saved to their pack's own run history.
+            if not self.used_savestates and not self.replaying:
+                if self.stage_pack.shipped:
+                    self.leaderboard.submit(create_run_entry(const.LEADERBOARD_PLAYER_NAME, self.total_time, self.deaths, self.difficulty))
+
+                # Compare against the previous runs before this one is saved.
+                percent_faster = self.run_history.percent_faster(self.total_time, self.difficulty)
+                if percent_faster is not None:
+                    self.final_rank.text = f"Faster than {round(percent_faster)}% of your last runs"
+                self.run_history.record_run(self.run_id, self.difficulty, self.total_time, self.deaths)
+
+                # Keep the replay of the run, for rendering later.
+                if recorder is not None:
+                    recorder.save(const.user_data_path(const.REPLAY_DIRECTORY))
+        else:
+            self.instructions.y = 75
+
+
+    def start_run(self):
+        """Starts timing splits for a new run, and looks up the personal best on each stage for the HUD."""
+
+        self.run_id = new_run_id()
+        self.used_savestates = False
+        self.split_start_time = self.total_time
+        self.split_start_deaths = self.deaths
+        self.best_splits = self.run_history.best_splits(self.difficulty) if self.run_history is not None else {}
+
+        # Finish warming up now if the run started before the title screen was done with it.
+        self.warm_up.finish()
+
+        # Start recording a replay of the run. Replays being played back aren't recorded again.
+        if not self.replaying:
+            self.recorder = rp.ReplayRecorder(self.run_id, self.difficulty, self.input.key_to_action, self.best_splits, self.clock(), self.stage_pack)
+
+
+    def complete_split(self):
+        """Saves the time and deaths on the stage just completed to the run history, and starts the next split."""
+
+        # Splits from DEV mode, or with practice mode savestates, aren't real attempts.
+        if self.start and not self.dev_mode and not self.used_savestates and not self.replaying and self.run_id:
+            elapsed = self.total_time - self.split_start_time
+            self.run_history.record_split(self.run_id, self.stage_level, self.difficulty, elapsed, self.deaths - self.split_start_deaths)
+
+            # Keep the HUD's personal bests current without waiting for the write.
+            if elapsed < self.best_splits.get(self.stage_level, float("inf")):
+                self.best_splits[self.stage_level] = elapsed
+
+        self.split_start_time = self.total_time
+        self.split_start_deaths = self.deaths
+
+
+    def update_split_text(self):
+        """Shows the time on the current stage, and how far ahead or behind the personal best it is."""
+
+        elapsed = self.total_time - self.split_start_time
+        best = self.best_splits.get(self.stage_level)
+        if best is None:
+            self.gui_split.text = f"Split: {elapsed:.1f}"
+        else:
+            self.gui_split.text = f"Split: {elapsed:.1f} ({elapsed - best:+.1f})"
+
+
+    def save_state(self):
+        """Captures the current stage into the practice mode savestate."""
+
+        # Only allocate a new snapshot when the stage changed. Otherwise, overwrite the existing one.
+        if self.savestate is None or not self.savestate.matches(self.stage_level, self.all_coins, self.enemies, self.portal):
+            self.savestate = ss.Savestate(self.stage_level, len(self.all_coins), len(self.enemies), len(self.portal))
+
+        counters = (self.stage_time, self.animation_clock, self.JUMP_COUNTER, self.coins_collected, self.portal_hidden)
+        ss.save_state(self.savestate, self.player, self.all_coins, self.coins, self.enemies, self.portal, counters)
+        print(f"Saved state on stage {self.stage_level}")
+
+
+    def load_state(self):
+        """Restores the practice mode savestate in place, without reloading the stage."""
+
+        if self.savestate is None or not self.savestate.matches(self.stage_level, self.all_coins, self.enemies, self.portal):
+            return
+
+        counters = ss.load_state(self.savestate, self.player, self.all_coins, self.coins, self.enemies, self.portal)
+        self.stage_time = counters[ss.STAGE_TIME]
+        self.animation_clock = counters[ss.ANIMATION_CLOCK]
+        self.JUMP_COUNTER = int(counters[ss.JUMP_COUNTER])
+        self.coins_collected = int(counters[ss.COINS_COLLECTED])
+        self.portal_hidden = bool(counters[ss.PORTAL_HIDDEN])
+
+
+    def record_tick(self, delta_time):
+        """Adds the start of this tick to the replay. The first tick on each stage also saves a savestate, so replays can start from any stage."""
+
+        if self.stage_level != self.recorder.stage_level:
+            savestate = ss.Savestate(self.stage_level, len(self.all_coins), len(self.enemies), len(self.portal))
+            counters = (self.stage_time, self.animation_clock, self.JUMP_COUNTER, self.coins_collected, self.portal_hidden)
+            ss.save_state(savestate, self.player, self.all_coins, self.coins, self.enemies, self.portal, counters)
+            run_state = {"deaths": self.deaths, "total_time": self.total_time, "split_start_time": self.split_start_time,
+                         "split_start_deaths": self.split_start_deaths, "background_color": list(self.background_color)}
+            self.recorder.start_stage(self.stage_level, savestate, self.input, run_state)
+
+        self.recorder.tick(self.clock(), delta_time, self.player, self.player_pose, self.focused)
+
+
+    def sync_ghost(self):
+        """Sends this tick's player state to the other game, and moves the ghost to where the other player was shown to be."""
+        now = time.perf_counter()
+        self.ghost_link.send(self.player.center_x, self.player.center_y, self.player.change_x, self.player.change_y,
+                             self.player_pose, self.stage_level)
+
+        for received in self.ghost_link.receive():
+            self.ghost_playback.add(*received)
+
+        # Only show the ghost while the other player is on the same stage.
+        state = self.ghost_playback.sample(now)
+        self.ghost.visible = state is not None and state[5] == self.stage_level
+        if self.ghost.visible:
+            x, y, change_x, change_y, texture, _ = state
+            self.ghost.position = (x, y)
+            self.ghost.set_texture(texture)
+
+    def set_player_pose(self, pose):
+        """Shows one of the player's precomputed poses. The sprite is only changed when the pose is different."""
+
+        if pose != self.player_pose:
+            self.player_pose = pose
+            self.player.set_texture(pose)
+
+
+    def screen_is_idle(self):
+        """True on the title, end and controls screens when the player is standing still and no keys are pressed."""
+
+        return (self.stage_level in self.stage_pack.static_levels and self.ghost_link is None and self.warm_up.done
+                and not self.input.active and not self.input.events
+                and abs(self.player.change_x) < 0.01 and self.player.change_y == 0 and self.physics_engine.can_jump())
+
+
+    def update_idle_screen(self, delta_time):
+        """Runs only the timers and animations of a static screen. After a short while, drops to the idle frame rate."""
+
+        self.stage_time -= delta_time
+        if not self.game_over:
+            self.total_time += delta_time
+        self.gui_timer.text = "Time: " + str(round(self.stage_time))
+        if self.stage_time < 0:
+            self.player_died(dl.TIMER)
+
+        # Coins and the player's idle animation are the only things moving.
+        self.animation_clock += delta_time
+        envl.animate_coin(self.animation_clock, self.coins)
+        if self.animation_clock > 1:
+            self.animation_clock = 0
+        self.set_player_pose(pl.player_pose(self.player, True, 0, self.animation_clock, self.player_pose))
+
+        # Keep drawing at full speed for a moment first, so whatever changed last is on screen.
+        self.idle_frames += 1
+        if self.idle_frames >= const.IDLE_AFTER_FRAMES:
+            self.set_frame_rate(const.IDLE_FRAME_RATE)
+
+
+    def set_frame_rate(self, rate):
+        """Sets how often the game updates and draws, in seconds per frame."""
+
+        if rate != self.frame_rate:
+            self.frame_rate = rate
+            self.window.set_update_rate(rate)
+            self.window.set_draw_rate(rate)
+
+
+    def wake(self):
+        """Goes back to full speed straight away, e.g. on a key press, so the response isn't held back by the idle frame rate."""
+
+        self.idle_frames = 0
+        self.set_frame_rate(const.ACTIVE_FRAME_RATE)
+
+
+    def on_activate(self):
+        """Called when the window gains focus. Resumes the game at full speed."""
+
+        self.focused = True
+        self.wake()
+
+
+    def on_deactivate(self):
+        """Called when the window loses focus. Pauses the game and only redraws a few times a second."""
+
+        self.focused = False
+        self.set_frame_rate(const.UNFOCUSED_FRAME_RATE)
+
+        # Key releases while unfocused are never seen, so let go of everything now.
+        self.input.release_all()
+        if self.recorder is not None:
+            self.recorder.key(self.clock(), 0, rp.RELEASE_ALL)
+
+
+    def follow_player(self):
+        """Scrolls the game camera to keep the player centered on stages wider than the screen, and streams in the chunks around it."""
+
+        sw, sh = BASE_HORIZONTAL_PIXELS, BASE_VERTICAL_PIXELS
+
+        # Keep the camera within the stage. Stages one screen wide never scroll.
+        left = min(max(self.player.center_x - sw / 2, 0), max(self.stage_width - sw, 0))
+        self.game_camera.position = (left, 0)
+
+        for chunked_layer in self.chunked_layers:
+            chunked_layer.update(left, 0, left + sw, sh)
+
+
+    def setup_cameras(self):
+        """Positions both cameras and points them at the window, or at the offscreen framebuffer when rendering at native resolution."""
+
+        sw, sh = BASE_HORIZONTAL_PIXELS, BASE_VERTICAL_PIXELS
+
+        # Native resolution draws 1:1 into the 640x360 framebuffer. Otherwise, stretch across the whole window.
+        if self.native_resolution:
+            render_target = self.native_framebuffer.framebuffer
+            viewport = arcade.LRBT(0, sw, 0, sh)
+        else:
+            render_target = None
+            viewport = arcade.LRBT(0, self.window.width, 0, self.window.height)
+
+        # Adjust the game camera's scope. Its position follows the player, see follow_player().
+        self.game_camera.render_target = render_target
+        self.game_camera.projection = arcade.LRBT(0, sw, 0, sh)
+        self.game_camera.viewport = viewport
+
+        # Position the gui camera and adjust its scope.
+        self.gui_camera.render_target = render_target
+        self.gui_camera.projection = arcade.LRBT(0, sw, 0, sh)
+        self.gui_camera.viewport = viewport
+        self.gui_camera.position = (0, 0)
+
         
     def on_draw(self):
         """
         Render the screen each frame.
         """
         # Clear the scene every frame.
-        self.clear()
+        if self.native_resolution:
+            self.native_framebuffer.clear(self.background_color)
+        else:
+            self.clear()
 
         # Activate game camera before drawing world objects.
         self.game_camera.use()
 
-        # Draw the map every frame.
-        for layer in self.map.sprite_lists:
-            self.map.sprite_lists[layer].draw(pixelated=True)
+        # Draw the map every frame. Chunked layers only draw the chunks in view.
+        for layer in self.draw_layers:
+            layer.draw(pixelated=True)
         
-        # Drawing the player.
+        # Drawing the death heatmap over the stage.
+        if self.show_heatmap:
+            self.heatmap.draw(pixelated=True)
+
+        # Drawing the other player's ghost, then the player.
+        self.ghosts.draw(pixelated=True)
         self.players.draw(pixelated=True)
 
         # Drawing the GUI.
@@ -237,21 +788,23 @@ class GameView(arcade.View):
             self.gui_stage_level.draw()
             self.gui_total_time_text.draw()
             self.gui_total_time_number.draw()
+            self.gui_split.draw()
         
         elif not self.start and self.stage_level == 0:
             self.gui_start.draw()
 
-        if self.stage_level == 21:
+        if self.stage_level == self.stage_pack.end_level:
             if not self.dev_mode:
                 self.final_time.draw()
                 self.final_deaths.draw()
+                self.final_rank.draw()
                 self.instructions.draw()
             else:
                 self.background_color = arcade.color.DARK_PASTEL_RED
                 self.sorry.draw()
                 self.instructions.draw()
 
-        if self.stage_level == 22:
+        if self.stage_level == self.stage_pack.controls_level:
             self.gui_controls_1.draw()
             self.gui_controls_2.draw()
             self.gui_controls_3.draw()
@@ -260,11 +813,23 @@ class GameView(arcade.View):
             self.gui_controls_6.draw()
             self.gui_controls_7.draw()
             self.gui_controls_8.draw()
+            self.gui_controls_9.draw()
+            self.gui_controls_10.draw()
+            self.gui_controls_11.draw()
         
         # Draw the framerate.
         if self.display_fps:
-            fps = arcade.get_fps()
-            arcade.draw_text(f"FPS: {fps:.0f}", 10, 10, arcade.color.WHITE, 14)
+            self.gui_fps.text = f"FPS: {arcade.get_fps():.0f}"
+            self.gui_latency.text = f"Jump latency: {self.input.average_latency * 1000:.1f} ms"
+            self.gui_fps.draw()
+            self.gui_latency.draw()
+
+        # Upscale the native resolution frame onto the window.
+        if self.native_resolution:
+            self.native_framebuffer.draw_to_window()
+
+        if self.hitch_detector is not None:
+            self.hitch_detector.frame_drawn(self.frame_rate, f"stage {self.stage_level}")
             
 
     def on_update(self, delta_time: float):
@@ -272,6 +837,32 @@ class GameView(arcade.View):
         Contains the logic for updating the game's state each frame.
         """
         
+        # Reload the current stage if its files were edited while in DEV mode.
+        if self.dev_mode and self.stage_level in self.stage_watcher.poll():
+            self.hot_reload_stage()
+
+        # Add this tick to the replay of the run, before anything in it changes.
+        if self.recorder is not None:
+            self.record_tick(delta_time)
+
+        # While another window has focus the game is paused, but the run's clock keeps going so switching away isn't a free pause.
+        if not self.focused:
+            if not self.game_over:
+                self.total_time += delta_time
+            return
+
+        # Warm up the GPU a step per frame while the title screen is up.
+        if not self.warm_up.done and self.stage_level == 0:
+            self.warm_up.step()
+
+        # A static screen with nothing moving only needs its animations.
+        if self.screen_is_idle():
+            self.update_idle_screen(delta_time)
+            return
+
+        # Apply the key presses and releases that happened since the last update.
+        actions = self.input.update(self.clock())
+
         # Update level timer. If time runs out, reset the level.
         self.stage_time -= delta_time
         if not self.game_over:
@@ -283,24 +874,28 @@ class GameView(arcade.View):
         self.gui_remaining_coins.text = "Coins Left: " + str(self.coins_to_collect - self.coins_collected)
         self.gui_stage_level.text = "Level " + str(self.stage_level)
         self.gui_total_time_number.text = str(round(self.total_time, 2))
+        self.update_split_text()
 
         # Check stage timer. Reset level if time runs out.
         if self.stage_time < 0:
-            self.deaths = pl.player_dies_sequence(self.deaths)
-            self.reset()
+            self.player_died(dl.TIMER)
 
         # Move the player in response to the keys the player pressed.
-        pl.player_movement(self.player, self.PLAYER_HEIGHT_DEFAULT, self.keys)
+        pl.player_movement(self.player, actions)
 
         # Check if player is in bounds of map.
         # Gemini edited this. Use virtual dimensions for bounds check.
-        if pl.player_out_of_bounds(self.player, BASE_HORIZONTAL_PIXELS, BASE_VERTICAL_PIXELS):
+        if pl.player_out_of_bounds(self.player, self.stage_width, BASE_VERTICAL_PIXELS):
         # if pl.player_out_of_bounds(self.player, self.width, self.height):
-            self.deaths = pl.player_dies_sequence(self.deaths)
-            self.reset()
+            self.player_died(dl.OUT_OF_BOUNDS)
+
+        # Find everything the player is touching in a single query. Touching dangerous terrain or an enemy kills them and restarts the level.
+        contacts = envl.find_contacts(self.player, self.coins, self.dangerous_terrain, self.enemies, self.contacts)
+        if contacts.death is not None:
+            self.player_died(contacts.death)
 
         # Check if player collected coins. If so, update counter and remove them from screen.
-        self.coins_collected = envl.collect_coin(self.player, self.coins, self.coins_collected)
+        self.coins_collected = envl.collect_coins(contacts.coins, self.coins_collected)
         self.gui_remaining_coins.text  = "Coins Left: " + str(self.coins_to_collect - self.coins_collected)
 
         # Animate coin sprites.
@@ -310,32 +905,33 @@ class GameView(arcade.View):
         if self.animation_clock > 1:
             self.animation_clock = 0
 
-        # Check if the player made contact with dangerous terrain. If so, kill them and restart level.
-        if envl.check_for_environment_contact(self.player, self.dangerous_terrain):
-            self.deaths = pl.player_dies_sequence(self.deaths)
-            self.reset()
 
-        # Check if the player made contact with enemies. If so, kill them and restart level.
-        if envl.check_for_environment_contact(self.player, self.enemies):
-            self.deaths = pl.player_dies_sequence(self.deaths)
-            self.reset()
-        
-        # Animate the player in response to their movement.
-        pl.animate_player(self.player, self.physics_engine)
-        pl.player_idle(self.player, self.animation_clock)
+        # Animate the player in response to their movement. The texture, and with it the hit box, only changes when the pose does.
+        self.set_player_pose(pl.player_pose(self.player, self.physics_engine.can_jump(), actions, self.animation_clock, self.player_pose))
 
         # Updating jump counter when player hits ground.
         if self.physics_engine.can_jump(18):
             self.JUMP_COUNTER = 1
-        
-        # Checking for unique stages. If so, implement their logic.
-        self.background_color = envl.unique_stage_logic(self.stage_level, self.player, self.enemies, self.animation_clock, self.background_color)
 
+        # Remember when the player was last standing on the ground, for coyote time.
+        now = self.clock()
+        if self.physics_engine.can_jump():
+            self.input.note_grounded(now)
+
+        # Player jumping mechanism. A jump pressed shortly before it is possible still happens, as does one shortly after walking off a ledge.
+        if self.input.jump_buffered(now):
+            if self.input.in_coyote_window(now):
+                self.JUMP_COUNTER = 1
+            if self.JUMP_COUNTER < MAX_JUMPS:
+                self.player.change_y = PLAYER_JUMP_VELOCITY
+                self.JUMP_COUNTER += 1
+                self.input.consume_jump(now)
+        
         # Check if portal can return to main screen.
         if envl.check_coins_collected(self.coins_collected, self.coins_to_collect) and self.portal_hidden:
             for section in self.portal:
                 # Gemini edited this. Use virtual dimensions for portal return.
-                section.center_x += BASE_HORIZONTAL_PIXELS
+                section.center_x += self.stage_width
                 section.center_y += BASE_VERTICAL_PIXELS
                 # section.center_x += self.width
                 # section.center_y += self.height
@@ -343,30 +939,17 @@ class GameView(arcade.View):
             self.portal_hidden = not self.portal_hidden
 
         # Check if player entered portal. If so, move player to next level
+        # Checked after the portal opens, so it can be entered on the same tick as the last coin is collected.
         if not self.portal_hidden and envl.check_for_environment_contact(self.player, self.portal):
             arcade.play_sound(self.portal_sound)
-            self.stage_level += 1
+            self.complete_split()
+            self.stage_level = self.stage_pack.next_level(self.stage_level)
             self.reset()
-        
-        # Check if level 18. If so, execute special code.
-        if self.stage_level == 18:
-            envl.coin_run_away(self.player, self.coins)
-            if not self.portal_hidden:
-                for portal in self.portal:
-                    portal.forward(2)
-        
-        # Check if player completed game.
-        if self.stage_level == 21 and not self.game_over:
-            self.game_over = True
-            if not self.dev_mode:
-                self.final_time = arcade.Text(f"Your final time was {round(self.total_time, 2)}", 400, 125, arcade.color.BEIGE, 10, font_name = "Public Pixel", bold = True, anchor_x = "center")
-                self.final_deaths = arcade.Text(f"Your final deaths was {self.deaths}", 400, 75, arcade.color.BEIGE, 10, font_name = "Public Pixel", bold = True,  anchor_x = "center")
-                self.instructions = arcade.Text("Thank you for playing my game! Click to play again!", 400, 25, arcade.color.BEIGE, 10, font_name = "Public Pixel", width = 448, bold = True, anchor_x = "center", multiline = True)
-            else:
-                self.sorry = arcade.Text(f"Sorry, you are in DEV mode and can not get a final time or death count. :(", 400, 125, arcade.color.BEIGE, 10, font_name = "Public Pixel", width = 448, bold = True, anchor_x = "center", multiline = True)
-                self.instructions = arcade.Text("Thank you for playing my game! Click to play again!", 400, 75, arcade.color.BEIGE, 10, font_name = "Public Pixel", width = 448, bold = True, anchor_x = "center", multiline = True)
-            
 
+        # Run the special behaviors of the current stage.
+        for system in self.stage_systems:
+            system(self)
+        
         # Updating necesary sprite lists/objects.
         self.players.update()
         self.physics_engine.update()
@@ -374,11 +957,26 @@ class GameView(arcade.View):
         self.coins.update()
         self.portal.update()
 
+        # Scroll the camera along with the player.
+        self.follow_player()
+
+        # Exchange player states with the other game in a ghost race.
+        if self.ghost_link:
+            self.sync_ghost()
+
+        # Update at full speed again until the screen settles.
+        self.wake()
+
         
     def on_key_press(self, key: int, key_modifiers: int):
         """
         Called whenever a key is pressed.
         """
+        self.wake()
+
+        # Record the key for the replay. Keys only matter to a replay while a run is going, and it is dropped once the run ends.
+        if self.recorder is not None:
+            self.recorder.key(self.clock(), key, rp.PRESS)
 
         # Allow player to restart.
         if key == arcade.key.ESCAPE:
@@ -390,16 +988,19 @@ class GameView(arcade.View):
             self.fullscreen_mode = not self.fullscreen_mode
             self.window.set_fullscreen(self.fullscreen_mode)
 
-            # Re-call reset to update camera viewport for new window size.
-            self.reset()
+            # Update the camera viewports for the new window size.
+            self.setup_cameras()
+
+        # Toggle rendering at native resolution with integer upscaling.
+        if key == arcade.key.F8:
+            self.native_resolution = not self.native_resolution
+            self.setup_cameras()
+            print(f"Native Resolution Rendering: {self.native_resolution}")
 
-        # Player jumping mechanism.
-        if key == arcade.key.SPACE and self.JUMP_COUNTER < MAX_JUMPS:
-                self.player.change_y = PLAYER_JUMP_VELOCITY
-                self.JUMP_COUNTER += 1
-                          
         # Game reset.
         if key == arcade.key.F12:
+            self.recorder = None
+            self.used_savestates = False
             self.stage_level = 0
             self.reset()
             self.deaths = pl.player_dies_sequence(self.deaths)
@@ -407,20 +1008,28 @@ class GameView(arcade.View):
             self.deaths = 0
             self.total_time = 0
             self.dev_mode = False
+            self.practice_mode = False
             self.start = False
             self.background_color = arcade.color.DARK_BROWN if self.difficulty == -1 else arcade.color.DARK_RED
         
         # Start game.
         if self.stage_level == 0 and key == arcade.key.B:
             self.start = True
-            self.stage_level += 1
+            self.stage_level = self.stage_pack.next_level(self.stage_level)
             self.reset()
             self.deaths = pl.player_dies_sequence(self.deaths)
             self.game_over = False
             self.deaths = 0
             self.total_time = 0
             self.background_color = arcade.color.DARK_BROWN
+            self.start_run()
         
+        # Start a split-screen race between two players on this keyboard.
+        if self.stage_level == 0 and key == arcade.key.KEY_2 and not self.dev_mode:
+            self.input.release_all()
+            self.window.show_view(RaceView(self, self.coin_textures, self.evil_coin_textures))
+            return
+
         # Allow player to adjust difficulty.
         if self.stage_level == 0 and key == arcade.key.M and not self.dev_mode:
             if self.difficulty == -1:
@@ -433,16 +1042,60 @@ class GameView(arcade.View):
                 print("Normal Mode Enabled")
         
         # For dev purposes.
-        if key == arcade.key.BACKSLASH and not self.stage_level == 21:
+        if key == arcade.key.BACKSLASH and not self.stage_level == self.stage_pack.end_level:
             self.dev_mode = True
+            self.recorder = None
             print(f"DEV Mode: {self.dev_mode}")
 
+            # Start watching the stage files so edits made in Tiled show up without restarting.
+            if self.stage_watcher is None:
+                self.stage_watcher = StageWatcher(self.stage_directory, self.stage_pack.stage_files())
+
+            # Start logging hitches, with what was uploaded to the GPU during them.
+            if self.hitch_detector is None:
+                self.hitch_detector = HitchDetector(self.window.ctx, const.HITCH_THRESHOLD)
+
+        # Pick a stage from a grid of thumbnails in DEV mode.
+        if self.dev_mode and key == arcade.key.L:
+            self.input.release_all()
+            self.window.show_view(StageSelectView(self))
+            return
+
+        # Toggle the death heatmap overlay in DEV mode.
+        if self.dev_mode and key == arcade.key.H:
+            self.show_heatmap = not self.show_heatmap
+            if self.show_heatmap:
+                self.build_heatmap()
+
+        # Toggle resource leak tracking in DEV mode.
+        if self.dev_mode and key == arcade.key.F7:
+            if self.resource_tracker is None:
+                self.resource_tracker = ResourceTracker(self.window)
+            else:
+                self.resource_tracker.stop()
+                self.resource_tracker = None
+
+        # Toggle practice mode, which allows savestates.
+        if key == arcade.key.P and self.start and not self.stage_level == self.stage_pack.end_level:
+            self.practice_mode = not self.practice_mode
+            self.used_savestates = True
+            self.recorder = None
+            print(f"Practice Mode: {self.practice_mode}")
+
+        # Savestate the current stage.
+        if self.practice_mode and key == arcade.key.F5:
+            self.save_state()
+
+        # Load the savestate, if it belongs to the current stage.
+        if self.practice_mode and key == arcade.key.F6:
+            self.load_state()
+
         if self.dev_mode and key == arcade.key.UP:
-            self.stage_level = (self.stage_level % 22) + 1
+            self.stage_level = self.stage_pack.step_level(self.stage_level, 1)
             self.reset()
         
         if self.dev_mode and key == arcade.key.DOWN:
-            self.stage_level = (self.stage_level % 22) - 1
+            self.stage_level = self.stage_pack.step_level(self.stage_level, -1)
             self.reset()
 
         if key == arcade.key.TAB:
@@ -462,13 +1115,13 @@ class GameView(arcade.View):
             self.background_music.set_volume(self.music_volume, self.music_player)
 
         # Allow player to see the controls.
-        if self.stage_level == 0 and key == arcade.key.C:
-            self.stage_level = 22
+        if self.stage_level == 0 and key == arcade.key.C and self.stage_pack.controls_level is not None:
+            self.stage_level = self.stage_pack.controls_level
             self.reset()
             self.deaths = pl.player_dies_sequence(self.deaths)
 
-        # Add pressed keys to list of keys held down.
-        self.keys.add(key)
+        # Pass the key to the input handler. It is applied to the player on the next update.
+        self.input.press(key, self.clock())
 
 
     def on_key_release(self, key: int, key_modifiers: int):
@@ -476,15 +1129,35 @@ class GameView(arcade.View):
         Called whenever the user lets off a previously pressed key.
         """
         
-        # Remove released keys from the pressed keys list.
-        self.keys.discard(key)
+        # Pass the release to the input handler.
+        if self.recorder is not None:
+            self.recorder.key(self.clock(), key, rp.RELEASE)
+        self.input.release(key, self.clock())
+
+
+    def on_show_view(self):
+        """
+        Called when the game is shown again, e.g. after a split-screen race or the stage select grid.
+        """
+        # The time spent in the other view isn't a hitch.
+        if self.hitch_detector is not None:
+            self.hitch_detector.reset()
+
+
+    def on_resize(self, width: int, height: int):
+        """
+        Called whenever the window is resized.
+        """
+        self.setup_cameras()
+        self.wake()
 
 
     def on_mouse_press(self, x: float, y: float, button: int, key_modifiers: int):
         """
         Called when the user presses a mouse button.
         """
-        if self.stage_level == 21 or self.stage_level == 22:
+        self.wake()
+        if self.stage_level in (self.stage_pack.end_level, self.stage_pack.controls_level):
             self.stage_level = 0
             self.reset()
             self.deaths = pl.player_dies_sequence(self.deaths)
@@ -492,16 +1165,32 @@ class GameView(arcade.View):
             self.deaths = 0
             self.total_time = 0
             self.dev_mode = False
+            self.practice_mode = False
             self.start = False
             self.background_color = arcade.color.DARK_BROWN if self.difficulty == -1 else arcade.color.DARK_RED 
 
 def main():
     """ Contains the logic for launching and running the game. """
+    # Optional ghost race against another game, e.g. "python main.py --ghost-peer 192.168.1.20:8790".
+    parser = argparse.ArgumentParser(description = WINDOW_TITLE)
+    parser.add_argument("--ghost-peer", default = const.GHOST_RACE_PEER, metavar = "HOST:PORT", help = "Race the game at this address, showing its player as a ghost.")
+    parser.add_argument("--ghost-port", type = int, default = const.GHOST_RACE_PORT, help = "Port to receive the other player's ghost on.")
+    # Optional custom stage pack, e.g. "python main.py --stage-pack my_stages". See build_stage_pack.py.
+    parser.add_argument("--stage-pack", metavar = "FOLDER", help = "Play the stage pack in this folder instead of the game's own stages.")
+    args, _ = parser.parse_known_args()
+
     # Initialize the window (for non-fullscreen)
     window = arcade.Window(BASE_HORIZONTAL_PIXELS, BASE_VERTICAL_PIXELS, WINDOW_TITLE)
 
     # Associate the main GameView with the Window
-    game = GameView()
+    try:
+        game = GameView(args.ghost_port, args.ghost_peer, args.stage_pack)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Log frames that come late, along with what was uploaded to the GPU during them. Without HITCH_LOGGING, only once DEV mode is entered.
+    if const.HITCH_LOGGING:
+        game.hitch_detector = HitchDetector(window.ctx, const.HITCH_THRESHOLD)
 
     # Associate the GameView with the Window
     window.show_view(game)
@@ -0,0 +1,327 @@
+"""
+Replay renderer.
+
+Renders recorded runs offscreen, at any resolution, to PNG sequences or through a video encoder. Runs are recorded
+automatically and saved in the user data folder's replays folder once they are completed.
+
+Each run is split at the start of every stage, and the stages are shared out between worker processes. Each worker
+has its own headless window and GL context, plays its stages back through the game's own on_update and on_draw, and
+streams every frame straight to disk or to the encoder, so a whole run is never held in memory.
+
+    python replay_renderer.py                                   # every saved replay, 1280x720 PNG sequences
+    python replay_renderer.py run.replay --size 1920x1080 --workers 4 --out promo_renders
+    python replay_renderer.py run.replay --encoder "ffmpeg -loglevel error -y -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - -pix_fmt yuv420p {output}"
+
+With an encoder, each stage is encoded to its own segment_NNN.mp4, and a segments.txt list is written for joining them:
+    ffmpeg -f concat -i segments.txt -c copy run.mp4
+"""
+import os
+os.environ["ARCADE_HEADLESS"] = "1"
+
+# Workers never play sound.
+import pyglet
+pyglet.options["audio"] = ("silent",)
+
+import argparse
+import glob
+import math
+import multiprocessing
+import shlex
+import subprocess
+import time
+
+import arcade
+from PIL import Image
+
+import assets.constants as const
+import assets.replay as rp
+from assets.stage_pack import SHIPPED_DIRECTORY, StagePack
+
+# How long the end screen is shown after the last stage, in seconds.
+END_SCREEN_HOLD = 3
+
+# Each worker's game, created once when the worker starts.
+worker = None
+
+
+class ReplayClock:
+    """
+    Stands in for time.perf_counter while playing back, returning the recorded time instead.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class PngSink:
+    """
+    Writes each frame as a numbered PNG. Frame numbers count from the start of the run, so every worker writes into the same sequence.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame, image):
+        # Fast compression. The frames are only an intermediate step before editing.
+        image.save(os.path.join(self.directory, f"frame_{frame:06d}.png"), compress_level = 1)
+
+    def close(self):
+        pass
+
+
+class EncoderSink:
+    """
+    Pipes raw RGB frames into an encoder process, e.g. ffmpeg.
+    """
+
+    def __init__(self, command, output, width, height, fps):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        arguments = [part.format(width = width, height = height, fps = fps, output = output) for part in shlex.split(command)]
+        self.process = subprocess.Popen(arguments, stdin = subprocess.PIPE)
+
+    def write(self, frame, image):
+        self.process.stdin.write(image.tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait():
+            raise RuntimeError(f"The encoder exited with code {self.process.returncode}")
+
+
+class ReplayWorker:
+    """
+    A headless game that plays back stages of recorded runs and draws every frame into an offscreen framebuffer.
+    Each stage pack the runs were played on gets its own game, made the first time one of its runs is rendered.
+    """
+
+    def __init__(self, width, height):
+        self.window = arcade.Window(width, height, "Replay renderer", visible = False)
+        self.clock = ReplayClock()
+
+        # Draw the world and HUD scaled to the chosen resolution, into a framebuffer of that size instead of the window.
+        ctx = self.window.ctx
+        self.size = (width, height)
+        self.framebuffer = ctx.framebuffer(color_attachments = [ctx.texture(self.size, components = 4)])
+        self.games = {}
+        self.game = None
+
+    def use_stage_pack(self, stage_directory):
+        """
+        Switches to the game playing the given stage pack. None is the game's own stages.
+        """
+        import main
+
+        if stage_directory not in self.games:
+            game = main.GameView(stage_directory = stage_directory, replaying = True)
+            game.clock = self.clock
+            game.native_resolution = False
+            for camera in (game.game_camera, game.gui_camera):
+                camera.render_target = self.framebuffer
+                camera.viewport = arcade.LRBT(0, self.size[0], 0, self.size[1])
+            self.games[stage_directory] = game
+        self.game = self.games[stage_directory]
+        self.window.show_view(self.game)
+
+    def start_stage(self, replay, index):
+        """
+        Puts the game in the state it was in at the start of the index-th stage of the run.
+        """
+        self.use_stage_pack(replay.stage_directory)
+        game = self.game
+        stage = replay.stages[index]
+        self.clock.now = replay.tick(stage["tick"])[rp.CLOCK]
+
+        game.difficulty = replay.difficulty
+        game.input.key_to_action = replay.key_to_action
+        game.best_splits = replay.best_splits
+        game.run_id = replay.run_id
+        game.start = True
+        game.game_over = False
+        game.dev_mode = False
+        game.practice_mode = False
+        game.deaths = stage["deaths"]
+        game.total_time = stage["total_time"]
+        game.split_start_time = stage["split_start_time"]
+        game.split_start_deaths = stage["split_start_deaths"]
+
+        game.stage_level = stage["stage_level"]
+        game.reset()
+        game.background_color = tuple(stage["background_color"])
+
+        # Restore the coins, enemies and portal as they were, the same way practice mode loads a savestate.
+        game.savestate = replay.savestate(index)
+        game.load_state()
+
+        # Keys being held as the stage started.
+        game.input.release_all()
+        game.input.hold_counts = {int(action): count for action, count in stage["hold_counts"].items()}
+        game.input.held = 0
+        for action, count in game.input.hold_counts.items():
+            if count:
+                game.input.held |= action
+        game.input.jump_pressed_at = stage["jump_pressed_at"]
+        game.input.grounded_at = stage["grounded_at"]
+
+    def draw(self):
+        """
+        Draws the current frame and reads it back, top row first.
+        """
+        self.framebuffer.clear(color = self.game.background_color)
+        self.game.on_draw()
+        image = Image.frombytes("RGB", self.size, self.framebuffer.read(components = 3))
+        return image.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+
+    def render_stage(self, replay, index, fps, sink):
+        """
+        Plays back one stage of the run and writes its frames to sink. Returns the number of frames written.
+        """
+        ticks = replay.stage_ticks(index)
+        events = replay.events_during(ticks)
+        event_index = 0
+        self.start_stage(replay, index)
+        game = self.game
+
+        # Frame n shows the game as it was n / fps seconds of game time into the run, counted by the run's total time.
+        # This stage starts at the first frame after the previous one ended.
+        frame = 0 if index == 0 else first_frame_after(game.total_time, fps)
+        first_frame = frame
+
+        for tick_index, tick in zip(ticks, replay.ticks(ticks.start, ticks.stop)):
+            # Keys pressed and released since the last tick, at the times they happened.
+            while event_index < len(events) and events[event_index][0] <= tick_index:
+                _, self.clock.now, kind, key = events[event_index]
+                event_index += 1
+                if kind == rp.RELEASE_ALL:
+                    game.input.release_all()
+                elif key not in rp.DISPLAY_KEYS:
+                    if kind == rp.PRESS:
+                        game.on_key_press(key, 0)
+                    else:
+                        game.on_key_release(key, 0)
+
+            # Start the tick exactly where the player was when it was recorded.
+            self.clock.now = tick[rp.CLOCK]
+            game.player.center_x, game.player.center_y = tick[rp.X], tick[rp.Y]
+            game.player.change_x, game.player.change_y = tick[rp.CHANGE_X], tick[rp.CHANGE_Y]
+            game.set_player_pose(tick[rp.POSE])
+            game.focused = bool(tick[rp.FOCUSED])
+            game.on_update(tick[rp.DELTA_TIME])
+
+            # Draw once, however many frames this tick covers. Ticks shorter than a frame are skipped.
+            if frame / fps <= game.total_time:
+                image = self.draw()
+                while frame / fps <= game.total_time:
+                    sink.write(frame, image)
+                    frame += 1
+
+        # Hold on the end screen after the last stage.
+        if ticks.stop == replay.tick_count and game.stage_level == game.stage_pack.end_level:
+            game.focused = True
+            for _ in range(END_SCREEN_HOLD * fps):
+                self.clock.now += 1 / fps
+                game.on_update(1 / fps)
+                sink.write(frame, self.draw())
+                frame += 1
+        return frame - first_frame
+
+
+def first_frame_after(seconds, fps):
+    """
+    The first frame shown after the given game time. Uses the same comparison as render_stage, so stages never share or skip a frame.
+    """
+    frame = math.floor(seconds * fps)
+    while frame / fps <= seconds:
+        frame += 1
+    while frame > 0 and (frame - 1) / fps > seconds:
+        frame -= 1
+    return frame
+
+
+def start_worker(width, height):
+    global worker
+    worker = ReplayWorker(width, height)
+
+
+def render_task(task):
+    """
+    Renders one stage of one replay. Runs in a worker process. Returns the task, the frames written and the time taken.
+    """
+    path, index, out_directory, fps, encoder = task
+    start = time.perf_counter()
+    replay = rp.Replay(path)
+    directory = os.path.join(out_directory, replay.run_id)
+    if encoder:
+        sink = EncoderSink(encoder, os.path.join(directory, f"segment_{index:03d}.mp4"), *worker.size, fps)
+    else:
+        sink = PngSink(directory)
+    try:
+        frames = worker.render_stage(replay, index, fps, sink)
+    finally:
+        sink.close()
+    return task, frames, time.perf_counter() - start
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render recorded runs offscreen, split across worker processes.")
+    parser.add_argument("replays", nargs="*", help="Replay files. Defaults to every saved replay.")
+    parser.add_argument("--size", type=parse_size, default=(1280, 720), help="Resolution to render at, e.g. 1920x1080.")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes, each with its own GL context.")
+    parser.add_argument("--out", default="replay_renders", help="Folder to render into. Each run gets a folder named after its run id.")
+    parser.add_argument("--encoder", help="Command to pipe raw RGB frames into, with {width}, {height}, {fps} and {output} filled in.")
+    args = parser.parse_args()
+
+    paths = args.replays or sorted(glob.glob(os.path.join(const.user_data_path(const.REPLAY_DIRECTORY), "*" + rp.REPLAY_EXTENSION)))
+    if not paths:
+        parser.error("No replays given, and none are saved yet.")
+
+    # Runs are only rendered on the stages they were played on. Runs whose stage pack is gone or changed since are skipped.
+    replays = []
+    for path in paths:
+        replay = rp.Replay(path)
+        directory = replay.stage_directory or const.resource_path(SHIPPED_DIRECTORY)
+        try:
+            key = StagePack(directory).key
+        except (OSError, ValueError) as e:
+            key = f"unreadable ({e})"
+        if key != replay.stage_pack_key:
+            print(f"Skipping {os.path.basename(path)}: it was played on stage pack {replay.stage_pack_key}, but {directory} is now {key}")
+            continue
+        replays.append(replay)
+    if not replays:
+        parser.error("None of the replays can be played back on their stages.")
+
+    # One task per stage of each run. The longest go first, so no worker is left with a long stage at the end.
+    tasks = [(replay.path, index, args.out, args.fps, args.encoder) for replay in replays for index in range(len(replay.stages))]
+    lengths = {(replay.path, index): len(replay.stage_ticks(index)) for replay in replays for index in range(len(replay.stages))}
+    tasks.sort(key = lambda task: -lengths[task[:2]])
+
+    played = sum(replay.duration for replay in replays)
+    workers = max(1, min(args.workers, len(tasks)))
+    print(f"Rendering {len(replays)} runs ({played:.1f} s of play, {len(tasks)} stages) at {args.size[0]}x{args.size[1]} with {workers} workers")
+
+    start = time.perf_counter()
+    total_frames = 0
+    # Spawned, not forked, so each worker starts its own GL context from scratch.
+    with multiprocessing.get_context("spawn").Pool(workers, initializer = start_worker, initargs = args.size) as pool:
+        for (path, index, *_), frames, seconds in pool.imap_unordered(render_task, tasks):
+            total_frames += frames
+            print(f"  {os.path.basename(path)} stage {index + 1}: {frames} frames in {seconds:.1f} s")
+    elapsed = time.perf_counter() - start
+
+    if args.encoder:
+        for replay in replays:
+            with open(os.path.join(args.out, replay.run_id, "segments.txt"), "w") as file:
+                file.writelines(f"file 'segment_{index:03d}.mp4'\n" for index in range(len(replay.stages)))
+
+    print(f"\n{total_frames} frames in {elapsed:.1f} s ({total_frames / elapsed:.0f} fps), "
+          f"{played / elapsed:.2f}x the time the runs took to play")
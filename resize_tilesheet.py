@@ -1,80 +1,119 @@
+import argparse
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 from PIL import Image
 
-def convert_18_to_16_tilemap(input_filename, output_filename):
+SOURCE_TILE_SIZE = 18
+TARGET_TILE_SIZE = 16
+
+# The sheets converted when the script is run without any arguments.
+DEFAULT_CONVERSIONS = [
+    ('avoidland_tilemap.png', 'avoidland_tilemap_16x16.png'),
+    ('keyboard-&-mouse_sheet_default.png', 'keyboard_tilemap_16x16.png'),
+    ('tilemap-characters_packed.png', 'characters_tilemap_16x16.png'),
+    ('tilemap-farmer_packed.png', 'farmer_tilemap_16x16.png'),
+    ('tilemap-food_packed.png', 'food_tilemap_16x16.png'),
+    ('tilemap-grassland_packed.png', 'grassland_tilemap_16x16.png'),
+]
+
+
+def crop_tile_borders(pixels):
+    """
+    Crops the 1px border off of every 18x18 tile in a sheet at once.
+    Takes and returns an (height, width, 4) RGBA array. Any partial tiles on the right or bottom edge are dropped.
+    """
+    tiles_y = pixels.shape[0] // SOURCE_TILE_SIZE
+    tiles_x = pixels.shape[1] // SOURCE_TILE_SIZE
+
+    # View the sheet as a grid of tiles: (tile row, row in tile, tile column, column in tile, channel).
+    grid = pixels[:tiles_y * SOURCE_TILE_SIZE, :tiles_x * SOURCE_TILE_SIZE].reshape(tiles_y, SOURCE_TILE_SIZE, tiles_x, SOURCE_TILE_SIZE, 4)
+
+    # Keep the center 16x16 of every tile, then pack the tiles back into a compact sheet.
+    content = grid[:, 1:1 + TARGET_TILE_SIZE, :, 1:1 + TARGET_TILE_SIZE]
+    return content.reshape(tiles_y * TARGET_TILE_SIZE, tiles_x * TARGET_TILE_SIZE, 4)
+
+
+def is_up_to_date(input_filename, output_filename):
+    """
+    Returns True if the output sheet exists and was written after the input sheet was last changed.
+    """
+    return os.path.exists(output_filename) and os.path.getmtime(output_filename) > os.path.getmtime(input_filename)
+
+
+def convert_18_to_16_tilemap(input_filename, output_filename, force=False):
     """
     Converts an 18x18 tilemap to a clean 16x16 tilemap by cropping the center.
+    Returns a short status message describing what happened.
     """
     if not os.path.exists(input_filename):
-        print(f"Error: Input file '{input_filename}' not found.")
-        return
+        return f"Error: Input file '{input_filename}' not found."
+
+    # Skip sheets that have already been converted.
+    if not force and is_up_to_date(input_filename, output_filename):
+        return f"Skipped '{input_filename}' ('{output_filename}' is up to date)."
+
+    start = time.perf_counter()
 
     # Open the input image
     try:
-        source_image = Image.open(input_filename).convert('RGBA')
+        with Image.open(input_filename) as source_image:
+            pixels = np.asarray(source_image.convert('RGBA'))
     except Exception as e:
-        print(f"Error opening image: {e}")
-        return
-
-    source_width, source_height = source_image.size
-    
-    # Calculate the grid dimensions (assumes no extra padding/margins on sheet)
-    tiles_x = source_width // 18
-    tiles_y = source_height // 18
-
-    # We are packing the new 16x16 tiles into a smaller sheet
-    new_width = tiles_x * 16
-    new_height = tiles_y * 16
-
-    # Create a new blank image with transparency
-    output_image = Image.new('RGBA', (new_width, new_height), (0, 0, 0, 0))
-
-    print(f"Processing '{input_filename}'...")
-    print(f" Detected Grid: {tiles_x}x{tiles_y} tiles (Original Size: {source_width}x{source_height})")
-    print(f" Creating New Sheet: {new_width}x{new_height} pixels (Compact 16x16 format)")
-
-    # The conversion loop
-    for y in range(tiles_y):
-        for x in range(tiles_x):
-            # 1. Define the 18x18 "frame" coordinates on source sheet
-            src_x = x * 18
-            src_y = y * 18
-            
-            # 2. Define the 16x16 "content" (center 16x16 of the 18x18 block)
-            # This logic effectively crops the 1px border.
-            content_left = src_x + 1
-            content_top = src_y + 1
-            content_right = content_left + 16
-            content_bottom = content_top + 16
-            
-            # 3. Crop the content from source
-            tile_content = source_image.crop((content_left, content_top, content_right, content_bottom))
-            
-            # 4. Define destination coordinates on the new 16x16 sheet
-            dest_x = x * 16
-            dest_y = y * 16
-            
-            # 5. Paste the 16x16 content into the new sheet
-            output_image.paste(tile_content, (dest_x, dest_y))
+        return f"Error opening image '{input_filename}': {e}"
+
+    # The conversion, done over the whole sheet in one slice.
+    output_pixels = crop_tile_borders(pixels)
 
     # Save the result
-    output_image.save(output_filename)
-    print(f"Successfully converted and saved as '{output_filename}'.")
+    Image.fromarray(output_pixels).save(output_filename)
+
+    elapsed = (time.perf_counter() - start) * 1000
+    source_height, source_width = pixels.shape[:2]
+    new_height, new_width = output_pixels.shape[:2]
+    return f"Converted '{input_filename}' ({source_width}x{source_height}) -> '{output_filename}' ({new_width}x{new_height}) in {elapsed:.1f} ms."
+
+
+def default_output_filename(input_filename, output_dir=None):
+    """
+    Names the converted sheet after the input sheet, e.g. 'grassland.png' becomes 'grassland_16x16.png'.
+    """
+    stem = os.path.splitext(os.path.basename(input_filename))[0]
+    return os.path.join(output_dir or os.path.dirname(input_filename), f"{stem}_16x16.png")
+
+
+def convert_many(conversions, jobs=None, force=False):
+    """
+    Converts a list of (input, output) sheet pairs concurrently in a process pool.
+    Prints a status line for each sheet as it finishes.
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(convert_18_to_16_tilemap, input_filename, output_filename, force) for input_filename, output_filename in conversions]
+        for future in futures:
+            print(future.result())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert 18x18 tilesheets into compact 16x16 tilesheets by cropping each tile's 1px border.")
+    parser.add_argument("sheets", nargs="*", help="Tilesheets to convert. Converts the default sheets if none are given.")
+    parser.add_argument("-o", "--output-dir", help="Folder for the converted sheets. Defaults to the folder of each input sheet.")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("-f", "--force", action="store_true", help="Convert sheets even if their output is already up to date.")
+    return parser.parse_args()
+
 
 # --- MAIN EXECUTION ---
 if __name__ == "__main__":
-    # Define your input and output names here.
-    # We recommend changing the original file names for clarity.
-    convert_18_to_16_tilemap('avoidland_tilemap.png', 'avoidland_tilemap_16x16.png')
-    convert_18_to_16_tilemap('keyboard-&-mouse_sheet_default.png', 'keyboard_tilemap_16x16.png')
-    convert_18_to_16_tilemap('tilemap-characters_packed.png', 'characters_tilemap_16x16.png')
-    convert_18_to_16_tilemap('tilemap-farmer_packed.png', 'farmer_tilemap_16x16.png')
-    convert_18_to_16_tilemap('tilemap-food_packed.png', 'food_tilemap_16x16.png')
-    convert_18_to_16_tilemap('tilemap-grassland_packed.png', 'grassland_tilemap_16x16.png')
-    
-    # Repeat for other sheets if needed:
-    # convert_18_to_16_tilemap('avoidland_18x18.png', 'avoidland_16x16.png')
-    # convert_18_to_16_tilemap('characters_18x18.png', 'characters_16x16.png')
-    
+    args = parse_args()
+
+    if args.sheets:
+        conversions = [(sheet, default_output_filename(sheet, args.output_dir)) for sheet in args.sheets]
+    else:
+        conversions = [(input_filename, os.path.join(args.output_dir or "", output_filename)) for input_filename, output_filename in DEFAULT_CONVERSIONS]
+
+    convert_many(conversions, jobs=args.jobs, force=args.force)
+
     print("\n--- All conversions complete! ---")
-    print("These new 16x16 sheets are now ready for manual cleanup or a 'retro style' redesign in Aseprite/Piskel.")
\ No newline at end of file
+    print("These new 16x16 sheets are now ready for manual cleanup or a 'retro style' redesign in Aseprite/Piskel.")
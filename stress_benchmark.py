@@ -0,0 +1,154 @@
+"""
+Stress benchmark.
+
+Generates stages with more and more coins, enemies and hazards, plays each one headlessly through the game's own
+on_update and on_draw with a scripted run to the right, and prints how the update and draw times grow with the
+entity count, along with the time spent in the per-entity calls made each tick.
+
+    python stress_benchmark.py                              # 10 to 5000 of each entity
+    python stress_benchmark.py --counts 100 1000 --frames 600 --chase 1.5 --flee
+"""
+import os
+os.environ["ARCADE_HEADLESS"] = "1"
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import arcade
+
+import assets.environment_logic as envl
+import assets.constants as const
+import main
+from assets.stage_pack import StagePack
+from stress_stage_generator import write_stage
+
+# The per-entity calls the game makes each tick, timed separately.
+TIMED_FUNCTIONS = ("find_contacts", "collect_coins", "move_floating_enemies", "coin_run_away", "animate_coin")
+
+
+class FunctionTimer:
+    """
+    Replaces functions in environment_logic with wrappers adding up how long each takes.
+    The game looks them up on the module every call, so the wrappers are used right away.
+    """
+
+    def __init__(self, names):
+        self.seconds = {name: 0.0 for name in names}
+        for name in names:
+            setattr(envl, name, self.wrap(name, getattr(envl, name)))
+
+    def wrap(self, name, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.seconds[name] += time.perf_counter() - start
+            return result
+        return timed
+
+    def reset(self):
+        for name in self.seconds:
+            self.seconds[name] = 0.0
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def play(game, window, frames):
+    """
+    Runs right across the stage, sprinting and jumping every half second. Returns the update and draw times of each frame.
+    """
+    update_times = []
+    draw_times = []
+    for frame in range(frames):
+        now = time.perf_counter()
+        if frame == 0:
+            game.input.press(arcade.key.D, now)
+            game.input.press(arcade.key.LSHIFT, now)
+        if frame % 30 == 0:
+            game.input.press(arcade.key.SPACE, now)
+        elif frame % 30 == 5:
+            game.input.release(arcade.key.SPACE, now)
+
+        start = time.perf_counter()
+        game.on_update(1 / 60)
+        middle = time.perf_counter()
+        game.on_draw()
+        window.ctx.finish()
+        update_times.append(middle - start)
+        draw_times.append(time.perf_counter() - middle)
+
+    game.input.release_all()
+    return update_times, draw_times
+
+
+def slope(xs, ys):
+    """
+    Least squares slope of ys against xs.
+    """
+    mean_x, mean_y = statistics.mean(xs), statistics.mean(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how frame time grows with the number of entities on a stage.")
+    parser.add_argument("--counts", nargs="+", type=int, default=[10, 100, 500, 1000, 2000, 5000], help="Coins, enemies and hazards per stage, each.")
+    parser.add_argument("--frames", type=int, default=300, help="Frames played per stage.")
+    parser.add_argument("--decorations", type=int, default=0, help="Static tiles per stage that are only drawn.")
+    parser.add_argument("--chase", type=float, default=0, help="Speed enemies chase the player at.")
+    parser.add_argument("--flee", action="store_true", help="Coins run away from the player.")
+    args = parser.parse_args()
+
+    properties = {}
+    if args.chase:
+        properties["speed"] = args.chase
+    if args.flee:
+        properties["coins_flee"] = True
+
+    window = arcade.Window(main.BASE_HORIZONTAL_PIXELS, main.BASE_VERTICAL_PIXELS, "Stress benchmark", visible = False)
+    game = main.GameView()
+    window.show_view(game)
+    game.native_resolution = False
+    game.setup_cameras()
+
+    timer = FunctionTimer(TIMED_FUNCTIONS)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        game.stage_directory = directory
+
+        # A pack needs a title screen, and the stage after the benchmarked one is its end screen. Both are left empty.
+        for level in (0, 2):
+            write_stage(os.path.join(directory, f"taa_stage_{level}.tmx"), 0, 0, 0, 0, 0, {})
+        print(f"{'entities':>8} {'width':>6} {'load':>8} | {'update p50':>10} {'p95':>8} | {'draw p50':>10} {'p95':>8} | {'deaths':>6} | per tick: "
+              + ", ".join(TIMED_FUNCTIONS))
+        for count in args.counts:
+            # Stage 1 is rewritten for each count, and reloaded by changing levels.
+            width = write_stage(os.path.join(directory, "taa_stage_1.tmx"), count, count, count, args.decorations, count // 20, properties, seed = count)
+
+            # The folder has no manifest, so the pack indexes the stage by its name. Keep the stage timer from running out partway through.
+            game.stage_pack = StagePack(directory)
+            game.stage_pack.entry(1).times = dict.fromkeys(const.DIFFICULTY_NAMES.values(), 10 ** 6)
+            game.stage_level = 1
+            game.loaded_stage = None
+            start = time.perf_counter()
+            game.reset()
+            load = time.perf_counter() - start
+            game.start = True
+            game.deaths = 0
+
+            timer.reset()
+            update_times, draw_times = play(game, window, args.frames)
+            update = statistics.median(update_times)
+            draw = statistics.median(draw_times)
+            results.append((3 * count, update, draw))
+            per_tick = ", ".join(f"{timer.seconds[name] / args.frames * 1e6:.0f}" for name in TIMED_FUNCTIONS)
+            print(f"{3 * count:>8} {width:>6} {load * 1000:>5.0f} ms | {update * 1e6:>7.0f} us {percentile(update_times, 0.95) * 1e6:>5.0f} us | "
+                  f"{draw * 1e6:>7.0f} us {percentile(draw_times, 0.95) * 1e6:>5.0f} us | {game.deaths:>6} | {per_tick} us")
+
+    if len(results) > 1:
+        entities = [result[0] for result in results]
+        print(f"\nGrowth per 1000 entities: update {slope(entities, [result[1] for result in results]) * 1e9:.0f} us, "
+              f"draw {slope(entities, [result[2] for result in results]) * 1e9:.0f} us")
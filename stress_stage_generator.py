@@ -0,0 +1,127 @@
+"""
+Stress stage generator.
+
+Writes taa_stage_*.tmx files with the same layers as the real stages, filled with as many coins, enemies, hazards and
+decorations as asked for. Stages grow wider to fit everything, so the player can still run along the floor to the portal.
+Used by stress_benchmark.py, or to try a crowded stage in the game.
+
+    python stress_stage_generator.py out/taa_stage_1.tmx --coins 2000 --enemies 500 --hazards 1000 --chase 1.5
+"""
+import argparse
+import math
+import os
+import random
+
+# Tiles from the avoidland tileset, the first tileset of every stage.
+TILESET = "assets/stage_files/avoidland_tileset.tsx"
+START_TILE = 74
+HAZARD_TILE = 46
+COIN_TILE = 114
+ENEMY_TILE = 115
+TERRAIN_TILE = 35
+DECORATION_TILE = 119
+PORTAL_TILES = ((123, 124), (125, 126))
+
+# Stages are always 24 tiles high, so they fit the screen.
+HEIGHT = 24
+FLOOR_ROW = HEIGHT - 1
+START_COLUMN = 2
+
+# Rows entities are placed on, leaving the top of the screen and the two rows above the floor clear.
+ENTITY_ROWS = range(2, FLOOR_ROW - 2)
+
+# Entities take at most this share of the free cells, so the stage stays playable.
+MAX_FILL = 0.5
+
+
+def stage_width(total: int) -> int:
+    '''
+    The width in tiles needed to place total entities, at least one screen wide.
+    '''
+    return max(40, math.ceil(total / (len(ENTITY_ROWS) * MAX_FILL)) + 10)
+
+
+def layer_xml(layer_id: int, name: str, grid: list) -> str:
+    rows = ",\n".join(",".join(str(gid) for gid in row) for row in grid)
+    return (f' <layer id="{layer_id}" name="{name}" width="{len(grid[0])}" height="{len(grid)}">\n'
+            f'  <data encoding="csv">\n{rows}\n</data>\n </layer>\n')
+
+
+def write_stage(path: str, coins: int = 0, enemies: int = 0, hazards: int = 0, decorations: int = 0,
+                platforms: int = 0, properties: dict | None = None, seed: int = 0) -> int:
+    '''
+    Writes a stage to path. Entities are scattered over the air above the floor, never in front of the starting position.
+    properties are written as the map's custom properties, e.g. {"speed": 1.5} to have enemies chase the player.
+    Returns the stage's width in tiles.
+    '''
+    rng = random.Random(seed)
+    width = stage_width(coins + enemies + hazards)
+    blank = lambda: [[0] * width for _ in range(HEIGHT)]
+    layers = {name: blank() for name in ("starting_position", "dangerous_terrain", "portal", "walkthrough_objects", "coins", "terrain", "enemies")}
+
+    # A floor across the whole stage, and some platforms to jump on.
+    layers["terrain"][FLOOR_ROW] = [TERRAIN_TILE] * width
+    for _ in range(platforms):
+        row = rng.choice(ENTITY_ROWS)
+        column = rng.randrange(START_COLUMN + 6, width - 6)
+        for offset in range(rng.randint(2, 6)):
+            layers["terrain"][row][column + offset] = TERRAIN_TILE
+
+    # The player starts at the left, and the portal is at the far right.
+    layers["starting_position"][FLOOR_ROW - 1][START_COLUMN] = START_TILE
+    for row_offset, tiles in enumerate(PORTAL_TILES):
+        for column_offset, gid in enumerate(tiles):
+            layers["portal"][FLOOR_ROW - 2 + row_offset][width - 4 + column_offset] = gid
+
+    # Each entity gets its own cell. Cells under platforms and near the start are left empty.
+    free = [(row, column) for row in ENTITY_ROWS for column in range(START_COLUMN + 6, width - 6) if not layers["terrain"][row][column]]
+    cells = rng.sample(free, min(len(free), coins + enemies + hazards))
+    for name, gid, count in (("coins", COIN_TILE, coins), ("enemies", ENEMY_TILE, enemies), ("dangerous_terrain", HAZARD_TILE, hazards)):
+        for row, column in cells[:count]:
+            layers[name][row][column] = gid
+        cells = cells[count:]
+
+    # Decorations are drawn, but never collided with, so they can go anywhere.
+    for _ in range(decorations):
+        layers["walkthrough_objects"][rng.randrange(HEIGHT)][rng.randrange(width)] = DECORATION_TILE
+
+    tileset = os.path.relpath(os.path.abspath(TILESET), os.path.dirname(os.path.abspath(path))).replace(os.sep, "/")
+    with open(path, "w") as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        file.write(f'<map version="1.10" tiledversion="1.12.1" orientation="orthogonal" renderorder="right-down" width="{width}" height="{HEIGHT}" '
+                   f'tilewidth="16" tileheight="16" infinite="0" nextlayerid="{len(layers) + 1}" nextobjectid="1">\n')
+        if properties:
+            file.write(" <properties>\n")
+            for name, value in properties.items():
+                kind = "bool" if isinstance(value, bool) else "float" if isinstance(value, float) else "int"
+                file.write(f'  <property name="{name}" type="{kind}" value="{str(value).lower() if kind == "bool" else value}"/>\n')
+            file.write(" </properties>\n")
+        file.write(f' <tileset firstgid="1" source="{tileset}"/>\n')
+        for layer_id, (name, grid) in enumerate(layers.items(), start=1):
+            file.write(layer_xml(layer_id, name, grid))
+        file.write("</map>\n")
+    return width
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a stage crowded with coins, enemies and hazards.")
+    parser.add_argument("path", help="Where to write the stage, e.g. out/taa_stage_1.tmx.")
+    parser.add_argument("--coins", type=int, default=1000)
+    parser.add_argument("--enemies", type=int, default=1000)
+    parser.add_argument("--hazards", type=int, default=1000)
+    parser.add_argument("--decorations", type=int, default=0, help="Static tiles that are only drawn.")
+    parser.add_argument("--platforms", type=int, default=0)
+    parser.add_argument("--chase", type=float, default=0, help="Speed enemies chase the player at. 0 leaves them still.")
+    parser.add_argument("--flee", action="store_true", help="Coins run away from the player.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    properties = {}
+    if args.chase:
+        properties["speed"] = args.chase
+    if args.flee:
+        properties["coins_flee"] = True
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.path)), exist_ok=True)
+    width = write_stage(args.path, args.coins, args.enemies, args.hazards, args.decorations, args.platforms, properties, args.seed)
+    print(f"Wrote {args.path}: {width}x{HEIGHT} tiles, {args.coins} coins, {args.enemies} enemies, {args.hazards} hazards")
@@ -0,0 +1,100 @@
+"""
+Benchmark for the shared tileset cache.
+
+Loads every stage file with arcade.TileMap as it comes, and with the game's CachedTileMap. For each, prints the time to
+load every stage starting from empty caches, as on launch, and again with the caches warm, as when moving between stages.
+Then loads every stage at once and prints the memory they take together and how many distinct textures their tiles use.
+
+    python tileset_cache_benchmark.py                       # every stage
+    python tileset_cache_benchmark.py 1 5 --repeats 3
+"""
+import os
+os.environ["ARCADE_HEADLESS"] = "1"
+
+import argparse
+import gc
+import statistics
+import time
+import tracemalloc
+
+import arcade
+
+import assets.constants as const
+import assets.tileset_cache as tsc
+
+STAGE_FILE = "assets/stage_files/taa_stage_{}.tmx"
+
+
+def plain_map(path):
+    return arcade.TileMap(path, scaling = 1, lazy = True, layer_options = {layer: {"use_spatial_hash": True} for layer in const.SPATIAL_HASH_LAYERS})
+
+
+def cached_map(path):
+    return tsc.CachedTileMap(path, scaling = 1, lazy = True, layer_options = {layer: {"use_spatial_hash": True} for layer in const.SPATIAL_HASH_LAYERS})
+
+
+def flush():
+    arcade.texture.default_texture_cache.flush()
+    tsc.SHARED_CACHE.flush()
+    tsc.SHARED_CACHE.parses = 0
+    gc.collect()
+
+
+def load_times(paths, make_map):
+    """
+    Loads every stage twice in a row, starting from empty caches. Returns the time each pass took.
+    """
+    flush()
+    passes = []
+    for _ in range(2):
+        # Free the previous pass's stages first, so collecting them isn't timed.
+        gc.collect()
+        start = time.perf_counter()
+        for path in paths:
+            make_map(path)
+        passes.append(time.perf_counter() - start)
+    return passes
+
+
+def load_memory(paths, make_map):
+    """
+    Loads every stage and keeps them all. Returns the memory allocated, the peak, and the number of distinct tile textures.
+    """
+    flush()
+    tracemalloc.start()
+    maps = [make_map(path) for path in paths]
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    textures = {id(sprite.texture) for tile_map in maps for sprite_list in tile_map.sprite_lists.values() for sprite in sprite_list}
+    sprites = sum(len(sprite_list) for tile_map in maps for sprite_list in tile_map.sprite_lists.values())
+    return allocated, peak, len(textures), sprites
+
+
+def available_stages():
+    stages = []
+    level = 0
+    while os.path.exists(STAGE_FILE.format(level)):
+        stages.append(level)
+        level += 1
+    return stages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare stage load time and memory with and without the shared tileset cache.")
+    parser.add_argument("stages", nargs="*", type=int, help="Stages to load. Defaults to every stage.")
+    parser.add_argument("--repeats", type=int, default=5, help="Times each measurement is taken. The median is reported.")
+    args = parser.parse_args()
+
+    # Sprite lists need a window for their GPU context.
+    window = arcade.Window(640, 360, "Tileset cache benchmark", visible = False)
+    paths = [STAGE_FILE.format(stage_level) for stage_level in args.stages or available_stages()]
+    print(f"{len(paths)} stage files\n")
+    print(f"{'':>14} | {'cold':>9} {'warm':>9} | {'allocated':>10} {'peak':>10} | {'textures':>8} {'sprites':>7}")
+    for label, make_map in (("arcade.TileMap", plain_map), ("CachedTileMap", cached_map)):
+        times = [load_times(paths, make_map) for _ in range(args.repeats)]
+        cold = statistics.median(passes[0] for passes in times)
+        warm = statistics.median(passes[1] for passes in times)
+        allocated, peak, textures, sprites = load_memory(paths, make_map)
+        print(f"{label:>14} | {cold * 1000:>6.0f} ms {warm * 1000:>6.0f} ms | {allocated / 2 ** 20:>6.1f} MiB {peak / 2 ** 20:>6.1f} MiB | "
+              f"{textures:>8} {sprites:>7}")
+    print(f"\nTSX files parsed by the cache while loading every stage: {tsc.SHARED_CACHE.parses}")